@@ -1,18 +1,18 @@
 import os
-import datetime as dt
 import streamlit as st
 import pandas as pd
 import requests
 from streamlit_mic_recorder import mic_recorder
-from services.pron_analysis import pronunciation_targets
 
 
-from services.stt import transcribe_audio_bytes
-from services.langid import detect_language
-from services.grammar import grammar_feedback
-from services.latin import latinize_text, latin_pronunciation_hint
-from services.llm import llm_weakest_point, llm_generate_practice_module, llm_pronunciation_feedback
-from services.progress import init_db, save_attempt, load_attempts
+from services.stt import active_config as stt_config, transcribe_stream
+from services.long_audio import LONG_AUDIO_WORKERS, iter_long_transcription, make_executor
+from services.llm import cache_stats as llm_cache_stats, client_stats as llm_client_stats
+from services.pipeline import analyze
+from services.progress import data_version, init_db, load_attempts_page, load_trend
+from services.metrics import stage_summary
+from services.grammar import pool_stats as lt_pool_stats, sentence_cache_stats as lt_cache_stats
+from services import warmup
 
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:3b")
@@ -27,7 +27,52 @@ def ollama_has_model(model_name: str) -> bool:
         return False
 st.set_page_config(page_title="Offline Language Coach", layout="wide")
 
-init_db()
+# Every widget interaction reruns this script. Reads are memoized on their inputs plus
+# progress.data_version(), which changes whenever an attempt is saved, so a rerun only hits
+# SQLite when the data actually changed. The TTL picks up writes from other processes
+# (e.g. services.reanalyze).
+@st.cache_resource
+def _init_db_once():
+    init_db()
+    return True
+
+
+@st.cache_resource
+def _long_audio_pool():
+    # One long-lived pool of spawned Whisper workers for all sessions; None runs chunks in-process.
+    return make_executor(LONG_AUDIO_WORKERS) if LONG_AUDIO_WORKERS > 0 else None
+
+
+def long_audio_pool():
+    pool = _long_audio_pool()
+    if pool is not None and getattr(pool, "_broken", False):  # a worker died; start a fresh pool
+        _long_audio_pool.clear()
+        pool = _long_audio_pool()
+    return pool
+
+
+@st.cache_data(max_entries=64, ttl=300, show_spinner=False)
+def cached_attempts(speaker_id: str, n_pages: int, version: int):
+    frames, cursor = [], None
+    for _ in range(n_pages):
+        page, cursor = load_attempts_page(speaker_id, cursor=cursor)
+        frames.append(page)
+        if cursor is None:
+            break
+    return pd.concat(frames, ignore_index=True).drop(columns=["id"]), cursor is not None
+
+
+@st.cache_data(max_entries=64, ttl=300, show_spinner=False)
+def cached_trend(speaker_id: str, period: str, version: int):
+    return load_trend(speaker_id, period=period)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def cached_stage_summary(hours: float):
+    return stage_summary(hours=hours)
+
+
+_init_db_once()
 
 st.title("Offline Language Coach")
 st.caption("Record -> Offline Speech-to-Text -> Grammar + Feedback + hard pronunciation -> Practice Module -> Progress Tracking")
@@ -38,13 +83,41 @@ with st.sidebar:
     st.markdown("**LLM (with the Goated Ollama)**")
     use_llm = st.checkbox("Use local LLM (Ollama)", value=True)
     st.caption(f"Model: `{OLLAMA_MODEL}` (requires [Ollama](https://ollama.com/))")
+    use_llm_cache = st.checkbox("Reuse cached LLM answers for identical inputs", value=True)
+    llm_cs = llm_cache_stats()
+    st.caption(f"LLM cache: {llm_cs['memory_hits'] + llm_cs['disk_hits']} hits / {llm_cs['misses']} misses")
+    llm_q = llm_client_stats()
+    st.caption(f"Ollama: {llm_q['active']}/{llm_q['limit']} busy, {llm_q['waiting']} queued, "
+               f"{llm_q['coalesced']} duplicate requests shared")
     native_lang = st.selectbox("Native language (L1)", ["en", "es", "de", "fr"], index=0)
     st.caption("Used to flag words with letter patterns uncommon in your native language.")
     st.divider()
     speaker_id = st.text_input("Speaker ID (for progress tracking)", value="default")
     st.caption("Saved locally to data/progress.db")
 
-tabs = st.tabs(["Record & Analyze", "Progress"])
+    # Preload the Ollama model / LanguageTool / (optionally) Whisper in the background and keep them warm.
+    warmup.start(
+        ollama_model=(OLLAMA_MODEL if use_llm else None),
+        grammar_langs=[target_lang],
+        whisper=os.getenv("WHISPER_WARMUP", "0") == "1",
+    )
+    st.divider()
+    wc = stt_config()
+    st.markdown("**Speech-to-text**")
+    st.caption(
+        f"Whisper `{wc['model_size']}`/{wc['compute_type']}, threads={wc['cpu_threads'] or 'auto'}, "
+        f"workers={wc['num_workers']}, beam={wc['beam_size']}"
+    )
+    if wc["source"] == "profile":
+        st.caption(f"Tuned profile: RTF {wc['rtf']}, WER {wc['wer']}")
+    else:
+        st.caption("Defaults (run `python -m services.stt_tuning` to calibrate)")
+    st.markdown("**Backends**")
+    icons = {"ready": "🟢", "warming": "🟡", "pending": "⚪", "error": "🔴"}
+    for name, ws in warmup.status().items():
+        st.caption(f"{icons.get(ws['state'], '⚪')} `{name}` {ws['state']} {ws['detail']}".rstrip())
+
+tabs = st.tabs(["Record & Analyze", "Progress", "Performance"])
 
 with tabs[0]:
     st.subheader("1) Record audio")
@@ -56,6 +129,10 @@ with tabs[0]:
         use_container_width=True,
         format="wav"
     )
+    long_upload = st.file_uploader(
+        "...or upload a long recording (e.g. a 20–60 minute class)",
+        type=["wav", "flac", "ogg", "mp3", "m4a", "webm"],
+    )
 
     col1, col2 = st.columns(2)
     with col1:
@@ -68,11 +145,34 @@ with tabs[0]:
             if not (audio and audio.get("bytes")):
                 st.warning("Record audio first.")
             else:
-                res = transcribe_audio_bytes(audio["bytes"], language_hint=None)
-                st.session_state["transcript"] = res["text"]
+                segments, info = transcribe_stream(audio["bytes"], language_hint=None)
+                live = st.empty()
+                parts = []
+                for seg in segments:
+                    parts.append(seg["text"])
+                    live.markdown("".join(parts).strip() + " ▌")
+                live.empty()
+                st.session_state["transcript"] = "".join(parts).strip()
+                st.session_state["whisper_info"] = info
                 st.success("Transcription complete (offline).")
-                if res.get("detected_language"):
-                    st.caption(f"Whisper detected: {res['detected_language']} (p={res.get('language_probability')})")
+                if info.get("language"):
+                    st.caption(f"Whisper detected: {info['language']} (p={info.get('language_probability')})")
+        if long_upload is not None and st.button("Transcribe upload (long audio)"):
+            live = st.empty()
+            parts, langs = [], {}
+            chunks = iter_long_transcription(long_upload, language_hint=None, workers=LONG_AUDIO_WORKERS,
+                                             executor=long_audio_pool())
+            for seg, lang in chunks:
+                parts.append(seg["text"].strip())
+                langs[lang] = langs.get(lang, 0.0) + seg["end"] - seg["start"]
+                live.markdown(f"`{seg['end'] / 60:.1f} min` " + " ".join(parts[-40:]) + " ▌")
+            live.empty()
+            st.session_state["transcript"] = " ".join(parts).strip()
+            st.session_state["whisper_info"] = {
+                "language": max(langs, key=langs.get) if langs else None,
+                "language_probability": None,
+            }
+            st.success(f"Transcribed {len(parts)} segments (offline).")
 
         text = st.text_area(
             "You can also paste/edit the transcript here:",
@@ -87,59 +187,60 @@ with tabs[0]:
                 st.warning("Need transcript text first.")
                 st.stop()
 
-            detected = detect_language(text)
-            gt = grammar_feedback(text, detected)
+            # Weakest point and practice module stream into this preview while the other stages
+            # (grammar, latinization, pronunciation targets/feedback) run in the background.
+            live = st.empty()
+            with live.container():
+                weakest_box = st.empty()
+                practice_box = st.empty()
 
-            weakest = {"weakest_point":"(LLM disabled)", "explanation":"", "fixes":[]}
-            practice = "(LLM disabled)"
-            pron = None
+            def on_token(stage, partial):
+                if stage == "weakest":
+                    fixes = "\n".join(f"- {fx}" for fx in partial["fixes"])
+                    weakest_box.markdown(f"**Weakest point** (generating…)\n\n**{partial['weakest_point']}**\n\n{partial['explanation']}\n\n{fixes}")
+                elif stage == "practice":
+                    practice_box.markdown(f"**Practice module** (generating…)\n\n{partial}")
 
-            if use_llm:
-                weakest = llm_weakest_point(
+            # Whisper's language guess only describes the transcript it produced, not an edited one.
+            whisper = st.session_state.get("whisper_info") if text == st.session_state.get("transcript") else None
+            inputs_key = (text, target_lang, native_lang, use_llm, OLLAMA_MODEL, speaker_id,
+                          whisper["language"] if whisper else None)
+            last = st.session_state.get("last_result")
+            # With the LLM cache off the user wants fresh answers, so always re-run then.
+            if use_llm_cache and last and last.get("inputs_key") == inputs_key:
+                live.empty()
+                st.info("Nothing changed since the last analysis; showing that result.")
+            else:
+                run = analyze(
                     text=text,
-                    detected_lang=detected,
                     target_lang=target_lang,
                     native_lang=native_lang,
-                    grammar_tool_summary=gt["summary"],
-                    model=OLLAMA_MODEL
-                )
-                practice = llm_generate_practice_module(
-                    text=text,
-                    detected_lang=detected,
-                    target_lang=target_lang,native_lang=native_lang,
-                    weakest_point=weakest["weakest_point"],
-                    model=OLLAMA_MODEL
+                    use_llm=use_llm,
+                    model=OLLAMA_MODEL,
+                    speaker_id=speaker_id,
+                    use_llm_cache=use_llm_cache,
+                    on_token=on_token if use_llm else None,
+                    whisper_lang=whisper["language"] if whisper else None,
+                    whisper_prob=whisper["language_probability"] if whisper else None,
                 )
+                # The full results block below replaces the live preview.
+                live.empty()
 
-            latin_text = latinize_text(text)
-            latin_pron = latin_pronunciation_hint(latin_text)
-            pron_targets = pronunciation_targets(text, native_lang=native_lang)
-
-    
-            # Save attempt locally
-            save_attempt(
-                speaker_id=speaker_id,
-                ts=dt.datetime.now().isoformat(timespec="seconds"),
-                target_lang=target_lang,
-                detected_lang=detected,
-                transcript=text,
-                weakest_point=weakest["weakest_point"],
-                num_issues=gt["num_matches"],
-                llm_model=(OLLAMA_MODEL if use_llm else ""),
-            )
-
-            st.session_state["last_result"] = {
-                "detected": detected,
-                "grammar": gt,
-                "weakest": weakest,
-                "practice": practice,
-                "latin_text": latin_text,
-                "latin_pron": latin_pron,
-                "pron_feedback": pron,
-                "pron_targets": pron_targets,
-                
-            }
-            st.success("Analysis complete + saved to progress tracker.")
+                out = run["results"]
+                st.session_state["last_result"] = {
+                    "detected": out["detect"],
+                    "grammar": out["grammar"],
+                    "weakest": out["weakest"],
+                    "practice": out["practice"],
+                    "latin_text": out["latin"]["latin_text"],
+                    "latin_pron": out["latin"]["latin_pron"],
+                    "pron_feedback": out["pron_feedback"],
+                    "pron_targets": out["pron_targets"],
+                    "timings_ms": run["timings_ms"],
+                    "cached": run["cached"],
+                    "inputs_key": inputs_key,
+                }
+                st.success("Analysis complete + saved to progress tracker.")
 
         res = st.session_state.get("last_result")
         if res:
@@ -168,6 +269,11 @@ with tabs[0]:
             st.subheader("Practice module")
             st.write(res["practice"])
 
+            if res.get("timings_ms"):
+                with st.expander("Stage timings"):
+                    for name, ms in sorted(res["timings_ms"].items(), key=lambda kv: -kv[1]):
+                        st.caption(f"`{name}`: {ms:.0f} ms" + (" (cached)" if name in res["cached"] else ""))
+
             st.subheader("Pronunciation targets (text-based)")
             st.caption(f"Native language (L1): `{native_lang}` — heuristic flags based on letter-patterns and syllable length.")
 
@@ -185,22 +291,80 @@ with tabs[0]:
                     reasons = ", ".join(item["reasons"])
                     st.markdown(f"- `{item['word']}` — {item['syllables']} syllables (why: {reasons})")
 
+            if res.get("pron_feedback"):
+                st.markdown("**LLM pronunciation notes (experimental)**")
+                st.write(res["pron_feedback"])
+
 
 
 with tabs[1]:
     st.subheader("Progress")
-    attempts = load_attempts(speaker_id=speaker_id)
+    # Pages are fetched with a keyset cursor, so older history costs the same as the newest page.
+    n_pages = st.session_state.get("progress_pages", 1)
+    attempts, has_more = cached_attempts(speaker_id, n_pages, data_version())
     if attempts.empty:
         st.info("No attempts saved yet. Record + analyze on the first tab.")
     else:
         st.write("Latest attempts (saved locally):")
         st.dataframe(attempts, use_container_width=True, hide_index=True)
+        if has_more and st.button("Load older attempts"):
+            st.session_state["progress_pages"] = n_pages + 1
+            st.rerun()
 
         st.markdown("---")
         st.subheader("Trends")
-        # Convert timestamps
-        df = attempts.copy()
-        df["ts"] = pd.to_datetime(df["ts"], errors="coerce")
-        df = df.sort_values("ts")
-        st.line_chart(df.set_index("ts")["num_issues"])
-        st.caption("This uses LanguageTool flag count as a rough proxy. (Lower is often better, but not always.)")
+        period = st.radio("Group by", ["day", "week"], horizontal=True)
+        trend = cached_trend(speaker_id, period, data_version())
+        st.line_chart(trend.pivot(index="bucket", columns="target_lang", values="avg_issues"))
+        st.caption("Average LanguageTool flags per attempt, by target language. This is a rough proxy. (Lower is often better, but not always.)")
+        st.bar_chart(trend.pivot(index="bucket", columns="target_lang", values="attempts"))
+        st.caption("Attempts per period.")
+
+    with st.expander("All speakers (cohort analytics)"):
+        st.caption("Exports every attempt to a columnar file and summarizes it. Needs `pyarrow`.")
+        if st.button("Export & summarize"):
+            try:
+                from services import analytics
+
+                info = analytics.export_attempts()
+                table = analytics.load_attempts_table()
+            except ImportError as e:
+                st.warning(str(e))
+            else:
+                st.caption(f"{info['rows']} attempts, {info['bytes'] / 1e6:.1f} MB, exported in {info['seconds']} s")
+                st.write("Most common weakest points:")
+                st.dataframe(analytics.weakest_point_frequencies(table), use_container_width=True, hide_index=True)
+                cohort = analytics.speaker_trends(table, period="week")
+                st.line_chart(cohort.pivot_table(index="bucket", columns="speaker_id", values="avg_issues"))
+                st.caption("Average flags per attempt per week, by speaker.")
+
+with tabs[2]:
+    st.subheader("Performance")
+    hours = st.selectbox("Window", [1, 24, 24 * 7, 24 * 30], index=1, format_func=lambda h: f"last {h} h")
+    summary = cached_stage_summary(hours)
+    if summary.empty:
+        st.info("No measurements yet. Transcribe or analyze something first.")
+    else:
+        st.dataframe(summary, use_container_width=True, hide_index=True)
+        st.bar_chart(summary.set_index("stage")[["p50_ms", "p95_ms"]])
+        st.caption(
+            "Latency per stage (ms). `rtf` is Whisper's real-time factor (processing time / audio length; "
+            "below 1 is faster than real time). `tokens_per_s` comes from Ollama's eval_count/eval_duration. "
+            "`lt.queue` is the wait for a free LanguageTool checker, `lt.check` the check itself; "
+            "`llm.queue` is the wait for an Ollama slot."
+        )
+
+    st.markdown("**LanguageTool checkers (this process)**")
+    lt_pools = lt_pool_stats()
+    if lt_pools:
+        st.dataframe(
+            pd.DataFrame([
+                {"language": lang, "running": ps["running"], "size": ps["size"], "checks": ps["checks"],
+                 "avg_wait_ms": ps["avg_wait_ms"], "max_wait_ms": round(1000 * ps["max_wait_s"], 2),
+                 "avg_check_ms": ps["avg_check_ms"], "shutdowns": ps["shutdowns"]}
+                for lang, ps in lt_pools.items()
+            ]),
+            use_container_width=True, hide_index=True,
+        )
+    lt_cs = lt_cache_stats()
+    st.caption(f"Sentence cache: {lt_cs['memory_hits']} hits / {lt_cs['misses']} misses (hit rate {lt_cs['hit_rate']:.0%})")
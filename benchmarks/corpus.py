@@ -0,0 +1,51 @@
+"""
+Deterministic synthetic learner-style text in en/es/de/fr for the benchmarks.
+"""
+from __future__ import annotations
+
+import random
+
+LANGS = ("en", "es", "de", "fr")
+
+_SUBJECTS = {
+    "en": ["I", "My brother", "The teacher", "We", "Our neighbours", "She"],
+    "es": ["Yo", "Mi hermano", "La profesora", "Nosotros", "Los vecinos", "Ella"],
+    "de": ["Ich", "Mein Bruder", "Die Lehrerin", "Wir", "Unsere Nachbarn", "Sie"],
+    "fr": ["Je", "Mon frère", "La professeure", "Nous", "Nos voisins", "Elle"],
+}
+_PREDICATES = {
+    "en": ["go to the market every morning", "has visited the extraordinary museum", "are studying pronunciation",
+           "was thinking about the unbelievable weather", "will travel through Switzerland", "enjoy strengthening exercises"],
+    "es": ["va al mercado cada mañana", "ha visitado el museo extraordinario", "estamos estudiando la pronunciación",
+           "pensaba en el tiempo increíble", "viajará por Suiza", "disfrutan de los ejercicios"],
+    "de": ["geht jeden Morgen zum Markt", "hat das außergewöhnliche Museum besucht", "lernen die Aussprache",
+           "dachte an das unglaubliche Wetter", "wird durch die Schweiz reisen", "genießen die Übungen"],
+    "fr": ["va au marché chaque matin", "a visité le musée extraordinaire", "étudions la prononciation",
+           "pensait au temps incroyable", "voyagera à travers la Suisse", "apprécient les exercices"],
+}
+_TAILS = {
+    "en": ["because it is important", "with a lot of enthusiasm", "although it was difficult", ""],
+    "es": ["porque es importante", "con mucho entusiasmo", "aunque fue difícil", ""],
+    "de": ["weil es wichtig ist", "mit viel Begeisterung", "obwohl es schwierig war", ""],
+    "fr": ["parce que c'est important", "avec beaucoup d'enthousiasme", "bien que ce soit difficile", ""],
+}
+
+
+def sentence(lang: str, rng: random.Random) -> str:
+    parts = [rng.choice(_SUBJECTS[lang]), rng.choice(_PREDICATES[lang]), rng.choice(_TAILS[lang])]
+    return " ".join(p for p in parts if p) + "."
+
+
+def document(lang: str, n_sentences: int, rng: random.Random) -> str:
+    return " ".join(sentence(lang, rng) for _ in range(n_sentences))
+
+
+def generate_corpus(n_docs: int = 200, sentences_per_doc: int = 12, langs=LANGS, seed: int = 0) -> list[dict]:
+    """
+    [{"lang", "text"}], cycling through langs. Same seed -> same corpus.
+    """
+    rng = random.Random(seed)
+    return [
+        {"lang": langs[i % len(langs)], "text": document(langs[i % len(langs)], sentences_per_doc, rng)}
+        for i in range(n_docs)
+    ]
@@ -0,0 +1,47 @@
+"""
+Generated WAV fixtures. Synthetic signals measure decode/transcribe speed, not accuracy.
+"""
+from __future__ import annotations
+
+import io
+import os
+
+import numpy as np
+import soundfile as sf
+
+FIXTURE_DIR = os.getenv(
+    "BENCH_FIXTURE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "bench_fixtures")
+)
+
+
+def make_wav_bytes(seconds: float, rate: int = 16000, seed: int = 0) -> bytes:
+    """
+    Speech-like test signal: a few modulated tones plus noise, 16-bit PCM WAV like mic_recorder sends.
+    """
+    t = np.arange(int(seconds * rate)) / rate
+    sig = 0.2 * np.sin(2 * np.pi * 220 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    sig += 0.1 * np.sin(2 * np.pi * 660 * t) + 0.02 * np.random.default_rng(seed).standard_normal(t.size)
+    buf = io.BytesIO()
+    sf.write(buf, sig.astype(np.float32), rate, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+def write_fixtures(directory: str = FIXTURE_DIR, durations=(10, 30, 90), rate: int = 16000) -> list[str]:
+    """
+    Writes one WAV per duration (skipping files that already exist) and returns their paths.
+    The signal is seeded, so every run and commit reads the same bytes.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for seconds in durations:
+        path = os.path.join(directory, f"synthetic_{seconds}s_{rate}hz.wav")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(make_wav_bytes(seconds, rate))
+        paths.append(path)
+    return paths
+
+
+def read_fixture(seconds: float, rate: int = 16000, directory: str = FIXTURE_DIR) -> bytes:
+    with open(write_fixtures(directory, (seconds,), rate)[0], "rb") as f:
+        return f.read()
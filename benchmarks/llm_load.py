@@ -0,0 +1,101 @@
+"""
+Load test for the Ollama client (services.llm) against the mock server: many concurrent
+"sessions", some asking the same prompt at the same moment.
+
+    python -m benchmarks.llm_load --sessions 16 --distinct 4 --max-concurrency 2
+    python -m benchmarks.llm_load --fail-first 3      # exercise retries
+
+Reports how many generations actually reached the server (coalescing), the server's peak
+concurrency (limiting), and caller latency percentiles (queueing fairness).
+"""
+from __future__ import annotations
+
+import os
+
+os.environ.setdefault("METRICS_ENABLED", "0")
+os.environ.setdefault("CACHE_DB_PATH", "")
+
+import argparse
+import json
+import statistics
+import threading
+import time
+
+from benchmarks.mock_ollama import running_mock
+
+
+def run(sessions: int = 16, distinct: int = 4, latency_s: float = 0.2, tokens_per_s: float = 200.0,
+        max_concurrency: int = 2, fail_first: int = 0, stream: bool = True) -> dict:
+    from services import llm
+
+    old_url = llm.OLLAMA_BASE_URL
+    latencies, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(sessions)
+
+    def session(i: int):
+        kwargs = dict(text=f"Sample text number {i % distinct}.", detected_lang="en", target_lang="en",
+                      native_lang="es", grammar_tool_summary="1 potential issue.", model="mock", use_cache=False)
+        barrier.wait()
+        t0 = time.perf_counter()
+        try:
+            if stream:
+                for _partial in llm.llm_weakest_point_stream(**kwargs):
+                    pass
+            else:
+                llm.llm_weakest_point(**kwargs)
+        except Exception as e:
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+            return
+        with lock:
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    with running_mock(latency_s=latency_s, tokens_per_s=tokens_per_s, max_concurrency=max_concurrency,
+                      fail_first=fail_first) as srv:
+        llm.OLLAMA_BASE_URL = srv.url
+        try:
+            before = llm.client_stats()
+            threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+            t0 = time.perf_counter()
+            for th in threads:
+                th.start()
+            for th in threads:
+                th.join()
+            wall = time.perf_counter() - t0
+            after = llm.client_stats()
+        finally:
+            llm.OLLAMA_BASE_URL = old_url
+
+    latencies.sort()
+    return {
+        "sessions": sessions,
+        "distinct_prompts": distinct,
+        "server_chat_requests": srv.chat_requests,
+        "server_peak_concurrency": srv.peak_concurrency,
+        "coalesced": after["coalesced"] - before["coalesced"],
+        "retries": after["retries"] - before["retries"],
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "latency_p50_ms": round(statistics.median(latencies), 1) if latencies else None,
+        "latency_max_ms": round(latencies[-1], 1) if latencies else None,
+        "client_max_queue_wait_s": after["max_wait_s"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, default=16)
+    ap.add_argument("--distinct", type=int, default=4, help="number of different prompts among the sessions")
+    ap.add_argument("--latency", type=float, default=0.2)
+    ap.add_argument("--tokens-per-s", type=float, default=200.0)
+    ap.add_argument("--max-concurrency", type=int, default=2, help="mock server's parallel generations")
+    ap.add_argument("--fail-first", type=int, default=0)
+    ap.add_argument("--no-stream", action="store_true")
+    args = ap.parse_args()
+    print(json.dumps(run(args.sessions, args.distinct, args.latency, args.tokens_per_s, args.max_concurrency,
+                         args.fail_first, stream=not args.no_stream), indent=2))
+
+
+if __name__ == "__main__":
+    main()
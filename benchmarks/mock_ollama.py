@@ -0,0 +1,164 @@
+"""
+Minimal stand-in for the Ollama HTTP API with configurable latency, for benchmarks and load tests.
+
+    python -m benchmarks.mock_ollama --port 11555 --latency 0.5 --tokens-per-s 40
+    python -m benchmarks.mock_ollama --max-concurrency 1 --fail-first 2   # like OLLAMA_NUM_PARALLEL=1
+
+Supports /api/tags, /api/generate (warm-up requests) and /api/chat, streaming (NDJSON) or not.
+Replies follow the Weakest:/Why:/Fixes: format so the coaching parsers have something to parse.
+Like Ollama, chat requests beyond max_concurrency wait for a free slot; chat_requests and
+peak_concurrency record what actually reached the "model".
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = (
+    "Weakest: verb tense consistency\n"
+    "Why: Several sentences switch between past and present. Keep one time frame per story.\n"
+    "Fixes:\n"
+    "- Pick a tense before you start speaking\n"
+    "- Mark time with words like yesterday or now\n"
+    "- Re-read each sentence and check the verb\n"
+)
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, latency_s: float = 0.0, tokens_per_s: float = 0.0, reply: str = REPLY,
+                 max_concurrency: int = 0, fail_first: int = 0):
+        super().__init__(addr, _Handler)
+        self.latency_s = latency_s          # before the first token (model "thinking")
+        self.tokens_per_s = tokens_per_s    # 0 = send the whole reply at once
+        self.reply = reply
+        self.fail_first = fail_first        # answer this many chat requests with 503 first
+        self.requests = 0
+        self.chat_requests = 0
+        self.active = 0
+        self.peak_concurrency = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: MockOllamaServer
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._json({"models": [{"name": "mock:latest"}, {"name": "llama3.2:3b"}]})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        req = json.loads(self.rfile.read(length) or b"{}")
+        with self.server._lock:
+            self.server.requests += 1
+        if self.path == "/api/generate":
+            self._json({"model": req.get("model"), "response": "", "done": True})
+            return
+        if self.path != "/api/chat":
+            self._json({"error": "not found"}, 404)
+            return
+
+        srv = self.server
+        with srv._lock:
+            srv.chat_requests += 1
+            fail = srv.chat_requests <= srv.fail_first
+        if fail:
+            self._json({"error": "server busy"}, 503)
+            return
+        if srv._slots is not None:
+            srv._slots.acquire()
+        with srv._lock:
+            srv.active += 1
+            srv.peak_concurrency = max(srv.peak_concurrency, srv.active)
+        try:
+            self._chat(srv, req)
+        finally:
+            with srv._lock:
+                srv.active -= 1
+            if srv._slots is not None:
+                srv._slots.release()
+
+    def _chat(self, srv: MockOllamaServer, req: dict):
+        time.sleep(srv.latency_s)
+        tokens = srv.reply.split(" ")
+        eval_ns = int(len(tokens) / srv.tokens_per_s * 1e9) if srv.tokens_per_s else 1_000_000
+        final = {"model": req.get("model"), "done": True, "eval_count": len(tokens), "eval_duration": eval_ns}
+
+        if not req.get("stream", True):
+            if srv.tokens_per_s:
+                time.sleep(len(tokens) / srv.tokens_per_s)
+            self._json({**final, "message": {"role": "assistant", "content": srv.reply}})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for i, tok in enumerate(tokens):
+            if srv.tokens_per_s:
+                time.sleep(1 / srv.tokens_per_s)
+            piece = tok if i == len(tokens) - 1 else tok + " "
+            line = {"model": req.get("model"), "done": False, "message": {"role": "assistant", "content": piece}}
+            self.wfile.write(json.dumps(line).encode() + b"\n")
+            self.wfile.flush()
+        self.wfile.write(json.dumps({**final, "message": {"role": "assistant", "content": ""}}).encode() + b"\n")
+        self.close_connection = True
+
+
+@contextmanager
+def running_mock(latency_s: float = 0.0, tokens_per_s: float = 0.0, port: int = 0, max_concurrency: int = 0,
+                 fail_first: int = 0):
+    """
+    Starts a mock server on localhost in a background thread and yields it (see .url).
+    """
+    srv = MockOllamaServer(("127.0.0.1", port), latency_s=latency_s, tokens_per_s=tokens_per_s,
+                           max_concurrency=max_concurrency, fail_first=fail_first)
+    th = threading.Thread(target=srv.serve_forever, name="mock-ollama", daemon=True)
+    th.start()
+    try:
+        yield srv
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=11555)
+    ap.add_argument("--latency", type=float, default=0.5, help="seconds before the first token")
+    ap.add_argument("--tokens-per-s", type=float, default=40.0)
+    ap.add_argument("--max-concurrency", type=int, default=0, help="parallel generations (0 = unlimited)")
+    ap.add_argument("--fail-first", type=int, default=0, help="answer the first N chat requests with 503")
+    args = ap.parse_args()
+    srv = MockOllamaServer(("127.0.0.1", args.port), latency_s=args.latency, tokens_per_s=args.tokens_per_s,
+                           max_concurrency=args.max_concurrency, fail_first=args.fail_first)
+    print(f"Mock Ollama on {srv.url} (OLLAMA_URL={srv.url})")
+    srv.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Benchmark runner for the service hot paths. Writes one JSON document so runs on different
+commits can be compared.
+
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --only text,langid,sqlite,llm --out bench.json
+    python -m benchmarks.run --only stt --whisper-sizes tiny,small --threads 2,4
+    python -m benchmarks.run --out new.json --compare bench.json
+
+Suites: text, langid, grammar, sqlite, llm, decode, stt. A suite whose backend is missing
+(e.g. no Java for LanguageTool) records an "error" entry instead of failing the run.
+"""
+from __future__ import annotations
+
+import os
+
+# Benchmarks must not pollute (or be slowed by) the app's metrics table or on-disk caches.
+os.environ.setdefault("METRICS_ENABLED", "0")
+os.environ.setdefault("CACHE_DB_PATH", "")
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import LANGS, generate_corpus
+
+SUITES = ("text", "langid", "grammar", "sqlite", "llm", "decode", "stt")
+
+
+def _rate(n: int, seconds: float) -> float:
+    return round(n / seconds, 2) if seconds else float("inf")
+
+
+def _ms_stats(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * (len(samples) - 1)))], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+def bench_text(corpus: list[dict]) -> dict:
+    from services import pron_analysis as pa
+
+    words = [w for doc in corpus for w in pa.tokenize_words(doc["text"])]
+    t0 = time.perf_counter()
+    for w in words:
+        pa.rough_syllable_count(w)
+    syl_s = time.perf_counter() - t0
+
+    texts = [doc["text"] for doc in corpus]
+    t0 = time.perf_counter()
+    for text in texts:
+        pa.pronunciation_targets(text, native_lang="en")
+    single_s = time.perf_counter() - t0
+
+    pa._syllables.cache_clear()
+    pa._mismatch_hits.cache_clear()
+    t0 = time.perf_counter()
+    pa.pronunciation_targets_batch(texts, native_lang="en")
+    batch_s = time.perf_counter() - t0
+
+    return {
+        "rough_syllable_count_words_per_s": _rate(len(words), syl_s),
+        "pronunciation_targets_docs_per_s": _rate(len(texts), single_s),
+        "pronunciation_targets_batch_docs_per_s": _rate(len(texts), batch_s),
+    }
+
+
+def bench_langid(corpus: list[dict]) -> dict:
+    from services.langid import detect_language
+
+    t0 = time.perf_counter()
+    correct = sum(detect_language(doc["text"]) == doc["lang"] for doc in corpus)
+    elapsed = time.perf_counter() - t0
+    return {"docs_per_s": _rate(len(corpus), elapsed), "accuracy": round(correct / len(corpus), 3)}
+
+
+def bench_grammar(corpus: list[dict], n_docs: int = 20) -> dict:
+    from services import grammar
+
+    out = {}
+    for lang in LANGS:
+        docs = [d["text"] for d in corpus if d["lang"] == lang][:n_docs]
+        grammar.grammar_feedback("Warm up.", lang)  # start the server outside the timing
+        cold, warm, requests = [], [], []
+        for text in docs:
+            grammar._SENTENCE_CACHE.clear()  # cold: no sentence of this text has been checked
+            checks = grammar.pool_stats()[grammar._map_lang(lang)]["checks"]
+            t0 = time.perf_counter()
+            grammar.grammar_feedback(text, lang)
+            cold.append((time.perf_counter() - t0) * 1000)
+            requests.append(grammar.pool_stats()[grammar._map_lang(lang)]["checks"] - checks)
+            t0 = time.perf_counter()
+            grammar.grammar_feedback(text + " One more sentence.", lang)  # small edit
+            warm.append((time.perf_counter() - t0) * 1000)
+        out[lang] = {"cold_full_check": _ms_stats(cold), "lt_requests_per_cold_check": max(requests),
+                     "after_small_edit": _ms_stats(warm)}
+    return out
+
+
+def bench_sqlite(n_attempts: int = 5000, n_speakers: int = 20) -> dict:
+    from services import progress
+
+    old_path = progress.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        progress.DB_PATH = os.path.join(tmp, "bench.db")
+        try:
+            progress.init_db()
+            t0 = time.perf_counter()
+            for i in range(n_attempts):
+                progress.save_attempt(
+                    speaker_id=f"speaker{i % n_speakers}", ts=f"2026-{1 + i % 12:02d}-{1 + i % 28:02d}T10:00:00",
+                    target_lang=LANGS[i % 4], detected_lang=LANGS[i % 4], transcript="x" * 400,
+                    weakest_point="article usage", num_issues=i % 7, llm_model="bench",
+                )
+            enqueue_s = time.perf_counter() - t0
+            progress.flush()
+            insert_s = time.perf_counter() - t0
+
+            page_ms = []
+            for i in range(200):
+                t0 = time.perf_counter()
+                progress.load_attempts_page(f"speaker{i % n_speakers}")
+                page_ms.append((time.perf_counter() - t0) * 1000)
+            trend_ms = []
+            for i in range(200):
+                t0 = time.perf_counter()
+                progress.load_trend(f"speaker{i % n_speakers}", period="week")
+                trend_ms.append((time.perf_counter() - t0) * 1000)
+        finally:
+            progress.DB_PATH = old_path
+    return {
+        "save_attempt_enqueue_per_s": _rate(n_attempts, enqueue_s),
+        "inserts_committed_per_s": _rate(n_attempts, insert_s),
+        "load_attempts_page": _ms_stats(page_ms),
+        "load_trend": _ms_stats(trend_ms),
+    }
+
+
+def bench_llm(latency_s: float = 0.2, tokens_per_s: float = 200.0, calls: int = 10) -> dict:
+    from benchmarks.mock_ollama import running_mock
+    from services import llm
+
+    old_url = llm.OLLAMA_BASE_URL
+    with running_mock(latency_s=latency_s, tokens_per_s=tokens_per_s) as srv:
+        llm.OLLAMA_BASE_URL = srv.url
+        try:
+            kwargs = dict(text="I goes to school.", detected_lang="en", target_lang="en", native_lang="es",
+                          grammar_tool_summary="1 potential issue.", model="mock", use_cache=False)
+            full, first = [], []
+            for _ in range(calls):
+                t0 = time.perf_counter()
+                llm.llm_weakest_point(**kwargs)
+                full.append((time.perf_counter() - t0) * 1000)
+                t0 = time.perf_counter()
+                stream = llm.llm_weakest_point_stream(**kwargs)
+                next(stream)
+                first.append((time.perf_counter() - t0) * 1000)
+                for _partial in stream:
+                    pass
+            t0 = time.perf_counter()
+            llm.llm_weakest_point(**{**kwargs, "use_cache": True})
+            llm.llm_weakest_point(**{**kwargs, "use_cache": True})
+            cached_ms = (time.perf_counter() - t0) * 1000 / 2
+        finally:
+            llm.OLLAMA_BASE_URL = old_url
+    return {
+        "mock_latency_s": latency_s,
+        "mock_tokens_per_s": tokens_per_s,
+        "blocking_call": _ms_stats(full),
+        "stream_first_token": _ms_stats(first),
+        "cached_call_ms": round(cached_ms, 3),
+    }
+
+
+def bench_decode(seconds: float = 30.0) -> dict:
+    from benchmarks import stt_decode
+
+    return stt_decode.run(seconds=seconds, repeat=5)
+
+
+def bench_stt(sizes=("tiny", "small"), threads=(1, 4), seconds: float = 30.0) -> dict:
+    from benchmarks.fixtures import read_fixture
+    from services import stt
+
+    audio = stt.decode_audio_bytes(read_fixture(seconds))
+    duration = len(audio) / stt.SAMPLE_RATE
+    out = {}
+    for size in sizes:
+        for n in threads:
+            t0 = time.perf_counter()
+            model = stt.get_model(size=size, cpu_threads=n)
+            load_s = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            segments, _info = model.transcribe(audio, vad_filter=False)
+            list(segments)
+            elapsed = time.perf_counter() - t0
+            out[f"{size}/threads={n}"] = {
+                "load_s": round(load_s, 2),
+                "transcribe_s": round(elapsed, 2),
+                "rtf": round(elapsed / duration, 3),
+            }
+    return out
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except Exception:
+        return None
+
+
+def _flatten(d: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            out.update(_flatten(v, key))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+
+def compare(new: dict, old: dict) -> list[str]:
+    """
+    Lines with the relative change of every numeric result present in both runs.
+    """
+    a, b = _flatten(old["results"]), _flatten(new["results"])
+    lines = []
+    for key in sorted(a.keys() & b.keys()):
+        if a[key]:
+            lines.append(f"{key:70s} {a[key]:>12g} -> {b[key]:>12g} ({(b[key] - a[key]) / a[key]:+.1%})")
+    return lines
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--only", default=",".join(s for s in SUITES if s != "stt"),
+                    help=f"comma-separated suites from {','.join(SUITES)} (stt is opt-in: it loads Whisper)")
+    ap.add_argument("--out", default=None, help="write results JSON here (default: stdout)")
+    ap.add_argument("--compare", default=None, help="earlier results JSON to diff against")
+    ap.add_argument("--docs", type=int, default=400, help="synthetic corpus size")
+    ap.add_argument("--whisper-sizes", default="tiny,small")
+    ap.add_argument("--threads", default="1,4")
+    ap.add_argument("--mock-latency", type=float, default=0.2)
+    args = ap.parse_args(argv)
+
+    corpus = generate_corpus(n_docs=args.docs)
+    runners = {
+        "text": lambda: bench_text(corpus),
+        "langid": lambda: bench_langid(corpus),
+        "grammar": lambda: bench_grammar(corpus),
+        "sqlite": bench_sqlite,
+        "llm": lambda: bench_llm(latency_s=args.mock_latency),
+        "decode": bench_decode,
+        "stt": lambda: bench_stt(sizes=args.whisper_sizes.split(","),
+                                 threads=[int(n) for n in args.threads.split(",")]),
+    }
+    results = {}
+    for name in args.only.split(","):
+        name = name.strip()
+        if name not in runners:
+            ap.error(f"unknown suite {name!r}")
+        print(f"running {name}...", file=sys.stderr)
+        t0 = time.perf_counter()
+        try:
+            results[name] = runners[name]()
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+        results[name]["suite_s"] = round(time.perf_counter() - t0, 2)
+
+    doc = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus_docs": args.docs,
+        "results": results,
+    }
+    text = json.dumps(doc, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        print(f"\nvs {old.get('commit')} ({old.get('timestamp')}):", file=sys.stderr)
+        for line in compare(doc, old):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Compares the in-memory decode path of services.stt against the temp-file route, for speed and
+for output (both should resample through libswresample, so the samples should match closely).
+
+    python -m benchmarks.stt_decode --seconds 60 --repeat 20
+    python -m benchmarks.stt_decode --transcribe   # also runs Whisper on both paths
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import read_fixture
+from services import stt
+
+
+def _decode_via_tempfile(audio_bytes: bytes) -> np.ndarray:
+    from faster_whisper.audio import decode_audio
+
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+        tmp_path = f.name
+        f.write(audio_bytes)
+    try:
+        return decode_audio(tmp_path, sampling_rate=stt.SAMPLE_RATE)
+    finally:
+        os.remove(tmp_path)
+
+
+def _time(fn, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return {"median_ms": round(statistics.median(times), 3), "min_ms": round(min(times), 3)}
+
+
+def _difference(a: np.ndarray, b: np.ndarray) -> dict:
+    n = min(len(a), len(b))
+    diff = a[:n] - b[:n]
+    return {"len_delta": len(a) - len(b), "max_abs": round(float(np.abs(diff).max(initial=0.0)), 5),
+            "rms": round(float(np.sqrt(np.mean(diff ** 2))) if n else 0.0, 5)}
+
+
+def run(seconds: float = 60.0, rates=(16000, 44100, 48000), repeat: int = 10, transcribe: bool = False) -> dict:
+    results = {}
+    for rate in rates:
+        wav = read_fixture(seconds, rate)
+        row = {
+            "in_memory": _time(lambda: stt.decode_audio_bytes(wav), repeat),
+            "temp_file": _time(lambda: _decode_via_tempfile(wav), repeat),
+            "difference": _difference(stt.decode_audio_bytes(wav), _decode_via_tempfile(wav)),
+        }
+        if transcribe:
+            model = stt.get_model()
+            row["transcribe_in_memory"] = _time(lambda: list(model.transcribe(stt.decode_audio_bytes(wav))[0]), 1)
+            row["transcribe_temp_file"] = _time(lambda: list(model.transcribe(_decode_via_tempfile(wav))[0]), 1)
+        results[f"{rate}Hz"] = row
+    return {"audio_seconds": seconds, "repeat": repeat, "results": results}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seconds", type=float, default=60.0)
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--transcribe", action="store_true", help="also time full Whisper transcription")
+    args = ap.parse_args()
+    print(json.dumps(run(args.seconds, repeat=args.repeat, transcribe=args.transcribe), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Cohort analytics over the whole progress history, via a columnar export of the attempts table.
+
+    python -m services.analytics export                    # data/attempts.arrow
+    python -m services.analytics summary --period week
+
+The export is an Arrow IPC file written chunk by chunk from SQLite. speaker_id, the language
+columns, weakest_point and llm_model are dictionary-encoded against one fixed dictionary per
+column, so repeated strings cost an int32 each. Loading memory-maps the file: columns are read
+zero-copy and transcript pages are never touched unless the transcript column is selected.
+
+Needs pyarrow: pip install "offline-language-coach[analytics]".
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+from services import progress
+
+ARROW_PATH = os.getenv(
+    "ANALYTICS_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "attempts.arrow")
+)
+EXPORT_CHUNK = int(os.getenv("ANALYTICS_EXPORT_CHUNK", "5000"))
+
+_DICT_COLUMNS = ("speaker_id", "target_lang", "detected_lang", "weakest_point", "llm_model")
+_EXPORT_COLUMNS = ("id", "speaker_id", "ts", "target_lang", "detected_lang", "weakest_point", "num_issues",
+                   "llm_model", "transcript")
+SUMMARY_COLUMNS = [c for c in _EXPORT_COLUMNS if c != "transcript"]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+    except ImportError as e:
+        raise ImportError(
+            'Analytics export needs pyarrow: pip install "offline-language-coach[analytics]"'
+        ) from e
+    return pyarrow
+
+
+def _schema(pa):
+    text_dict = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("id", pa.int64()),
+        ("speaker_id", text_dict),
+        ("ts", pa.timestamp("s")),
+        ("target_lang", text_dict),
+        ("detected_lang", text_dict),
+        ("weakest_point", text_dict),
+        ("num_issues", pa.int32()),
+        ("llm_model", text_dict),
+        ("transcript", pa.large_string()),
+    ])
+
+
+def _encode(column: str, values, codes: dict) -> list:
+    try:
+        return [None if v is None else codes[v] for v in values]
+    except KeyError as e:
+        raise RuntimeError(f"{column} value {e.args[0]!r} is missing from the export dictionary") from None
+
+
+def export_attempts(path: str = ARROW_PATH, chunk_size: int = EXPORT_CHUNK) -> dict:
+    """
+    Writes every attempt to an Arrow IPC file, one record batch per chunk of rows.
+    Replaces the file atomically; returns {"path", "rows", "bytes", "seconds"}.
+    """
+    pa = _pyarrow()
+    t0 = time.perf_counter()
+    progress.init_db()
+    progress.flush()
+
+    schema = _schema(pa)
+    rows_written = 0
+    tmp = path + ".tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Dictionaries and rows come from one snapshot, so every exported value is in its dictionary
+    # even if attempts are added or re-analysed meanwhile.
+    with progress.read_snapshot(), pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        max_id = progress.max_attempt_id()
+        dictionaries = {c: progress.distinct_values(c) for c in _DICT_COLUMNS}
+        codes = {c: {v: i for i, v in enumerate(values)} for c, values in dictionaries.items()}
+        dict_arrays = {c: pa.array(values, type=pa.string()) for c, values in dictionaries.items()}
+        for rows in progress.iter_attempt_chunks(chunk_size=chunk_size, columns=", ".join(_EXPORT_COLUMNS),
+                                                 max_id=max_id):
+            cols = dict(zip(_EXPORT_COLUMNS, zip(*rows)))
+            arrays = []
+            for field in schema:
+                values = cols[field.name]
+                if field.name in codes:
+                    idx = pa.array(_encode(field.name, values, codes[field.name]), type=pa.int32())
+                    arrays.append(pa.DictionaryArray.from_arrays(idx, dict_arrays[field.name]))
+                elif field.name == "ts":
+                    arrays.append(pa.compute.strptime(pa.array(values, type=pa.string()), format="%Y-%m-%dT%H:%M:%S",
+                                                      unit="s", error_is_null=True))
+                else:
+                    arrays.append(pa.array(values, type=field.type))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            rows_written += len(rows)
+    os.replace(tmp, path)
+    return {"path": path, "rows": rows_written, "bytes": os.path.getsize(path),
+            "seconds": round(time.perf_counter() - t0, 3)}
+
+
+def load_attempts_table(path: str = ARROW_PATH, columns=SUMMARY_COLUMNS):
+    """
+    Memory-mapped pyarrow Table of the export, restricted to `columns` (transcripts excluded by default).
+    """
+    pa = _pyarrow()
+    reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+    return reader.read_all().select(list(columns))
+
+
+def speaker_trends(table, period: str = "week"):
+    """
+    Per speaker, bucket and target language: attempts, issues and avg_issues, as a pandas DataFrame.
+    Week buckets start on Monday, like the attempt_stats table.
+    """
+    pa = _pyarrow()
+    pc = pa.compute
+    if period not in ("day", "week"):
+        raise ValueError("period must be 'day' or 'week'")
+    bucket = pc.floor_temporal(table["ts"], unit=period, week_starts_monday=True)
+    grouped = (
+        table.select(["speaker_id", "target_lang", "num_issues", "id"])
+        .append_column("bucket", bucket)
+        .filter(pc.is_valid(bucket))
+        .group_by(["speaker_id", "bucket", "target_lang"])
+        .aggregate([("id", "count"), ("num_issues", "sum"), ("num_issues", "mean")])
+    )
+    df = grouped.to_pandas().rename(columns={"id_count": "attempts", "num_issues_sum": "issues",
+                                             "num_issues_mean": "avg_issues"})
+    df["bucket"] = df["bucket"].dt.strftime("%Y-%m-%d")
+    df = df[["speaker_id", "bucket", "target_lang", "attempts", "issues", "avg_issues"]]
+    return df.sort_values(["speaker_id", "bucket", "target_lang"], ignore_index=True)
+
+
+def weakest_point_frequencies(table, speaker_id: str | None = None, top_n: int = 20):
+    """
+    Most common weakest points (optionally for one speaker), with counts and share of attempts.
+    """
+    pa = _pyarrow()
+    pc = pa.compute
+    if speaker_id is not None:
+        table = table.filter(pc.equal(table["speaker_id"].cast(pa.string()), speaker_id))
+    counts = (
+        table.filter(pc.is_valid(table["weakest_point"]))
+        .group_by("weakest_point")
+        .aggregate([("id", "count")])
+        .sort_by([("id_count", "descending")])
+        .slice(0, top_n)
+    )
+    df = counts.to_pandas().rename(columns={"id_count": "attempts"})
+    df["share"] = df["attempts"] / max(table.num_rows, 1)
+    return df[["weakest_point", "attempts", "share"]]
+
+
+def load_transcripts(ids, path: str = ARROW_PATH) -> dict:
+    """
+    {id: transcript} for the given attempt ids; only these rows of the transcript column are read.
+    """
+    pa = _pyarrow()
+    table = load_attempts_table(path, columns=("id", "transcript"))
+    picked = table.filter(pa.compute.is_in(table["id"], value_set=pa.array(list(ids), type=pa.int64())))
+    return dict(zip(picked["id"].to_pylist(), picked["transcript"].to_pylist()))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=["export", "summary"])
+    ap.add_argument("--path", default=ARROW_PATH)
+    ap.add_argument("--period", default="week", choices=["day", "week"])
+    ap.add_argument("--speaker-id", default=None)
+    args = ap.parse_args(argv)
+
+    if args.command == "export":
+        print(export_attempts(args.path))
+        return
+    table = load_attempts_table(args.path)
+    print(speaker_trends(table, period=args.period).to_string(index=False))
+    print()
+    print(weakest_point_frequencies(table, speaker_id=args.speaker_id).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Headless batch transcription for folders of recorded learner audio.
+
+    python -m services.batch recordings/ -o transcripts.jsonl --workers 4
+    python -m services.batch manifest.txt -o transcripts.jsonl --language es
+    python -m services.batch class_recordings/ -o transcripts.jsonl --workers 4 --long-audio
+
+A manifest is a text file with one audio path per line, or a JSONL file with
+{"path": ..., "language": ...} objects. Relative paths resolve against the manifest's folder.
+With --long-audio, files are handled one at a time and each is split into chunks that the
+workers transcribe in parallel (see services.long_audio), for 20-60 minute recordings.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3", ".m4a", ".webm")
+
+
+def collect_jobs(source: str, language: str | None = None) -> list[dict]:
+    """
+    Expands a directory or manifest into [{"path", "language"}] jobs.
+    """
+    if os.path.isdir(source):
+        jobs = []
+        for root, _dirs, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    jobs.append({"path": os.path.join(root, name), "language": language})
+        return sorted(jobs, key=lambda j: j["path"])
+
+    base = os.path.dirname(os.path.abspath(source))
+    jobs = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                path, lang = item["path"], item.get("language", language)
+            else:
+                path, lang = line, language
+            jobs.append({"path": os.path.join(base, path), "language": lang})
+    return jobs
+
+
+def _init_worker(size, compute_type, cpu_threads):
+    # Runs once per process: every file this worker handles reuses the same loaded model.
+    from services import stt
+
+    stt.WHISPER_MODEL_SIZE = size or stt.WHISPER_MODEL_SIZE
+    stt.WHISPER_COMPUTE_TYPE = compute_type or stt.WHISPER_COMPUTE_TYPE
+    if cpu_threads is not None:
+        stt.WHISPER_CPU_THREADS = cpu_threads
+    stt.get_model()
+
+
+def _transcribe_job(job: dict) -> dict:
+    from services.stt import transcribe_audio_bytes
+
+    t0 = time.perf_counter()
+    try:
+        with open(job["path"], "rb") as f:
+            res = transcribe_audio_bytes(f.read(), language_hint=job.get("language"))
+        out = {
+            "path": job["path"],
+            "text": res["text"],
+            "language": res["language"],
+            "language_probability": res["language_probability"],
+            "duration": res["duration"],
+            "segments": res["segments"],
+        }
+    except Exception as e:
+        out = {"path": job["path"], "error": f"{type(e).__name__}: {e}", "duration": 0.0}
+    out["latency_s"] = round(time.perf_counter() - t0, 3)
+    return out
+
+
+def _transcribe_long_job(job: dict, pool, workers: int) -> dict:
+    from services.long_audio import transcribe_long_audio
+
+    t0 = time.perf_counter()
+    try:
+        res = transcribe_long_audio(job["path"], language_hint=job.get("language"), workers=workers, executor=pool)
+        out = {
+            "path": job["path"],
+            "text": res["text"],
+            "language": res["language"],
+            "duration": res["duration"],
+            "segments": res["segments"],
+        }
+    except Exception as e:
+        out = {"path": job["path"], "error": f"{type(e).__name__}: {e}", "duration": 0.0}
+    out["latency_s"] = round(time.perf_counter() - t0, 3)
+    return out
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[idx]
+
+
+def run_batch(jobs: list[dict], out_path: str, workers: int = 2, size: str | None = None,
+              compute_type: str | None = None, cpu_threads: int | None = None, long_audio: bool = False,
+              log=sys.stderr) -> dict:
+    """
+    Transcribes jobs on a process pool, appending one JSON line per file as results complete.
+    long_audio=True parallelizes within each file (chunks) instead of across files.
+    Returns a summary with throughput (audio seconds per wall second) and latency percentiles.
+    """
+    workers = max(1, workers)
+    if cpu_threads is None:
+        cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    latencies, audio_s, failed = [], 0.0, 0
+    t0 = time.perf_counter()
+    with open(out_path, "w", encoding="utf-8") as out, ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(size, compute_type, cpu_threads),
+    ) as pool:
+        if long_audio:
+            results = (_transcribe_long_job(job, pool, workers) for job in jobs)
+        else:
+            results = (fut.result() for fut in as_completed([pool.submit(_transcribe_job, job) for job in jobs]))
+        for i, res in enumerate(results, start=1):
+            out.write(json.dumps(res, ensure_ascii=False) + "\n")
+            latencies.append(res["latency_s"])
+            audio_s += res.get("duration") or 0.0
+            failed += "error" in res
+            print(f"[{i}/{len(jobs)}] {res['path']} {res['latency_s']:.2f}s"
+                  + (f" ERROR {res['error']}" if "error" in res else ""), file=log)
+    wall = time.perf_counter() - t0
+
+    return {
+        "files": len(jobs),
+        "failed": failed,
+        "workers": workers,
+        "cpu_threads_per_worker": cpu_threads,
+        "audio_seconds": round(audio_s, 2),
+        "wall_seconds": round(wall, 2),
+        "throughput_audio_s_per_wall_s": round(audio_s / wall, 3) if wall else 0.0,
+        "latency_p50_s": _percentile(latencies, 0.5),
+        "latency_p95_s": _percentile(latencies, 0.95),
+        "latency_max_s": max(latencies, default=0.0),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("source", help="directory of audio files or a manifest file")
+    ap.add_argument("-o", "--output", default="transcripts.jsonl")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--model-size", default=None)
+    ap.add_argument("--compute-type", default=None)
+    ap.add_argument("--cpu-threads", type=int, default=None, help="per worker (default: cores / workers)")
+    ap.add_argument("--language", default=None, help="language hint for every file (default: auto-detect)")
+    ap.add_argument("--long-audio", action="store_true", help="split each file into chunks transcribed in parallel")
+    args = ap.parse_args(argv)
+
+    jobs = collect_jobs(args.source, language=args.language)
+    if not jobs:
+        ap.error(f"no audio files found in {args.source}")
+    summary = run_batch(jobs, args.output, workers=args.workers, size=args.model_size,
+                        compute_type=args.compute_type, cpu_threads=args.cpu_threads, long_audio=args.long_audio)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
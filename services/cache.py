@@ -0,0 +1,174 @@
+"""
+Two-tier result cache: an in-memory LRU in front of a SQLite file with size-based eviction
+and an optional TTL. Values must be JSON-serializable.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DB_PATH = os.getenv(
+    "CACHE_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "cache.db"),
+)
+
+_MISSING = object()
+
+
+def make_key(*parts) -> str:
+    """
+    Stable hex digest for a tuple of JSON-serializable parts (bytes are hashed as-is).
+    """
+    h = hashlib.sha256()
+    for p in parts:
+        if isinstance(p, (bytes, bytearray, memoryview)):
+            h.update(b"b")
+            h.update(p)
+        else:
+            h.update(b"j")
+            h.update(json.dumps(p, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class TieredCache:
+    def __init__(self, namespace: str, max_items: int = 256, max_disk_bytes: int = 64 * 1024 * 1024,
+                 db_path: str | None = CACHE_DB_PATH, ttl_s: float | None = None):
+        """
+        namespace: rows from different caches share one file but never collide.
+        max_items: entries kept in the memory tier.
+        max_disk_bytes: total payload size kept on disk for this namespace (0/None db_path = memory only).
+        ttl_s: entries older than this are treated as misses and dropped (None = never expire).
+        """
+        self.namespace = namespace
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self.db_path = db_path
+        self.ttl_s = ttl_s
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def _db(self):
+        if not self.db_path or not self.max_disk_bytes:
+            return None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                ns TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL DEFAULT 0,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (ns, key)
+            )
+            """)
+            cols = {row[1] for row in self._conn.execute("PRAGMA table_info(cache)")}
+            if "created" not in cols:
+                self._conn.execute("ALTER TABLE cache ADD COLUMN created REAL NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_lru ON cache (ns, accessed)")
+            self._conn.commit()
+        return self._conn
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_s is not None and time.time() - created > self.ttl_s
+
+    def _remember(self, key, value, created: float):
+        self._mem[key] = (value, created)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            if key in self._mem:
+                value, created = self._mem[key]
+                if not self._expired(created):
+                    self._mem.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._mem[key]
+            conn = self._db()
+            if conn is not None:
+                row = conn.execute(
+                    "SELECT value, created FROM cache WHERE ns=? AND key=?", (self.namespace, key)
+                ).fetchone()
+                if row is not None and self._expired(row[1]):
+                    conn.execute("DELETE FROM cache WHERE ns=? AND key=?", (self.namespace, key))
+                    conn.commit()
+                    self._stats["expired"] += 1
+                elif row is not None:
+                    conn.execute("UPDATE cache SET accessed=? WHERE ns=? AND key=?", (time.time(), self.namespace, key))
+                    conn.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self._stats["disk_hits"] += 1
+                    return value
+            self._stats["misses"] += 1
+            return default
+
+    def set(self, key: str, value) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._stats["stores"] += 1
+            conn = self._db()
+            if conn is None:
+                return
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (ns, key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, payload, len(payload), now, now),
+            )
+            self._evict_disk(conn)
+            conn.commit()
+
+    def _evict_disk(self, conn):
+        if self.ttl_s is not None:
+            cur = conn.execute("DELETE FROM cache WHERE ns=? AND created < ?", (self.namespace, time.time() - self.ttl_s))
+            self._stats["expired"] += cur.rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache WHERE ns=?", (self.namespace,)).fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        # Drop least recently accessed rows until we're back under budget.
+        rows = conn.execute("SELECT key, size FROM cache WHERE ns=? ORDER BY accessed", (self.namespace,))
+        victims = []
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            victims.append((self.namespace, key))
+            total -= size
+        conn.executemany("DELETE FROM cache WHERE ns=? AND key=?", victims)
+        self._stats["evictions"] += len(victims)
+
+    def get_or_compute(self, key: str, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            conn = self._db()
+            if conn is not None:
+                conn.execute("DELETE FROM cache WHERE ns=?", (self.namespace,))
+                conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+        lookups = s["memory_hits"] + s["disk_hits"] + s["misses"]
+        s["hit_rate"] = round((s["memory_hits"] + s["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return s
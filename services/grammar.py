@@ -1,6 +1,42 @@
+import os
+import queue
+import re
+import threading
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+
 import language_tool_python
 
-_TOOL_CACHE = {}
+from services.cache import TieredCache, make_key
+from services.metrics import record, timed
+
+# Checkers per language. Each local checker is its own Java server, so this also caps JVM memory.
+LT_POOL_SIZE = int(os.getenv("LT_POOL_SIZE", "2"))
+# Point every checker at one already-running LanguageTool HTTP server (e.g. http://localhost:8081)
+# instead of starting a JVM per checker.
+LT_SERVER_URL = os.getenv("LT_SERVER_URL") or None
+# Local servers that sat unused this long are shut down (restarted on next use).
+LT_IDLE_SHUTDOWN_S = float(os.getenv("LT_IDLE_SHUTDOWN_S", "900"))
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+_REAPER = None
+
+# Sentence-level results, so an edited transcript only re-checks the sentences that changed.
+# Memory only: a LanguageTool upgrade shouldn't be masked by stale on-disk results.
+_SENTENCE_CACHE = TieredCache("grammar", max_items=int(os.getenv("LT_SENTENCE_CACHE_ITEMS", "4096")), db_path=None)
+# Uncached sentences are checked together, one paragraph each, in a single LanguageTool request.
+_JOIN = "\n\n"
+
+# A sentence ends at . ! ? … followed by whitespace and something that starts a sentence, so
+# "etc. and" or "3 p.m. yesterday" stay in one piece; newlines always split.
+_BOUNDARY_RE = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"”»)]))\s+(?=[\"“«¿¡(]?[A-ZÀ-Ý0-9])|\s*\n\s*")
+# Titles and initials before a capitalised name ("Mr. Smith", "J. Smith") don't end a sentence.
+_ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "st", "sr", "sra", "srta", "jr", "mme", "mlle", "hr", "nr", "vs"}
+_LAST_WORD_RE = re.compile(r"(\w+)\.$")
+CONTEXT_CHARS = 40
+
 
 def _map_lang(lang_code: str) -> str:
     """
@@ -17,25 +53,260 @@ def _map_lang(lang_code: str) -> str:
         return "fr"
     return "en-US"
 
-def _get_tool(lang_code: str):
-    key = _map_lang(lang_code)
-    if key not in _TOOL_CACHE:
+
+class _CheckerPool:
+    """
+    Bounded pool of LanguageTool checkers for one language. A checker is used by one thread at a time;
+    callers beyond `size` wait for a free one.
+    """
+
+    def __init__(self, key: str, size: int):
+        self.key = key
+        self.size = max(size, 1)
+        self._idle = queue.LifoQueue()  # LIFO keeps the warmest checker busy and lets the rest go idle
+        self._lock = threading.Lock()
+        self._created = 0
+        self._last_used = time.time()
+        self.stats = {"checks": 0, "wait_s": 0.0, "check_s": 0.0, "max_wait_s": 0.0, "started": 0, "shutdowns": 0}
+
+    def _new_tool(self):
+        if LT_SERVER_URL:
+            return language_tool_python.LanguageTool(self.key, remote_server=LT_SERVER_URL)
         # language_tool_python runs LanguageTool locally (it may download LT on first run).
-        _TOOL_CACHE[key] = language_tool_python.LanguageTool(key)
-    return _TOOL_CACHE[key]
+        return language_tool_python.LanguageTool(self.key)
 
-def grammar_feedback(text: str, lang_code: str):
-    tool = _get_tool(lang_code)
-    matches = tool.check(text)
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                tool = self._new_tool()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+            with self._lock:
+                self.stats["started"] += 1
+            return tool
+        return self._idle.get()
 
-    simplified = []
+    def idle_for(self) -> float:
+        with self._lock:
+            return time.time() - self._last_used
+
+    @contextmanager
+    def checkout(self, touch: bool = True):
+        """
+        touch=False (warm-up checks) leaves the idle clock alone, so keeping a checker warm
+        doesn't stop it from being shut down once nobody uses it.
+        """
+        t0 = time.perf_counter()
+        tool = self._acquire()
+        wait = time.perf_counter() - t0
+        t1 = time.perf_counter()
+        try:
+            yield tool
+        finally:
+            elapsed = time.perf_counter() - t1
+            with self._lock:
+                if touch:
+                    self._last_used = time.time()
+                self.stats["checks"] += 1
+                self.stats["wait_s"] += wait
+                self.stats["check_s"] += elapsed
+                self.stats["max_wait_s"] = max(self.stats["max_wait_s"], wait)
+            self._idle.put(tool)
+            record("lt.queue", wait * 1000)
+            record("lt.check", elapsed * 1000)
+
+    def shutdown_if_idle(self, idle_s: float):
+        with self._lock:
+            if self._created == 0 or time.time() - self._last_used < idle_s:
+                return
+            # Only shut down when every checker is back in the pool (none mid-check).
+            if self._idle.qsize() != self._created:
+                return
+            tools = []
+            while True:
+                try:
+                    tools.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            self._created -= len(tools)
+            self.stats["shutdowns"] += len(tools)
+        for tool in tools:
+            try:
+                tool.close()
+            except Exception:
+                pass
+
+
+def _reap_idle():
+    while True:
+        time.sleep(min(60.0, LT_IDLE_SHUTDOWN_S))
+        with _POOLS_LOCK:
+            pools = list(_POOLS.values())
+        for pool in pools:
+            pool.shutdown_if_idle(LT_IDLE_SHUTDOWN_S)
+
+
+def _get_pool(lang_code: str) -> _CheckerPool:
+    global _REAPER
+    key = _map_lang(lang_code)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = _CheckerPool(key, LT_POOL_SIZE)
+        if _REAPER is None and LT_IDLE_SHUTDOWN_S > 0:
+            _REAPER = threading.Thread(target=_reap_idle, name="languagetool-reaper", daemon=True)
+            _REAPER.start()
+    return pool
+
+
+def warm_up(lang_code: str, force: bool = False) -> bool:
+    """
+    Starts (or keeps alive) a checker for the language with a tiny check. Unless forced, returns False
+    without checking when nobody has used the language for LT_IDLE_SHUTDOWN_S: idle shutdown wins
+    over re-warming. A forced warm-up counts as use.
+    """
+    pool = _get_pool(lang_code)
+    if not force and LT_IDLE_SHUTDOWN_S > 0 and pool.idle_for() >= LT_IDLE_SHUTDOWN_S:
+        return False
+    with pool.checkout(touch=force) as tool:
+        tool.check("Hello.")
+    return True
+
+
+def pool_stats() -> dict:
+    """
+    Per-language counters: checks, total/max time waiting for a checker vs. time spent checking.
+    """
+    with _POOLS_LOCK:
+        pools = dict(_POOLS)
+    out = {}
+    for key, pool in pools.items():
+        with pool._lock:
+            s = dict(pool.stats, size=pool.size, running=pool._created)
+        n = s["checks"] or 1
+        s["avg_wait_ms"] = round(1000 * s["wait_s"] / n, 2)
+        s["avg_check_ms"] = round(1000 * s["check_s"] / n, 2)
+        out[key] = s
+    return out
+
+
+def _is_abbreviation(before: str) -> bool:
+    m = _LAST_WORD_RE.search(before)
+    if m is None:
+        return False
+    word = m.group(1)
+    return word.lower() in _ABBREVIATIONS or (len(word) == 1 and word.isupper())
+
+
+def split_sentences(text: str) -> list[tuple[int, str]]:
+    """
+    Splits where sentence-final punctuation is followed by whitespace and a sentence start
+    (capital letter, digit, opening quote or inverted mark), and on newlines.
+    Returns (start_offset, sentence) pairs with surrounding whitespace trimmed.
+    """
+    out = []
+
+    def add(start: int, end: int):
+        chunk = text[start:end]
+        stripped = chunk.strip()
+        if stripped:
+            out.append((start + (len(chunk) - len(chunk.lstrip())), stripped))
+
+    pos = 0
+    for m in _BOUNDARY_RE.finditer(text):
+        if "\n" not in m.group() and _is_abbreviation(text[pos:m.start()]):
+            continue
+        add(pos, m.start())
+        pos = m.end()
+    add(pos, len(text))
+    return out
+
+
+def _check_sentences(lang_key: str, sentences: list[str]) -> list[list[dict]]:
+    """
+    Checks the sentences in one request and splits the matches back per sentence by offset.
+    Matches crossing from one sentence into the next are dropped.
+    """
+    starts, pos = [], 0
+    for sentence in sentences:
+        starts.append(pos)
+        pos += len(sentence) + len(_JOIN)
+    with _get_pool(lang_key).checkout() as tool:
+        matches = tool.check(_JOIN.join(sentences))
+    out = [[] for _ in sentences]
     for m in matches:
-        ctx = (m.context or "").replace("\n", " ")
-        simplified.append({
+        i = bisect_right(starts, m.offset) - 1
+        offset = m.offset - starts[i]
+        if offset + m.errorLength > len(sentences[i]):
+            continue
+        out[i].append({
             "rule": getattr(m, "ruleId", "RULE"),
             "message": m.message,
-            "context": ctx,
+            "offset": offset,
+            "length": m.errorLength,
         })
+    return out
+
+
+def grammar_feedback(text: str, lang_code: str):
+    """
+    Checks text sentence by sentence. Sentences seen before (same language, same text) come from
+    the cache; only new or edited ones go to LanguageTool, together in one request.
+    Offsets and context are mapped back onto the full text. Rules that span two sentences are
+    not reported.
+    """
+    with timed("grammar") as fields:
+        return _grammar_feedback(text, lang_code, fields)
+
+
+def _grammar_feedback(text: str, lang_code: str, fields: dict):
+    lang_key = _map_lang(lang_code)
+    sentences = split_sentences(text)
+
+    keys = [make_key(lang_key, sentence) for _start, sentence in sentences]
+
+    results = {}
+    todo = {}  # key -> sentence, for cache misses
+    for key, (_start, sentence) in zip(keys, sentences):
+        if key in results or key in todo:
+            continue
+        hit = _SENTENCE_CACHE.get(key)
+        if hit is not None:
+            results[key] = hit
+        else:
+            todo[key] = sentence
+    fields["cache_hit"] = not todo
+    if todo:
+        for key, matches in zip(todo, _check_sentences(lang_key, list(todo.values()))):
+            results[key] = matches
+            _SENTENCE_CACHE.set(key, matches)
+
+    simplified = []
+    for key, (start, _sentence) in zip(keys, sentences):
+        for m in results[key]:
+            offset = start + m["offset"]
+            ctx = text[max(0, offset - CONTEXT_CHARS): offset + m["length"] + CONTEXT_CHARS]
+            simplified.append({
+                "rule": m["rule"],
+                "message": m["message"],
+                "context": ctx.replace("\n", " "),
+                "offset": offset,
+                "length": m["length"],
+            })
+
+    summary = f"{len(simplified)} potential issues flagged by LanguageTool."
+    return {"summary": summary, "matches": simplified, "num_matches": len(simplified)}
+
 
-    summary = f"{len(matches)} potential issues flagged by LanguageTool."
-    return {"summary": summary, "matches": simplified, "num_matches": len(matches)}
+def sentence_cache_stats() -> dict:
+    return _SENTENCE_CACHE.stats()
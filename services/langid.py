@@ -1,13 +1,96 @@
-from langdetect import detect, DetectorFactory
+from __future__ import annotations
 
-DetectorFactory.seed = 0
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 
-def detect_language(text: str) -> str:
+# Only the languages the app supports are candidates: fewer profiles is faster and avoids
+# near-miss answers (e.g. "ca" for short Spanish text).
+SUPPORTED_LANGS = tuple(os.getenv("LANGID_LANGS", "en,es,de,fr").split(","))
+# Whisper's own language guess is trusted above this probability.
+WHISPER_CONFIDENCE = float(os.getenv("LANGID_WHISPER_CONFIDENCE", "0.8"))
+MEMO_SIZE = 4096
+
+_FACTORY = None
+_FACTORY_LOCK = threading.Lock()
+_MEMO = OrderedDict()
+_MEMO_LOCK = threading.Lock()
+
+
+def _factory():
     """
-    Offline language identification.
-    For best accuracy later, you can swap to fastText LID (still offline).
+    Loads the langdetect profiles for SUPPORTED_LANGS once. Uses its own factory with a fixed seed
+    instead of the global DetectorFactory.seed, so results are deterministic without global state.
     """
+    global _FACTORY
+    with _FACTORY_LOCK:
+        if _FACTORY is None:
+            from langdetect.detector_factory import DetectorFactory, PROFILES_DIRECTORY
+
+            profiles = []
+            for lang in SUPPORTED_LANGS:
+                with open(os.path.join(PROFILES_DIRECTORY, lang), encoding="utf-8") as f:
+                    profiles.append(f.read())
+            factory = DetectorFactory()
+            factory.load_json_profile(profiles)
+            factory.set_seed(0)
+            _FACTORY = factory
+        return _FACTORY
+
+
+def _text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _detect_uncached(text: str) -> str:
     try:
-        return detect(text)
+        detector = _factory().create()
+        detector.append(text)
+        return detector.detect()
     except Exception:
         return "unknown"
+
+
+def detect_language(text: str, whisper_lang: str | None = None, whisper_prob: float | None = None) -> str:
+    """
+    Offline language identification over SUPPORTED_LANGS.
+    If Whisper already reported a supported language with probability >= WHISPER_CONFIDENCE,
+    that answer is used as-is. Results are memoized per text hash.
+    For best accuracy later, you can swap to fastText LID (still offline).
+    """
+    if whisper_lang in SUPPORTED_LANGS and (whisper_prob or 0.0) >= WHISPER_CONFIDENCE:
+        return whisper_lang
+
+    key = _text_key(text)
+    with _MEMO_LOCK:
+        if key in _MEMO:
+            _MEMO.move_to_end(key)
+            return _MEMO[key]
+
+    lang = _detect_uncached(text)
+    with _MEMO_LOCK:
+        _MEMO[key] = lang
+        while len(_MEMO) > MEMO_SIZE:
+            _MEMO.popitem(last=False)
+    return lang
+
+
+def detect_languages(texts, whisper_hints=None) -> list[str]:
+    """
+    Batch variant: duplicate texts are detected once. whisper_hints, if given, is a parallel
+    list of (language, probability) tuples or None.
+    """
+    texts = list(texts)
+    hints = list(whisper_hints) if whisper_hints is not None else [None] * len(texts)
+    seen = {}
+    out = []
+    for text, hint in zip(texts, hints):
+        if hint is not None:
+            out.append(detect_language(text, whisper_lang=hint[0], whisper_prob=hint[1]))
+            continue
+        key = _text_key(text)
+        if key not in seen:
+            seen[key] = detect_language(text)
+        out.append(seen[key])
+    return out
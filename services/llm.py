@@ -1,7 +1,15 @@
 from __future__ import annotations
 
+import json
 import os
+import threading
+import time
+from collections import deque
+
 import requests
+from requests.adapters import HTTPAdapter
+from services.cache import TieredCache, make_key
+from services.metrics import record
 from services.prompts import (
     WEAKEST_POINT_PROMPT,
     PRACTICE_MODULE_PROMPT,
@@ -9,26 +17,91 @@ from services.prompts import (
 )
 
 OLLAMA_BASE_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+# Ollama resets a model's expiry on every request, so every request has to ask for the same keep_alive.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "4"))
+# Generations sent to Ollama at once; match OLLAMA_NUM_PARALLEL. Extra requests wait in FIFO order.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+LLM_QUEUE_TIMEOUT_S = float(os.getenv("LLM_QUEUE_TIMEOUT_S", "600"))
+# Connecting to a local server is instant or broken; reading can legitimately take a while
+# (the read timeout is the longest allowed silence between streamed chunks).
+LLM_CONNECT_TIMEOUT_S = float(os.getenv("LLM_CONNECT_TIMEOUT_S", "3"))
+LLM_READ_TIMEOUT_S = float(os.getenv("LLM_READ_TIMEOUT_S", "120"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_RETRY_BACKOFF_S = 0.5
+_RETRY_STATUS = {429, 502, 503, 504}
+
+# Prompts are deterministic templates, so identical inputs can reuse an earlier generation.
+_RESPONSE_CACHE = TieredCache(
+    "llm",
+    max_items=int(os.getenv("LLM_CACHE_ITEMS", "128")),
+    max_disk_bytes=int(os.getenv("LLM_CACHE_DISK_MB", "16")) * 1024 * 1024,
+    ttl_s=float(os.getenv("LLM_CACHE_TTL_HOURS", "168")) * 3600,
+)
 
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
 
 
-def _chat(system: str, user: str, model: str) -> str:
+def _session() -> requests.Session:
     """
-    Calls Ollama /api/chat and returns assistant message content as a string.
+    One keep-alive session for all Ollama calls, so each call reuses a pooled connection.
     """
-    url = f"{OLLAMA_BASE_URL}/api/chat"
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(LLM_MAX_WORKERS, LLM_MAX_CONCURRENCY))
+            sess.mount("http://", adapter)
+            sess.mount("https://", adapter)
+            _SESSION = sess
+        return _SESSION
+
 
+def _chat_payload(system: str, user: str, model: str, stream: bool, options: dict | None = None) -> dict:
     payload = {
         "model": model,
         "messages": [
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ],
-        "stream": False,
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
     }
+    if options:
+        payload["options"] = options
+    return payload
+
+
+def _cache_key(system: str, user: str, model: str, options: dict | None) -> str:
+    return make_key(model, system, user, options or {})
+
+
+def _token_fields(data: dict) -> dict:
+    """
+    Generation stats from Ollama's final response object (eval_duration is in nanoseconds).
+    """
+    tokens = data.get("eval_count")
+    duration_ns = data.get("eval_duration")
+    if not tokens:
+        return {}
+    tps = tokens / (duration_ns / 1e9) if duration_ns else None
+    return {"tokens": tokens, "tokens_per_s": round(tps, 2) if tps else None}
+
+
+def _elapsed_ms(t0: float) -> float:
+    return (time.perf_counter() - t0) * 1000
+
+
+def cache_stats() -> dict:
+    return _RESPONSE_CACHE.stats()
 
-    r = requests.post(url, json=payload, timeout=120)
 
+def clear_cache() -> None:
+    _RESPONSE_CACHE.clear()
+
+
+def _raise_for_status(r, url: str):
     if not r.ok:
         # Print useful debug info for terminal logs
         print("LLM HTTP status:", r.status_code)
@@ -36,29 +109,280 @@ def _chat(system: str, user: str, model: str) -> str:
         print("LLM response (first 2000 chars):", r.text[:2000])
         r.raise_for_status()
 
-    data = r.json()
 
-    # Ollama chat response usually looks like:
-    # {"message": {"role":"assistant","content":"..."} , ...}
-    msg = data.get("message") or {}
-    content = msg.get("content")
+class _FairLimiter:
+    """
+    Counting semaphore that admits waiters strictly in arrival order. threading.Semaphore makes
+    no ordering promise, so under a burst an early request could keep losing the race.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()
+        self.max_wait_s = 0.0
+
+    def acquire(self, timeout: float | None = None) -> float:
+        """
+        Blocks until a slot is free and returns the seconds spent waiting.
+        """
+        t0 = time.perf_counter()
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                return 0.0
+            ev = threading.Event()
+            self._waiters.append(ev)
+        if not ev.wait(timeout):
+            with self._lock:
+                if ev in self._waiters:
+                    self._waiters.remove(ev)
+                    raise TimeoutError(f"waited {timeout:.0f}s for a free Ollama slot")
+            # Otherwise the slot was handed over just as the wait timed out.
+        waited = time.perf_counter() - t0
+        self.max_wait_s = max(self.max_wait_s, waited)
+        return waited
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()  # the slot passes straight to the oldest waiter
+            else:
+                self._active -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"limit": self.limit, "active": self._active, "waiting": len(self._waiters),
+                    "max_wait_s": round(self.max_wait_s, 3)}
+
+
+class _Flight:
+    """
+    One in-progress Ollama generation. Any number of callers can read its chunks, from the
+    start, while a background thread appends them.
+    """
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self.final: dict = {}
+        self.error: BaseException | None = None
+        self.done = False
+        self.store = False  # write the reply to the response cache (some caller passed use_cache=True)
+        self._cond = threading.Condition()
+
+    def push(self, chunk: str):
+        with self._cond:
+            self.parts.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, final: dict | None = None, error: BaseException | None = None):
+        with self._cond:
+            self.final = final or {}
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def chunks(self):
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.parts) and not self.done:
+                    self._cond.wait()
+                new, done, error = self.parts[i:], self.done, self.error
+            i += len(new)
+            yield from new
+            if done:
+                if error is not None:
+                    raise error
+                return
 
-    if not isinstance(content, str):
-        # Fallback: return entire JSON as string for visibility
-        return str(data)
 
+_LIMITER = _FairLimiter(LLM_MAX_CONCURRENCY)
+_FLIGHTS: dict[str, _Flight] = {}
+_FLIGHTS_LOCK = threading.Lock()
+_CLIENT_STATS = {"requests": 0, "coalesced": 0, "retries": 0, "errors": 0}
+
+
+def client_stats() -> dict:
+    with _FLIGHTS_LOCK:
+        return {**_CLIENT_STATS, "in_flight": len(_FLIGHTS), **_LIMITER.stats()}
+
+
+def _post_chat(payload: dict, flight: _Flight) -> dict:
+    """
+    Streams one /api/chat generation into `flight` and returns Ollama's final object.
+    Connection failures and overload statuses are retried with backoff, but only before the
+    first chunk: after that a retry would duplicate output.
+    """
+    url = f"{OLLAMA_BASE_URL}/api/chat"
+    for attempt in range(LLM_RETRIES + 1):
+        try:
+            r = _session().post(url, json=payload, stream=True, timeout=(LLM_CONNECT_TIMEOUT_S, LLM_READ_TIMEOUT_S))
+        except requests.ConnectionError:
+            if attempt == LLM_RETRIES:
+                raise
+        else:
+            if r.status_code not in _RETRY_STATUS or attempt == LLM_RETRIES:
+                break
+            r.close()
+        with _FLIGHTS_LOCK:
+            _CLIENT_STATS["retries"] += 1
+        time.sleep(LLM_RETRY_BACKOFF_S * 2 ** attempt)
+
+    with r:
+        _raise_for_status(r, url)
+        for line in r.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("error"):
+                raise RuntimeError(f"Ollama error: {data['error']}")
+            chunk = (data.get("message") or {}).get("content")
+            if chunk:
+                flight.push(chunk)
+            if data.get("done"):
+                return data
+    raise RuntimeError("Ollama closed the stream before the generation was done")
+
+
+def _generate(key: str, payload: dict, flight: _Flight):
+    try:
+        waited = _LIMITER.acquire(timeout=LLM_QUEUE_TIMEOUT_S)
+        record("llm.queue", waited * 1000)
+        try:
+            final = _post_chat(payload, flight)
+        finally:
+            _LIMITER.release()
+        # Cache before finishing, so a caller arriving after the flight is gone hits the cache.
+        with _FLIGHTS_LOCK:
+            store = flight.store
+        if store:
+            _RESPONSE_CACHE.set(key, "".join(flight.parts))
+        flight.finish(final=final)
+    except Exception as e:
+        with _FLIGHTS_LOCK:
+            _CLIENT_STATS["errors"] += 1
+        flight.finish(error=e)
+    finally:
+        with _FLIGHTS_LOCK:
+            if _FLIGHTS.get(key) is flight:
+                del _FLIGHTS[key]
+
+
+def _join_flight(key: str, payload: dict, use_cache: bool = True) -> _Flight:
+    """
+    Single-flight: identical requests already in progress share that generation instead of
+    sending a duplicate to Ollama. The reply is cached unless every caller passed use_cache=False.
+    """
+    with _FLIGHTS_LOCK:
+        flight = _FLIGHTS.get(key)
+        if flight is not None:
+            _CLIENT_STATS["coalesced"] += 1
+            flight.store = flight.store or use_cache
+            return flight
+        flight = _FLIGHTS[key] = _Flight()
+        flight.store = use_cache
+        _CLIENT_STATS["requests"] += 1
+    # The generation runs on its own thread so it completes (and is cached) even if the caller
+    # that started it stops reading.
+    threading.Thread(target=_generate, args=(key, payload, flight), name="ollama-request", daemon=True).start()
+    return flight
+
+
+def _chat(system: str, user: str, model: str, options: dict | None = None, use_cache: bool = True) -> str:
+    """
+    Calls Ollama /api/chat and returns assistant message content as a string.
+    Responses are cached on (model, prompts, options). use_cache=False neither reads nor writes
+    the cache, so a forced answer doesn't replace the cached one; identical requests in flight at
+    the same time are always coalesced.
+    """
+    t0 = time.perf_counter()
+    key = _cache_key(system, user, model, options)
+    if use_cache:
+        hit = _RESPONSE_CACHE.get(key)
+        if hit is not None:
+            record("llm.chat", _elapsed_ms(t0), cache_hit=True)
+            return hit
+
+    flight = _join_flight(key, _chat_payload(system, user, model, stream=True, options=options), use_cache)
+    content = "".join(flight.chunks())
+    record("llm.chat", _elapsed_ms(t0), cache_hit=False, **_token_fields(flight.final))
     return content
 
 
-def llm_weakest_point(
-    text: str,
-    detected_lang: str,
-    target_lang: str,
-    native_lang: str,
-    grammar_tool_summary: str,
-    model: str | None = None,
-):
-    user_prompt = WEAKEST_POINT_PROMPT.format(
+def _chat_stream(system: str, user: str, model: str, options: dict | None = None, use_cache: bool = True):
+    """
+    Streaming variant of _chat: yields assistant content chunks as Ollama generates them.
+    Ollama streams NDJSON, one {"message": {"content": "..."}, "done": false} object per line.
+    A cached response is yielded as a single chunk; a completed stream is stored in the cache
+    (unless use_cache=False).
+    """
+    t0 = time.perf_counter()
+    key = _cache_key(system, user, model, options)
+    if use_cache:
+        hit = _RESPONSE_CACHE.get(key)
+        if hit is not None:
+            record("llm.chat_stream", _elapsed_ms(t0), cache_hit=True)
+            yield hit
+            return
+
+    flight = _join_flight(key, _chat_payload(system, user, model, stream=True, options=options), use_cache)
+    first = True
+    for chunk in flight.chunks():
+        if first:
+            record("llm.first_token", _elapsed_ms(t0))
+            first = False
+        yield chunk
+    record("llm.chat_stream", _elapsed_ms(t0), cache_hit=False, **_token_fields(flight.final))
+
+
+class _WeakestPointParser:
+    """
+    Incremental parser for the Weakest:/Why:/Fixes: format. Feed it chunks; each complete
+    line is parsed once, and snapshot() also looks at the unfinished last line.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self._pending = ""
+        self.weakest = "Unknown"
+        self.weakest_done = False  # a complete Weakest: line has been parsed
+        self.why = ""
+        self.fixes: list[str] = []
+
+    def _parse_line(self, line: str, state: dict):
+        low = line.lower().strip()
+        if low.startswith("weakest:"):
+            state["weakest"] = line.split(":", 1)[1].strip()
+            state["weakest_done"] = True
+        elif low.startswith("why:"):
+            state["why"] = line.split(":", 1)[1].strip()
+        elif line.strip().startswith("-"):
+            state["fixes"].append(line.strip()[1:].strip())
+
+    def feed(self, chunk: str):
+        self.raw += chunk
+        self._pending += chunk
+        *lines, self._pending = self._pending.split("\n")
+        state = {"weakest": self.weakest, "why": self.why, "fixes": self.fixes}
+        for line in lines:
+            self._parse_line(line.rstrip("\r"), state)
+        self.weakest, self.why = state["weakest"], state["why"]
+        self.weakest_done = self.weakest_done or state.get("weakest_done", False)
+
+    def snapshot(self, final: bool = False) -> dict:
+        state = {"weakest": self.weakest, "why": self.why, "fixes": list(self.fixes)}
+        if self._pending:
+            self._parse_line(self._pending, state)
+        why = state["why"]
+        if final and not why:
+            why = self.raw.strip()
+        return {"weakest_point": state["weakest"], "explanation": why, "fixes": state["fixes"][:8]}
+
+
+def _weakest_point_prompt(text, detected_lang, target_lang, native_lang, grammar_tool_summary) -> str:
+    return WEAKEST_POINT_PROMPT.format(
         text=text,
         detected_lang=detected_lang,
         target_lang=target_lang,
@@ -66,25 +390,68 @@ def llm_weakest_point(
         native_lang=native_lang,
     )
 
-    out_text = _chat(system="You are a precise language tutor.", user=user_prompt, model=model)
 
-    weakest = "Unknown"
-    why = ""
-    fixes: list[str] = []
+def _practice_module_prompt(text, detected_lang, target_lang, weakest_point, native_lang) -> str:
+    return PRACTICE_MODULE_PROMPT.format(
+        text=text,
+        detected_lang=detected_lang,
+        target_lang=target_lang,
+        weakest_point=weakest_point,
+        native_lang=native_lang,
+    )
 
-    for line in out_text.splitlines():
-        low = line.lower().strip()
-        if low.startswith("weakest:"):
-            weakest = line.split(":", 1)[1].strip()
-        elif low.startswith("why:"):
-            why = line.split(":", 1)[1].strip()
-        elif line.strip().startswith("-"):
-            fixes.append(line.strip()[1:].strip())
 
-    if not why:
-        why = out_text.strip()
+WEAKEST_POINT_SYSTEM = "You are a precise language tutor."
+PRACTICE_MODULE_SYSTEM = "You create targeted practice modules for language learners."
+PRONUNCIATION_SYSTEM = "You provide cautious, practical pronunciation coaching."
+
+
+def llm_weakest_point(
+    text: str,
+    detected_lang: str,
+    target_lang: str,
+    native_lang: str,
+    grammar_tool_summary: str,
+    model: str | None = None,
+    use_cache: bool = True,
+):
+    user_prompt = _weakest_point_prompt(text, detected_lang, target_lang, native_lang, grammar_tool_summary)
+    out_text = _chat(system=WEAKEST_POINT_SYSTEM, user=user_prompt, model=model, use_cache=use_cache)
+
+    parser = _WeakestPointParser()
+    parser.feed(out_text)
+    return parser.snapshot(final=True)
 
-    return {"weakest_point": weakest, "explanation": why, "fixes": fixes[:8]}
+
+def llm_weakest_point_stream(
+    text: str,
+    detected_lang: str,
+    target_lang: str,
+    native_lang: str,
+    grammar_tool_summary: str,
+    model: str | None = None,
+    use_cache: bool = True,
+    on_weakest_point=None,
+):
+    """
+    Yields partial {"weakest_point", "explanation", "fixes"} dicts while the model generates.
+    The last one yielded equals what llm_weakest_point would return.
+    on_weakest_point(str) is called once, as soon as the Weakest: line is complete (at the end if
+    the model never writes one), so follow-up prompts needn't wait for the Why/Fixes lines.
+    """
+    user_prompt = _weakest_point_prompt(text, detected_lang, target_lang, native_lang, grammar_tool_summary)
+    parser = _WeakestPointParser()
+    announced = on_weakest_point is None
+    for chunk in _chat_stream(system=WEAKEST_POINT_SYSTEM, user=user_prompt, model=model, use_cache=use_cache):
+        parser.feed(chunk)
+        if not announced and parser.weakest_done:
+            on_weakest_point(parser.weakest)
+            announced = True
+        yield parser.snapshot()
+    final = parser.snapshot(final=True)
+    if not announced:
+        on_weakest_point(final["weakest_point"])
+    yield final
 
 
 def llm_generate_practice_module(
@@ -94,26 +461,39 @@ def llm_generate_practice_module(
     weakest_point: str,
     native_lang: str,
     model: str | None = None,
+    use_cache: bool = True,
 ) -> str:
-    user_prompt = PRACTICE_MODULE_PROMPT.format(
-        text=text,
-        detected_lang=detected_lang,
-        target_lang=target_lang,
-        weakest_point=weakest_point,
-        native_lang=native_lang,
-    )
+    user_prompt = _practice_module_prompt(text, detected_lang, target_lang, weakest_point, native_lang)
     return _chat(
-        system="You create targeted practice modules for language learners.",
+        system=PRACTICE_MODULE_SYSTEM,
         user=user_prompt,
         model=model,
+        use_cache=use_cache,
     )
 
 
+def llm_generate_practice_module_stream(
+    text: str,
+    detected_lang: str,
+    target_lang: str,
+    weakest_point: str,
+    native_lang: str,
+    model: str | None = None,
+    use_cache: bool = True,
+):
+    """
+    Yields practice-module text chunks as they are generated.
+    """
+    user_prompt = _practice_module_prompt(text, detected_lang, target_lang, weakest_point, native_lang)
+    yield from _chat_stream(system=PRACTICE_MODULE_SYSTEM, user=user_prompt, model=model, use_cache=use_cache)
+
+
 def llm_pronunciation_feedback(
     text: str,
     target_lang: str,
     latin_pron: str,
     model: str | None = None,
+    use_cache: bool = True,
 ) -> str:
     user_prompt = PRONUNCIATION_PROMPT.format(
         text=text,
@@ -121,7 +501,8 @@ def llm_pronunciation_feedback(
         latin_pron=latin_pron,
     )
     return _chat(
-        system="You provide cautious, practical pronunciation coaching.",
+        system=PRONUNCIATION_SYSTEM,
         user=user_prompt,
         model=model,
+        use_cache=use_cache,
     )
@@ -0,0 +1,261 @@
+"""
+Long-recording transcription (20-60 minute class recordings).
+
+The file is read in blocks (soundfile for WAV/FLAC/OGG/MP3, PyAV for M4A/WebM and other formats
+libsndfile can't read) and cut into ~CHUNK_S chunks at silences, each padded with OVERLAP_S
+of audio on both sides. Chunks are transcribed in parallel worker processes (one Whisper model
+each), then stitched: every chunk only keeps segments whose midpoint falls inside its own span,
+so words in the overlap aren't duplicated. Memory is bounded by chunk size x chunks in flight,
+not by recording length.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import soundfile as sf
+
+from services import stt
+from services.metrics import record
+
+CHUNK_S = float(os.getenv("LONG_AUDIO_CHUNK_S", "60"))
+OVERLAP_S = float(os.getenv("LONG_AUDIO_OVERLAP_S", "2"))
+SEARCH_S = 10.0  # how far back from the nominal chunk end to look for a silence
+LONG_AUDIO_WORKERS = int(os.getenv("LONG_AUDIO_WORKERS", "2"))
+READ_BLOCK_S = 10.0
+
+
+def _find_cut(window: np.ndarray, rate: int) -> int:
+    """
+    Best place to cut inside `window` (mono, native rate): the middle of the longest non-speech gap
+    per Silero VAD, or the quietest 30 ms frame when VAD finds no gap.
+    """
+    audio16 = stt._resample(window, rate)
+    try:
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+        speech = get_speech_timestamps(audio16, vad_options=VadOptions(min_silence_duration_ms=200))
+        bounds = [0] + [x for ts in speech for x in (ts["start"], ts["end"])] + [len(audio16)]
+        gaps = [(bounds[i + 1] - bounds[i], bounds[i], bounds[i + 1]) for i in range(0, len(bounds) - 1, 2)]
+        length, start, end = max(gaps)
+        if length > 0 and speech:
+            return int((start + end) / 2 * rate / stt.SAMPLE_RATE)
+    except ImportError:
+        pass
+
+    frame = max(int(0.03 * rate), 1)
+    n = len(window) // frame
+    if n == 0:
+        return len(window)
+    energy = (window[: n * frame].reshape(n, frame) ** 2).mean(axis=1)
+    return int(np.argmin(energy) * frame + frame // 2)
+
+
+def _sf_blocks(f: sf.SoundFile):
+    while True:
+        block = f.read(int(READ_BLOCK_S * f.samplerate), dtype="float32", always_2d=True)
+        if len(block) == 0:
+            return
+        yield block[:, 0] if block.shape[1] == 1 else block.mean(axis=1, dtype=np.float32)
+
+
+def _av_blocks(container, stream):
+    import av
+
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=stream.rate)
+    for frame in container.decode(stream):
+        for out in resampler.resample(frame):
+            yield out.to_ndarray()[0]
+    for out in resampler.resample(None):
+        yield out.to_ndarray()[0]
+
+
+@contextmanager
+def _open_audio(source):
+    """
+    (rate, blocks, duration_s) for `source` (path or file-like): mono float32 blocks at the file's own
+    rate. Formats libsndfile reads go through soundfile; anything else (M4A, WebM, ...) is decoded with
+    PyAV. duration_s is None when the container doesn't record it. Raises ValueError for files
+    neither can read.
+    """
+    try:
+        f = sf.SoundFile(source)
+    except (RuntimeError, TypeError, ValueError):
+        f = None  # soundfile raises LibsndfileError (a RuntimeError) for formats it can't read
+    if f is not None:
+        with f:
+            yield f.samplerate, _sf_blocks(f), f.frames / f.samplerate
+        return
+
+    import av
+
+    if hasattr(source, "seek"):
+        source.seek(0)
+    try:
+        container = av.open(source)
+    except (av.error.FFmpegError, ValueError) as e:
+        raise ValueError(f"can't read {getattr(source, 'name', source)} as audio: {e}") from None
+    with container:
+        if not container.streams.audio:
+            raise ValueError(f"{getattr(source, 'name', source)} has no audio stream")
+        stream = container.streams.audio[0]
+        if stream.duration is not None:
+            duration = float(stream.duration * stream.time_base)
+        elif container.duration is not None:
+            duration = container.duration / av.time_base
+        else:
+            duration = None
+        yield stream.rate, _av_blocks(container, stream), duration
+
+
+def iter_chunks(source, chunk_s: float = CHUNK_S, overlap_s: float = OVERLAP_S):
+    """
+    Yields (own_start_s, own_end_s, pad_start_s, audio16k) per chunk, reading `source` (path or
+    file-like) block by block. The chunk's audio covers [pad_start_s, own_end_s + overlap].
+    """
+    with _open_audio(source) as (rate, blocks, _duration):
+        chunk, overlap, search = int(chunk_s * rate), int(overlap_s * rate), int(SEARCH_S * rate)
+        buf = np.zeros(0, dtype=np.float32)
+        buf_start = 0   # absolute sample index of buf[0]
+        own_start = 0   # absolute sample where the next chunk's own span starts
+        eof = False
+
+        while True:
+            # Fill until we have the chunk plus its right-hand overlap, or the file ends.
+            # PyAV frames are small, so collect them and concatenate once.
+            new, have = [], buf_start + len(buf)
+            while not eof and have < own_start + chunk + overlap:
+                block = next(blocks, None)
+                if block is None:
+                    eof = True
+                    break
+                new.append(block)
+                have += len(block)
+            if new:
+                buf = np.concatenate([buf, *new])
+
+            end_abs = buf_start + len(buf)
+            if own_start >= end_abs:
+                return
+            if end_abs <= own_start + chunk + overlap and eof:
+                own_end = end_abs
+            else:
+                lo = own_start + max(chunk - search, chunk // 2)
+                hi = own_start + chunk
+                own_end = lo + _find_cut(buf[lo - buf_start: hi - buf_start], rate)
+
+            pad_start = max(own_start - overlap, buf_start)
+            pad_end = min(own_end + overlap, end_abs)
+            audio = buf[pad_start - buf_start: pad_end - buf_start]
+            yield own_start / rate, own_end / rate, pad_start / rate, stt._resample(audio, rate)
+
+            # Keep only what the next chunk's left overlap needs.
+            keep_from = max(own_end - overlap, buf_start)
+            buf = buf[keep_from - buf_start:]
+            buf_start = keep_from
+            own_start = own_end
+
+
+def _transcribe_chunk(audio: np.ndarray, language_hint=None):
+    model = stt.get_model()
+    segments, info = model.transcribe(audio, **stt.transcribe_kwargs(language_hint))
+    return [stt._segment_dict(s) for s in segments], info.language
+
+
+def _stitch(segments: list, own_start: float, own_end: float, pad_start: float) -> list:
+    out = []
+    for seg in segments:
+        start, end = seg["start"] + pad_start, seg["end"] + pad_start
+        if own_start <= (start + end) / 2 < own_end:
+            out.append({**seg, "start": start, "end": end})
+    return out
+
+
+def make_executor(workers: int = LONG_AUDIO_WORKERS) -> ProcessPoolExecutor:
+    """
+    A pool of `workers` Whisper processes for chunk transcription. Workers are spawned, not forked,
+    so they don't inherit the caller's threads and open SQLite connections; keep the pool around
+    (the app caches one) so each worker loads its model once.
+    """
+    from services.batch import _init_worker
+
+    workers = max(1, workers)
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(None, None, max(1, (os.cpu_count() or 1) // workers)),
+    )
+
+
+def iter_long_transcription(source, language_hint=None, workers: int = LONG_AUDIO_WORKERS, executor=None,
+                            chunk_s: float = CHUNK_S, overlap_s: float = OVERLAP_S):
+    """
+    Yields ({"text", "start", "end", "avg_logprob"} segment, chunk language) in order as chunks finish.
+    workers=0 transcribes in this process. Pass an existing executor (e.g. from make_executor())
+    to reuse loaded models across files, with `workers` set to its size; otherwise a pool is
+    started and shut down per call.
+    """
+    if workers <= 0 and executor is None:
+        for own_start, own_end, pad_start, audio in iter_chunks(source, chunk_s, overlap_s):
+            segs, lang = _transcribe_chunk(audio, language_hint)
+            for seg in _stitch(segs, own_start, own_end, pad_start):
+                yield seg, lang
+        return
+
+    own_pool = executor is None
+    if own_pool:
+        executor = make_executor(workers)
+    max_in_flight = 2 * max(workers, 1)
+    try:
+        pending = []  # (future, own_start, own_end, pad_start) in chunk order
+        chunks = iter_chunks(source, chunk_s, overlap_s)
+        for own_start, own_end, pad_start, audio in chunks:
+            pending.append((executor.submit(_transcribe_chunk, audio, language_hint), own_start, own_end, pad_start))
+            del audio
+            # Bounded in-flight work keeps memory flat; emit finished chunks in order.
+            while len(pending) >= max_in_flight or (pending and pending[0][0].done()):
+                fut, s, e, p = pending.pop(0)
+                segs, lang = fut.result()
+                for seg in _stitch(segs, s, e, p):
+                    yield seg, lang
+        for fut, s, e, p in pending:
+            segs, lang = fut.result()
+            for seg in _stitch(segs, s, e, p):
+                yield seg, lang
+    finally:
+        if own_pool:
+            executor.shutdown(cancel_futures=True)
+
+
+def transcribe_long_audio(source, language_hint=None, workers: int = LONG_AUDIO_WORKERS, executor=None) -> dict:
+    """
+    Same shape as transcribe_audio_bytes: {"text", "segments", "language", "duration"}.
+    `language` is the language most of the transcribed speech was detected as.
+    """
+    with _open_audio(source) as (_rate, _blocks, duration):
+        pass
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+    t0 = time.perf_counter()
+    segments = []
+    speech_by_lang = Counter()
+    for seg, lang in iter_long_transcription(source, language_hint=language_hint, workers=workers, executor=executor):
+        segments.append(seg)
+        speech_by_lang[lang] += seg["end"] - seg["start"]
+    elapsed = time.perf_counter() - t0
+    if duration is None:  # e.g. browser WebM recordings; the last segment is close enough
+        duration = segments[-1]["end"] if segments else 0.0
+    record("stt.long", elapsed * 1000, audio_s=duration, rtf=round(elapsed / duration, 3) if duration else None)
+    return {
+        "text": " ".join(seg["text"].strip() for seg in segments).strip(),
+        "segments": segments,
+        "language": speech_by_lang.most_common(1)[0][0] if speech_by_lang else language_hint,
+        "duration": duration,
+    }
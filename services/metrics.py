@@ -0,0 +1,72 @@
+"""
+Lightweight latency instrumentation. Samples go through the progress store's background writer
+into the `metrics` table of data/progress.db; the Performance tab reads p50/p95 per stage.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from services import progress
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+_READY = False
+_READY_LOCK = threading.Lock()
+
+
+def _ensure_table():
+    global _READY
+    if _READY:
+        return
+    with _READY_LOCK:
+        if not _READY:
+            progress.init_db()  # idempotent; makes sure the metrics migration ran
+            _READY = True
+
+
+def record(stage: str, duration_ms: float, **fields):
+    """
+    fields: any of cache_hit, tokens, tokens_per_s, audio_s, rtf.
+    """
+    if not METRICS_ENABLED:
+        return
+    _ensure_table()
+    progress.save_metric(stage, duration_ms, **fields)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Times the block and records it; the yielded dict collects extra fields, e.g. fields["cache_hit"] = True.
+    """
+    fields = {}
+    t0 = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        record(stage, (time.perf_counter() - t0) * 1000, **fields)
+
+
+def stage_summary(hours: float = 24.0) -> pd.DataFrame:
+    """
+    Per-stage call count, p50/p95 latency, cache hit rate, mean tokens/s and real-time factor.
+    """
+    _ensure_table()
+    df = progress.load_metrics(since_ts=time.time() - hours * 3600)
+    if df.empty:
+        return df
+    g = df.groupby("stage")
+    out = pd.DataFrame({
+        "calls": g.size(),
+        "p50_ms": g["duration_ms"].quantile(0.5),
+        "p95_ms": g["duration_ms"].quantile(0.95),
+        "cache_hit_rate": g["cache_hit"].mean(),
+        "tokens_per_s": g["tokens_per_s"].mean(),
+        "rtf": g["rtf"].mean(),
+    })
+    return out.round(3).sort_values("p95_ms", ascending=False).reset_index()
@@ -0,0 +1,372 @@
+"""
+Analysis pipeline: the Analyze steps as a DAG of stages. Independent stages run concurrently on a
+thread pool, results are cached per stage, and every run reports per-stage timings.
+Used by app.py and runnable headless:
+
+    python -m services.pipeline transcript.txt --target-lang es --native-lang en
+    python -m services.pipeline transcript.txt --no-llm --json
+"""
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import os
+import queue
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from services.cache import TieredCache, make_key
+from services.metrics import record
+
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "4"))
+
+LLM_DISABLED = {"weakest_point": "(LLM disabled)", "explanation": "", "fixes": []}
+
+
+@dataclass
+class Stage:
+    """
+    fn receives a context dict with the pipeline inputs, the results of finished stages
+    (by stage name), "on_token" (a callback, or None) and "publish".
+    inputs: input keys the result depends on (part of the cache key, with the deps' results).
+    cache: False for side effects or stages that already cache themselves.
+    streams: when the run has an on_token callback, pass one to this stage so it can push partial
+    output to the UI; the pipeline delivers the calls on the caller's thread.
+    publishes: extra results the stage hands out with ctx["publish"](name, value) before it
+    finishes; other stages can depend on them like on stage names and start as soon as they arrive.
+    """
+
+    name: str
+    fn: Callable[[dict], Any]
+    deps: tuple = ()
+    inputs: tuple = ()
+    cache: bool = True
+    streams: bool = False
+    publishes: tuple = ()
+
+
+@dataclass
+class Pipeline:
+    stages: list
+    max_workers: int = PIPELINE_MAX_WORKERS
+    cache_items: int = 512
+    _cache: TieredCache = field(init=False, repr=False)
+    _executor: ThreadPoolExecutor = field(init=False, repr=False)
+
+    def __post_init__(self):
+        names = [s.name for s in self.stages] + [p for s in self.stages for p in s.publishes]
+        if len(set(names)) != len(names):
+            raise ValueError("duplicate stage names")
+        for s in self.stages:
+            missing = set(s.deps) - set(names)
+            if missing:
+                raise ValueError(f"stage {s.name!r} depends on unknown stages {sorted(missing)}")
+        self._cache = TieredCache("pipeline", max_items=self.cache_items, db_path=None)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline")
+
+    def _cache_key(self, stage: Stage, inputs: dict, results: dict) -> str:
+        return make_key(
+            stage.name,
+            {k: inputs.get(k) for k in stage.inputs},
+            {d: results[d] for d in stage.deps},
+        )
+
+    def _execute(self, stage: Stage, ctx: dict):
+        t0 = time.perf_counter()
+        value = stage.fn(ctx)
+        return value, (time.perf_counter() - t0) * 1000
+
+    def run(self, inputs: dict, on_token=None, skip=()) -> dict:
+        """
+        Runs every stage (except `skip` and anything depending on it) and returns
+        {"results": {stage: value}, "timings_ms": {stage: ms}, "cached": [stages], "total_ms": ms}.
+        Published values appear in "results" too. Stages run on the pool; on_token is called on
+        the caller's thread, which waits for stage events.
+        """
+        t_start = time.perf_counter()
+        skipped = set(skip)
+        grew = True
+        while grew:
+            before = len(skipped)
+            for s in self.stages:
+                if s.name in skipped or skipped.intersection(s.deps):
+                    skipped.add(s.name)
+                    skipped.update(s.publishes)
+            grew = len(skipped) > before
+        pending = {s.name: s for s in self.stages if s.name not in skipped}
+
+        results, timings, cached = {}, {}, []
+        published = {}  # stage name -> {published name: value}
+        running = {}  # future -> (stage, cache key)
+        events = queue.SimpleQueue()  # ("token", stage, value) | ("publish", stage, name, value) | ("done", future)
+
+        def ctx(stage: Stage):
+            def publish(name, value):
+                if name not in stage.publishes:
+                    raise ValueError(f"stage {stage.name!r} doesn't publish {name!r}")
+                events.put(("publish", stage.name, name, value))
+
+            forward = None
+            if stage.streams and on_token is not None:
+                def forward(name, value):
+                    events.put(("token", name, value))
+            return {**inputs, **results, "on_token": forward, "publish": publish}
+
+        def finish(s: Stage, key, value, ms):
+            missing = [p for p in s.publishes if p not in results]
+            if missing:
+                raise RuntimeError(f"stage {s.name!r} finished without publishing {missing}")
+            results[s.name], timings[s.name] = value, ms
+            if key is not None:
+                self._cache.set(key, {"value": value, "published": published.get(s.name, {})})
+
+        try:
+            while pending or running:
+                ready = [s for s in pending.values() if all(d in results for d in s.deps)]
+                for s in ready:
+                    del pending[s.name]
+                    key = self._cache_key(s, inputs, results) if s.cache else None
+                    if key is not None:
+                        hit = self._cache.get(key)
+                        if hit is not None:
+                            results.update(hit["published"])
+                            results[s.name] = hit["value"]
+                            timings[s.name] = 0.0
+                            cached.append(s.name)
+                            continue
+                    fut = self._executor.submit(self._execute, s, ctx(s))
+                    running[fut] = (s, key)
+                    fut.add_done_callback(lambda f: events.put(("done", f)))
+                if ready:
+                    continue  # cache hits may have made more stages ready
+
+                if not running:
+                    raise RuntimeError(f"pipeline cannot make progress; blocked stages: {sorted(pending)}")
+                kind, *event = events.get()
+                if kind == "token":
+                    on_token(*event)
+                elif kind == "publish":
+                    stage_name, name, value = event
+                    results[name] = value
+                    published.setdefault(stage_name, {})[name] = value
+                else:
+                    s, key = running.pop(event[0])
+                    finish(s, key, *event[0].result())
+        finally:
+            for fut in running:
+                fut.cancel()
+
+        return {
+            "results": results,
+            "timings_ms": {k: round(v, 2) for k, v in timings.items()},
+            "cached": cached,
+            "total_ms": round((time.perf_counter() - t_start) * 1000, 2),
+        }
+
+    def cache_stats(self) -> dict:
+        return self._cache.stats()
+
+
+# --- Analysis stages -------------------------------------------------------------------------
+
+def _detect(ctx):
+    from services.langid import detect_language
+
+    return detect_language(ctx["text"], whisper_lang=ctx.get("whisper_lang"), whisper_prob=ctx.get("whisper_prob"))
+
+
+def _grammar(ctx):
+    from services.grammar import grammar_feedback
+
+    return grammar_feedback(ctx["text"], ctx["detect"])
+
+
+def _latin(ctx):
+    from services.latin import latinize_text, latin_pronunciation_hint
+
+    latin_text = latinize_text(ctx["text"])
+    return {"latin_text": latin_text, "latin_pron": latin_pronunciation_hint(latin_text)}
+
+
+def _pron_targets(ctx):
+    from services.pron_analysis import pronunciation_targets
+
+    return pronunciation_targets(ctx["text"], native_lang=ctx["native_lang"])
+
+
+def _weakest(ctx):
+    from services.llm import llm_weakest_point_stream
+
+    if not ctx.get("use_llm"):
+        ctx["publish"]("weakest_point", LLM_DISABLED["weakest_point"])
+        return dict(LLM_DISABLED)
+    kwargs = dict(
+        text=ctx["text"],
+        detected_lang=ctx["detect"],
+        target_lang=ctx["target_lang"],
+        native_lang=ctx["native_lang"],
+        grammar_tool_summary=ctx["grammar"]["summary"],
+        model=ctx.get("model"),
+        use_cache=ctx.get("use_llm_cache", True),
+    )
+    # Always stream, so the practice stage can start on the Weakest: line while Why/Fixes generate.
+    weakest = None
+    for weakest in llm_weakest_point_stream(**kwargs, on_weakest_point=lambda w: ctx["publish"]("weakest_point", w)):
+        if ctx["on_token"] is not None:
+            ctx["on_token"]("weakest", weakest)
+    return weakest
+
+
+def _practice(ctx):
+    from services.llm import llm_generate_practice_module, llm_generate_practice_module_stream
+
+    if not ctx.get("use_llm"):
+        return "(LLM disabled)"
+    kwargs = dict(
+        text=ctx["text"],
+        detected_lang=ctx["detect"],
+        target_lang=ctx["target_lang"],
+        native_lang=ctx["native_lang"],
+        weakest_point=ctx["weakest_point"],
+        model=ctx.get("model"),
+        use_cache=ctx.get("use_llm_cache", True),
+    )
+    if ctx["on_token"] is None:
+        return llm_generate_practice_module(**kwargs)
+    text = ""
+    for chunk in llm_generate_practice_module_stream(**kwargs):
+        text += chunk
+        ctx["on_token"]("practice", text)
+    return text
+
+
+def _pron_feedback(ctx):
+    from services.llm import llm_pronunciation_feedback
+
+    if not ctx.get("use_llm"):
+        return None
+    return llm_pronunciation_feedback(
+        text=ctx["text"],
+        target_lang=ctx["target_lang"],
+        latin_pron=ctx["latin"]["latin_pron"],
+        model=ctx.get("model"),
+        use_cache=ctx.get("use_llm_cache", True),
+    )
+
+
+def _save(ctx):
+    from services.progress import save_attempt
+
+    if not ctx.get("speaker_id"):
+        return False
+    save_attempt(
+        speaker_id=ctx["speaker_id"],
+        ts=dt.datetime.now().isoformat(timespec="seconds"),
+        target_lang=ctx["target_lang"],
+        detected_lang=ctx["detect"],
+        transcript=ctx["text"],
+        weakest_point=ctx["weakest"]["weakest_point"],
+        num_issues=ctx["grammar"]["num_matches"],
+        llm_model=(ctx.get("model") or "") if ctx.get("use_llm") else "",
+    )
+    return True
+
+
+def build_analysis_pipeline(max_workers: int = PIPELINE_MAX_WORKERS) -> Pipeline:
+    """
+    detect -> grammar -> weakest -> practice is the critical chain; practice starts on the
+    weakest_point that weakest publishes once the Weakest: line is parsed, not on the whole stage.
+    latin -> pron_feedback and pron_targets run beside it. LLM stages rely on the LLM response
+    cache rather than the stage cache.
+    """
+    return Pipeline(
+        stages=[
+            Stage("detect", _detect, inputs=("text", "whisper_lang", "whisper_prob")),
+            Stage("grammar", _grammar, deps=("detect",), inputs=("text",)),
+            Stage("latin", _latin, inputs=("text",)),
+            Stage("pron_targets", _pron_targets, inputs=("text", "native_lang")),
+            Stage("weakest", _weakest, deps=("detect", "grammar"), cache=False, streams=True,
+                  publishes=("weakest_point",)),
+            Stage("practice", _practice, deps=("detect", "weakest_point"), cache=False, streams=True),
+            Stage("pron_feedback", _pron_feedback, deps=("latin",), cache=False),
+            Stage("save", _save, deps=("detect", "grammar", "weakest"), cache=False),
+        ],
+        max_workers=max_workers,
+    )
+
+
+_ANALYSIS = None
+
+
+def analysis_pipeline() -> Pipeline:
+    """
+    Process-wide pipeline instance, so the stage cache is shared across callers.
+    """
+    global _ANALYSIS
+    if _ANALYSIS is None:
+        _ANALYSIS = build_analysis_pipeline()
+    return _ANALYSIS
+
+
+def analyze(text: str, target_lang: str, native_lang: str, use_llm: bool = True, model: str | None = None,
+            speaker_id: str | None = None, use_llm_cache: bool = True, on_token=None,
+            whisper_lang: str | None = None, whisper_prob: float | None = None) -> dict:
+    """
+    Runs the full analysis. Pass speaker_id to save the attempt to the progress tracker, and
+    Whisper's language guess (for an unedited transcript) to skip text-based language detection.
+    """
+    inputs = {
+        "text": text,
+        "target_lang": target_lang,
+        "native_lang": native_lang,
+        "use_llm": use_llm,
+        "model": model,
+        "speaker_id": speaker_id,
+        "use_llm_cache": use_llm_cache,
+        "whisper_lang": whisper_lang,
+        "whisper_prob": whisper_prob,
+    }
+    out = analysis_pipeline().run(inputs, on_token=on_token, skip=() if speaker_id else ("save",))
+    record("analyze.total", out["total_ms"])
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("file", help="transcript text file ('-' for stdin)")
+    ap.add_argument("--target-lang", default="en")
+    ap.add_argument("--native-lang", default="en")
+    ap.add_argument("--model", default=os.getenv("OLLAMA_MODEL", "llama3.2:3b"))
+    ap.add_argument("--no-llm", action="store_true")
+    ap.add_argument("--speaker-id", default=None, help="save the attempt under this speaker")
+    ap.add_argument("--json", action="store_true", help="print the full result as JSON")
+    args = ap.parse_args(argv)
+
+    text = sys.stdin.read() if args.file == "-" else open(args.file, encoding="utf-8").read()
+    out = analyze(text, args.target_lang, args.native_lang, use_llm=not args.no_llm, model=args.model,
+                  speaker_id=args.speaker_id)
+    if args.speaker_id:
+        from services.progress import flush
+
+        flush()
+    if args.json:
+        print(json.dumps(out, indent=2, ensure_ascii=False, default=str))
+        return
+    res = out["results"]
+    print(f"Detected language: {res['detect']}")
+    print(res["grammar"]["summary"])
+    print(f"Weakest point: {res['weakest']['weakest_point']}")
+    print()
+    print(res["practice"])
+    print()
+    for name, ms in sorted(out["timings_ms"].items(), key=lambda kv: -kv[1]):
+        print(f"{name:>14}: {ms:9.1f} ms" + (" (cached)" if name in out["cached"] else ""))
+    print(f"{'total':>14}: {out['total_ms']:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,493 @@
+import atexit
+import itertools
 import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 import pandas as pd
 
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "progress.db")
 
+WRITE_BATCH_SIZE = int(os.getenv("PROGRESS_WRITE_BATCH", "64"))
+WRITE_RETRIES = 3
+FLUSH_TIMEOUT_S = float(os.getenv("PROGRESS_FLUSH_TIMEOUT_S", "30"))
+# Latency samples older than this are deleted by the writer (0 keeps them forever).
+METRICS_RETENTION_DAYS = float(os.getenv("METRICS_RETENTION_DAYS", "30"))
+METRICS_PRUNE_INTERVAL_S = 3600.0
+
+_LOCAL = threading.local()
+_WRITES = queue.Queue()
+_WRITER = None
+_WRITER_LOCK = threading.Lock()
+_VERSION = 0
+_VERSION_LOCK = threading.Lock()
+_LAST_PRUNE = 0.0  # monotonic time of the last metrics retention pass (writer thread only)
+
+_INSERT_ATTEMPT = """
+    INSERT INTO attempts (speaker_id, ts, target_lang, detected_lang, transcript, weakest_point, num_issues, llm_model)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_METRIC = """
+    INSERT INTO metrics (ts, stage, duration_ms, cache_hit, tokens, tokens_per_s, audio_s, rtf)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# Both range over idx_metrics_ts.
+_SELECT_METRICS = "SELECT ts, stage, duration_ms, cache_hit, tokens, tokens_per_s, audio_s, rtf FROM metrics WHERE ts >= ?"
+_PRUNE_METRICS = "DELETE FROM metrics WHERE ts < ?"
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    # WAL lets readers run while a write is in progress; NORMAL sync is safe with WAL and much cheaper.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-8000")  # ~8 MB page cache
+    return conn
+
+
+def _conn() -> sqlite3.Connection:
+    """
+    Long-lived connection for the calling thread (sqlite3 connections aren't shared across threads).
+    """
+    conn = getattr(_LOCAL, "conn", None)
+    if conn is None or getattr(_LOCAL, "path", None) != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = _LOCAL.conn = _connect()
+        _LOCAL.path = DB_PATH
+    return conn
+
+
+# Schema migrations, applied in order; PRAGMA user_version records how many have run.
+MIGRATIONS = [
+    # 1: original table
+    """
+    CREATE TABLE IF NOT EXISTS attempts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        speaker_id TEXT NOT NULL,
+        ts TEXT NOT NULL,
+        target_lang TEXT,
+        detected_lang TEXT,
+        transcript TEXT,
+        weakest_point TEXT,
+        num_issues INTEGER,
+        llm_model TEXT
+    );
+    """,
+    # 2: per-speaker index + daily/weekly aggregates kept current by triggers
+    """
+    CREATE INDEX IF NOT EXISTS idx_attempts_speaker_ts ON attempts (speaker_id, ts);
+
+    CREATE TABLE IF NOT EXISTS attempt_stats (
+        speaker_id TEXT NOT NULL,
+        period TEXT NOT NULL,          -- 'day' or 'week'
+        bucket TEXT NOT NULL,          -- YYYY-MM-DD (weeks: the Monday)
+        target_lang TEXT NOT NULL,
+        attempts INTEGER NOT NULL,
+        issues INTEGER NOT NULL,
+        PRIMARY KEY (speaker_id, period, bucket, target_lang)
+    ) WITHOUT ROWID;
+
+    INSERT INTO attempt_stats (speaker_id, period, bucket, target_lang, attempts, issues)
+    SELECT speaker_id, 'day', date(ts), COALESCE(target_lang, ''), COUNT(*), COALESCE(SUM(num_issues), 0)
+    FROM attempts WHERE date(ts) IS NOT NULL GROUP BY 1, 2, 3, 4;
+
+    INSERT INTO attempt_stats (speaker_id, period, bucket, target_lang, attempts, issues)
+    SELECT speaker_id, 'week', date(ts, '-6 days', 'weekday 1'), COALESCE(target_lang, ''), COUNT(*), COALESCE(SUM(num_issues), 0)
+    FROM attempts WHERE date(ts) IS NOT NULL GROUP BY 1, 2, 3, 4;
+
+    CREATE TRIGGER IF NOT EXISTS trg_attempts_stats_insert AFTER INSERT ON attempts
+    WHEN date(NEW.ts) IS NOT NULL
+    BEGIN
+        INSERT INTO attempt_stats (speaker_id, period, bucket, target_lang, attempts, issues)
+        VALUES (NEW.speaker_id, 'day', date(NEW.ts), COALESCE(NEW.target_lang, ''), 1, COALESCE(NEW.num_issues, 0))
+        ON CONFLICT (speaker_id, period, bucket, target_lang)
+        DO UPDATE SET attempts = attempts + 1, issues = issues + excluded.issues;
+        INSERT INTO attempt_stats (speaker_id, period, bucket, target_lang, attempts, issues)
+        VALUES (NEW.speaker_id, 'week', date(NEW.ts, '-6 days', 'weekday 1'), COALESCE(NEW.target_lang, ''), 1, COALESCE(NEW.num_issues, 0))
+        ON CONFLICT (speaker_id, period, bucket, target_lang)
+        DO UPDATE SET attempts = attempts + 1, issues = issues + excluded.issues;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_attempts_stats_issues AFTER UPDATE OF num_issues ON attempts
+    WHEN date(NEW.ts) IS NOT NULL
+    BEGIN
+        UPDATE attempt_stats
+        SET issues = issues + COALESCE(NEW.num_issues, 0) - COALESCE(OLD.num_issues, 0)
+        WHERE speaker_id = NEW.speaker_id AND target_lang = COALESCE(NEW.target_lang, '')
+          AND ((period = 'day' AND bucket = date(NEW.ts))
+            OR (period = 'week' AND bucket = date(NEW.ts, '-6 days', 'weekday 1')));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_attempts_stats_delete AFTER DELETE ON attempts
+    WHEN date(OLD.ts) IS NOT NULL
+    BEGIN
+        UPDATE attempt_stats
+        SET attempts = attempts - 1, issues = issues - COALESCE(OLD.num_issues, 0)
+        WHERE speaker_id = OLD.speaker_id AND target_lang = COALESCE(OLD.target_lang, '')
+          AND ((period = 'day' AND bucket = date(OLD.ts))
+            OR (period = 'week' AND bucket = date(OLD.ts, '-6 days', 'weekday 1')));
+    END;
+    """,
+    # 3: per-stage latency samples (see services/metrics.py)
+    """
+    CREATE TABLE IF NOT EXISTS metrics (
+        id INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,              -- unix time
+        stage TEXT NOT NULL,
+        duration_ms REAL NOT NULL,
+        cache_hit INTEGER,
+        tokens INTEGER,
+        tokens_per_s REAL,
+        audio_s REAL,
+        rtf REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_metrics_ts ON metrics (ts);
+    """,
+    # 4: resume points for re-analysis jobs (see services/reanalyze.py)
+    """
+    CREATE TABLE IF NOT EXISTS reanalysis_checkpoints (
+        job TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL,      -- highest attempts.id already re-scored
+        processed INTEGER NOT NULL,
+        changed INTEGER NOT NULL,
+        updated_ts REAL NOT NULL
+    );
+    """,
+    # 5: a checkpoint only resumes a run over the same speaker filter
+    """
+    ALTER TABLE reanalysis_checkpoints ADD COLUMN speaker_id TEXT;  -- NULL: all speakers
+    """,
+]
+
+
+def _statements(script: str):
+    """
+    Splits a migration into single statements (trigger bodies contain ';', so split on complete ones).
+    """
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            yield buf.strip()
+            buf = ""
+    if buf.strip():
+        yield buf.strip()
+
+
 def init_db():
+    """
+    Applies pending migrations. Safe to call from several processes at once: each migration runs under
+    BEGIN IMMEDIATE and re-reads user_version inside the transaction, so only one process applies it.
+    """
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = _conn()
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+        return
+    while True:
+        # executescript() would commit our BEGIN first, so statements run one by one inside it.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                conn.commit()
+                return
+            for sql in _statements(MIGRATIONS[version]):
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def _write_batch(items: list):
+    """
+    Commits queued (sql, params) writes in one transaction, one executemany per run of equal statements.
+    """
+    conn = _conn()
+    t0 = time.perf_counter()
+    for attempt in range(WRITE_RETRIES):
+        try:
+            with conn:  # one transaction per batch
+                for sql, group in itertools.groupby(items, key=lambda item: item[0]):
+                    conn.executemany(sql, [params for _sql, params in group])
+            break
+        except sqlite3.OperationalError as e:
+            if attempt == WRITE_RETRIES - 1:
+                print("Progress DB write failed, dropping", len(items), "row(s):", e)
+                return
+            time.sleep(0.2 * (attempt + 1))
+        except sqlite3.Error as e:
+            # Not transient (constraint violation, bad bind type): retrying won't help.
+            print("Progress DB write failed, dropping", len(items), "row(s):", e)
+            return
+    # Metric-only batches aren't timed, or every metric write would queue another one.
+    if any(sql == _INSERT_ATTEMPT for sql, _params in items):
+        save_metric("progress.write", (time.perf_counter() - t0) * 1000)
+    elif any(sql == _INSERT_METRIC for sql, _params in items):
+        _prune_metrics(conn)
+
+
+def _prune_metrics(conn: sqlite3.Connection):
+    """
+    Deletes samples older than METRICS_RETENTION_DAYS, at most once per METRICS_PRUNE_INTERVAL_S,
+    so the metrics table doesn't grow without bound next to the attempts.
+    """
+    global _LAST_PRUNE
+    if METRICS_RETENTION_DAYS <= 0 or (_LAST_PRUNE and time.monotonic() - _LAST_PRUNE < METRICS_PRUNE_INTERVAL_S):
+        return
+    _LAST_PRUNE = time.monotonic()
     try:
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS attempts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            speaker_id TEXT NOT NULL,
-            ts TEXT NOT NULL,
-            target_lang TEXT,
-            detected_lang TEXT,
-            transcript TEXT,
-            weakest_point TEXT,
-            num_issues INTEGER,
-            llm_model TEXT
-        )
-        """)
-        conn.commit()
-    finally:
-        conn.close()
+        with conn:
+            conn.execute(_PRUNE_METRICS, (time.time() - METRICS_RETENTION_DAYS * 86400,))
+    except sqlite3.Error as e:
+        print("Pruning old metrics failed:", e)
+
+
+def _writer_loop():
+    while True:
+        rows = [_WRITES.get()]
+        # Drain whatever else queued up meanwhile so a burst becomes one transaction.
+        while len(rows) < WRITE_BATCH_SIZE:
+            try:
+                rows.append(_WRITES.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _write_batch(rows)
+        except Exception as e:  # the writer must outlive any one bad batch, or flush() waits forever
+            print("Progress writer error, dropping", len(rows), "row(s):", e)
+        finally:
+            for _ in rows:
+                _WRITES.task_done()
+
+
+def _ensure_writer():
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None or not _WRITER.is_alive():
+            _WRITER = threading.Thread(target=_writer_loop, name="progress-writer", daemon=True)
+            _WRITER.start()
+
+
+def flush(timeout: float = FLUSH_TIMEOUT_S) -> bool:
+    """
+    Blocks until every queued write has been committed, or until `timeout` seconds pass.
+    Returns False if writes were still pending.
+    """
+    if _WRITER is None:
+        return True
+    deadline = time.monotonic() + timeout
+    # Queue.join() has no timeout; wait on its condition the same way, but bounded.
+    with _WRITES.all_tasks_done:
+        while _WRITES.unfinished_tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not _WRITER.is_alive():
+                print("Progress DB flush gave up with", _WRITES.unfinished_tasks, "write(s) pending")
+                return False
+            _WRITES.all_tasks_done.wait(min(remaining, 1.0))
+    return True
+
+
+atexit.register(flush)
+
+
+def data_version() -> int:
+    """
+    Bumped whenever this process changes attempts; use it as part of cache keys for attempt reads.
+    """
+    return _VERSION
+
+
+def _bump_version():
+    global _VERSION
+    with _VERSION_LOCK:
+        _VERSION += 1
+
 
 def save_attempt(speaker_id: str, ts: str, target_lang: str, detected_lang: str,
                  transcript: str, weakest_point: str, num_issues: int, llm_model: str):
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        conn.execute("""
-            INSERT INTO attempts (speaker_id, ts, target_lang, detected_lang, transcript, weakest_point, num_issues, llm_model)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (speaker_id, ts, target_lang, detected_lang, transcript, weakest_point, int(num_issues), llm_model))
-        conn.commit()
-    finally:
-        conn.close()
+    """
+    Queues the attempt for the background writer and returns immediately.
+    """
+    _ensure_writer()
+    _WRITES.put((_INSERT_ATTEMPT, (speaker_id, ts, target_lang, detected_lang, transcript, weakest_point,
+                                   int(num_issues), llm_model)))
+    _bump_version()  # reads flush the queue first, so the new row is visible to the next read
+
+
+def save_metric(stage: str, duration_ms: float, cache_hit: bool | None = None, tokens: int | None = None,
+                tokens_per_s: float | None = None, audio_s: float | None = None, rtf: float | None = None):
+    """
+    Queues one latency sample for the metrics table (written with the next batch).
+    No-op when METRICS_ENABLED=0.
+    """
+    from services import metrics  # imported here: metrics imports this module
+
+    if not metrics.METRICS_ENABLED:
+        return
+    _ensure_writer()
+    hit = None if cache_hit is None else int(bool(cache_hit))
+    _WRITES.put((_INSERT_METRIC, (time.time(), stage, float(duration_ms), hit, tokens, tokens_per_s, audio_s, rtf)))
+
+
+def load_metrics(since_ts: float) -> pd.DataFrame:
+    flush()
+    return pd.read_sql_query(_SELECT_METRICS, _conn(), params=(since_ts,))
+
+
+_ATTEMPT_COLUMNS = "id, ts, target_lang, detected_lang, num_issues, weakest_point, llm_model"
+
+
+def load_attempts_page(speaker_id: str, cursor=None, limit: int = 50):
+    """
+    One page of a speaker's attempts, newest first. Pass the returned cursor back in to get the
+    next page; it is None after the last page. Keyset pagination on (ts, id) walks the
+    (speaker_id, ts) index, so deep pages cost the same as the first.
+    """
+    flush()  # read-your-writes: include attempts still sitting in the queue
+    if cursor is None:
+        sql = f"SELECT {_ATTEMPT_COLUMNS} FROM attempts WHERE speaker_id=? ORDER BY ts DESC, id DESC LIMIT ?"
+        params = (speaker_id, limit)
+    else:
+        sql = (f"SELECT {_ATTEMPT_COLUMNS} FROM attempts WHERE speaker_id=? AND (ts, id) < (?, ?) "
+               "ORDER BY ts DESC, id DESC LIMIT ?")
+        params = (speaker_id, cursor[0], cursor[1], limit)
+    t0 = time.perf_counter()
+    df = pd.read_sql_query(sql, _conn(), params=params)
+    save_metric("progress.query", (time.perf_counter() - t0) * 1000)
+    next_cursor = None
+    if len(df) == limit:
+        last = df.iloc[-1]
+        next_cursor = (last["ts"], int(last["id"]))
+    return df, next_cursor
+
 
 def load_attempts(speaker_id: str) -> pd.DataFrame:
-    conn = sqlite3.connect(DB_PATH)
+    df, _cursor = load_attempts_page(speaker_id, limit=50)
+    return df.drop(columns=["id"])
+
+
+def load_trend(speaker_id: str, period: str = "day") -> pd.DataFrame:
+    """
+    Pre-aggregated attempts and issue counts per day/week and target language.
+    """
+    flush()
+    return pd.read_sql_query(
+        """
+        SELECT bucket, target_lang, attempts, issues, CAST(issues AS REAL) / attempts AS avg_issues
+        FROM attempt_stats
+        WHERE speaker_id=? AND period=? AND attempts > 0
+        ORDER BY bucket
+        """,
+        _conn(),
+        params=(speaker_id, period),
+    )
+
+
+_CHUNK_COLUMNS = "id, speaker_id, target_lang, detected_lang, transcript, weakest_point, num_issues"
+_ATTEMPT_FIELDS = ("id", "speaker_id", "ts", "target_lang", "detected_lang", "transcript", "weakest_point",
+                   "num_issues", "llm_model")
+
+
+def iter_attempt_chunks(after_id: int = 0, chunk_size: int = 200, speaker_id: str | None = None,
+                        columns: str = _CHUNK_COLUMNS, max_id: int | None = None):
+    """
+    Yields lists of row tuples (by default: id, speaker_id, target_lang, detected_lang, transcript,
+    weakest_point, num_issues) in id order, one keyset query per chunk, so only one chunk is ever
+    held in memory. `columns` must start with id; `max_id` stops before rows added later.
+    """
+    fields = [c.strip() for c in columns.split(",")]
+    if fields[0] != "id" or not set(fields) <= set(_ATTEMPT_FIELDS):
+        raise ValueError(f"bad attempts columns: {columns!r}")
+    where, extra = "id > ?", ()
+    if speaker_id:
+        where, extra = where + " AND speaker_id = ?", extra + (speaker_id,)
+    if max_id is not None:
+        where, extra = where + " AND id <= ?", extra + (max_id,)
+    while True:
+        rows = _conn().execute(
+            f"SELECT {columns} FROM attempts WHERE {where} ORDER BY id LIMIT ?",
+            (after_id, *extra, chunk_size),
+        ).fetchall()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+
+
+def distinct_values(column: str) -> list:
+    """
+    Sorted non-NULL values of one attempts column (e.g. to build a fixed dictionary for export).
+    """
+    if column not in _ATTEMPT_FIELDS:
+        raise ValueError(f"unknown attempts column: {column!r}")
+    return [row[0] for row in _conn().execute(
+        f"SELECT DISTINCT {column} FROM attempts WHERE {column} IS NOT NULL ORDER BY 1"
+    )]
+
+
+def max_attempt_id() -> int:
+    return _conn().execute("SELECT COALESCE(MAX(id), 0) FROM attempts").fetchone()[0]
+
+
+@contextmanager
+def read_snapshot():
+    """
+    Runs the calling thread's reads in one read transaction, so they all see the same state of the
+    database even while the writer (or another process) commits. Keep it short: WAL can't be
+    checkpointed past an open reader.
+    """
+    conn = _conn()
+    conn.execute("BEGIN")
     try:
-        df = pd.read_sql_query(
-            "SELECT ts, target_lang, detected_lang, num_issues, weakest_point, llm_model FROM attempts WHERE speaker_id=? ORDER BY id DESC LIMIT 50",
-            conn,
-            params=(speaker_id,)
-        )
-        return df
+        yield
     finally:
-        conn.close()
+        conn.execute("COMMIT")
+
+
+def load_checkpoint(job: str) -> dict | None:
+    row = _conn().execute(
+        "SELECT last_id, processed, changed, updated_ts, speaker_id FROM reanalysis_checkpoints WHERE job = ?",
+        (job,),
+    ).fetchone()
+    if row is None:
+        return None
+    return {"last_id": row[0], "processed": row[1], "changed": row[2], "updated_ts": row[3], "speaker_id": row[4]}
+
+
+def reset_checkpoint(job: str):
+    conn = _conn()
+    with conn:
+        conn.execute("DELETE FROM reanalysis_checkpoints WHERE job = ?", (job,))
+
+
+def apply_reanalysis(job: str, updates: list, last_id: int, processed: int, changed: int,
+                     speaker_id: str | None = None):
+    """
+    Writes re-scored attempts [(detected_lang, num_issues, weakest_point, id)] and the job's checkpoint
+    in one transaction, so a resumed job never skips or double-counts a chunk. The num_issues
+    trigger keeps attempt_stats in step.
+    """
+    conn = _conn()
+    t0 = time.perf_counter()
+    with conn:
+        conn.executemany(
+            "UPDATE attempts SET detected_lang = ?, num_issues = ?, weakest_point = ? WHERE id = ?", updates
+        )
+        conn.execute(
+            """
+            INSERT INTO reanalysis_checkpoints (job, last_id, processed, changed, updated_ts, speaker_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (job) DO UPDATE SET last_id = excluded.last_id, processed = excluded.processed,
+                changed = excluded.changed, updated_ts = excluded.updated_ts, speaker_id = excluded.speaker_id
+            """,
+            (job, last_id, processed, changed, time.time(), speaker_id),
+        )
+    _bump_version()
+    save_metric("progress.write", (time.perf_counter() - t0) * 1000)
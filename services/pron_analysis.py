@@ -1,7 +1,12 @@
 from __future__ import annotations
+import heapq
 import re
+from collections import deque
 from dataclasses import dataclass
-from typing import List, Dict, Tuple
+from functools import lru_cache
+from typing import Iterable, List, Dict, Tuple
+
+from services.metrics import timed
 
 WORD_RE = re.compile(r"[A-Za-zÀ-ÖØ-öø-ÿ]+(?:'[A-Za-zÀ-ÖØ-öø-ÿ]+)?")
 
@@ -25,23 +30,99 @@ UNCOMMON_FOR_L1 = {
 CONSONANT_RUN = re.compile(r"[bcdfghjklmnpqrstvwxz]{4,}", re.IGNORECASE)
 
 
+class _PatternMatcher:
+    """
+    Aho–Corasick automaton over a fixed pattern list: one pass over a word finds every
+    pattern it contains (including overlapping ones like "tsch"/"sch"/"ch").
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[Tuple[str, ...]] = [()]
+        for p in patterns:
+            state = 0
+            for ch in p:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._out.append(())
+                state = nxt
+            self._out[state] += (p,)
+
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def find(self, word: str) -> set:
+        found = set()
+        state = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for ch in word:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+_MATCHERS: Dict[str, _PatternMatcher] = {}
+
+
+def _matcher(native_lang: str) -> _PatternMatcher:
+    m = _MATCHERS.get(native_lang)
+    if m is None:
+        m = _MATCHERS[native_lang] = _PatternMatcher(UNCOMMON_FOR_L1.get(native_lang, []))
+    return m
+
+
+@lru_cache(maxsize=65536)
+def _mismatch_hits(native_lang: str, word_lower: str) -> Tuple[str, ...]:
+    hits = _matcher(native_lang).find(word_lower)
+    if CONSONANT_RUN.search(word_lower):
+        hits.add("consonant-run(4+)")
+    return tuple(sorted(hits))
+
+
 def tokenize_words(text: str) -> List[str]:
     return [m.group(0) for m in WORD_RE.finditer(text)]
 
 
+def _unique_words(words: Iterable[str]) -> Dict[str, str]:
+    """
+    lowercased word -> the spelling to report. Keeps the variant the old sort-then-dedupe picked
+    (the lexicographically largest), so results don't depend on word order.
+    """
+    unique: Dict[str, str] = {}
+    for w in words:
+        key = w.lower()
+        prev = unique.get(key)
+        if prev is None or w > prev:
+            unique[key] = w
+    return unique
+
+
+_VOWEL_GROUP_RE = re.compile("[" + "".join(sorted(VOWELS)) + "]+")
+
+
 def rough_syllable_count(word: str) -> int:
     """
     Very lightweight syllable estimator:
     counts vowel groups. Works “okay” across en/es/de/fr for ranking longest words.
     """
     w = word.lower()
-    groups = 0
-    in_vowel = False
-    for ch in w:
-        is_v = ch in VOWELS
-        if is_v and not in_vowel:
-            groups += 1
-        in_vowel = is_v
+    # One regex scan (in C) instead of a Python loop per character.
+    groups = len(_VOWEL_GROUP_RE.findall(w))
 
     # Small English-ish tweak: silent trailing 'e' reduces syllable count sometimes
     if w.endswith("e") and groups > 1 and not w.endswith(("le", "ee")):
@@ -50,24 +131,37 @@ def rough_syllable_count(word: str) -> int:
     return max(groups, 1)
 
 
+@lru_cache(maxsize=65536)
+def _syllables(word_lower: str) -> int:
+    return rough_syllable_count(word_lower)
+
+
+def syllable_table(words: Iterable[str]) -> Dict[str, int]:
+    """
+    Syllable counts for a set of lowercased words, computed once per unique word.
+    """
+    return {w: _syllables(w) for w in set(words)}
+
+
+def _rank_biggest(unique: Dict[str, str], syllables: Dict[str, int], top_n: int) -> List[Dict]:
+    # Top-k heap over unique words: highest syllables first, then length.
+    best = heapq.nlargest(top_n, ((syllables[key], len(w), w) for key, w in unique.items()))
+    return [{"word": w, "syllables": syl, "length": ln} for syl, ln, w in best]
+
+
 def biggest_words(text: str, top_n: int = 10) -> List[Dict]:
-    words = tokenize_words(text)
-    scored = []
-    for w in words:
-        syl = rough_syllable_count(w)
-        scored.append((syl, len(w), w))
-    scored.sort(reverse=True)  # highest syllables first, then length
-    out = []
-    seen = set()
-    for syl, ln, w in scored:
-        key = w.lower()
-        if key in seen:
-            continue
-        seen.add(key)
-        out.append({"word": w, "syllables": syl, "length": ln})
-        if len(out) >= top_n:
-            break
-    return out
+    unique = _unique_words(tokenize_words(text))
+    return _rank_biggest(unique, syllable_table(unique), top_n)
+
+
+def biggest_words_batch(texts: Iterable[str], top_n: int = 10) -> List[List[Dict]]:
+    """
+    biggest_words for many documents: tokenizes and dedupes each, builds one syllable table
+    for the vocabulary of the whole batch, then ranks each document with a top-k heap.
+    """
+    docs = [_unique_words(tokenize_words(t)) for t in texts]
+    table = syllable_table(key for unique in docs for key in unique)
+    return [_rank_biggest(unique, table, top_n) for unique in docs]
 
 
 def mismatch_words(text: str, native_lang: str, top_n: int = 12) -> List[Dict]:
@@ -75,42 +169,41 @@ def mismatch_words(text: str, native_lang: str, top_n: int = 12) -> List[Dict]:
     Flags words likely to be tricky for the native language based on uncommon letter clusters.
     This is heuristic (offline) and intended as a “practice target” list.
     """
-    words = tokenize_words(text)
-    patterns = UNCOMMON_FOR_L1.get(native_lang, [])
     flagged = []
-
-    for w in words:
-        wl = w.lower()
-        hits = []
-
-        for p in patterns:
-            if p in wl:
-                hits.append(p)
-
-        if CONSONANT_RUN.search(wl):
-            hits.append("consonant-run(4+)")
-
+    for key, w in _unique_words(tokenize_words(text)).items():
+        hits = _mismatch_hits(native_lang, key)
         if hits:
-            flagged.append((len(hits), rough_syllable_count(w), len(w), w, sorted(set(hits))))
+            flagged.append((len(hits), _syllables(key), len(w), w, list(hits)))
 
-    # Sort: more “reasons” first, then syllables, then length
-    flagged.sort(reverse=True)
+    # More “reasons” first, then syllables, then length
+    return [
+        {"word": w, "syllables": syl, "reasons": hits}
+        for _reasons, syl, _ln, w, hits in heapq.nlargest(top_n, flagged)
+    ]
 
-    out = []
-    seen = set()
-    for reasons, syl, ln, w, hits in flagged:
-        key = w.lower()
-        if key in seen:
-            continue
-        seen.add(key)
-        out.append({"word": w, "syllables": syl, "reasons": hits})
-        if len(out) >= top_n:
-            break
-    return out
+
+def mismatch_words_batch(texts: Iterable[str], native_lang: str, top_n: int = 12) -> List[List[Dict]]:
+    """
+    mismatch_words over many texts; per-word results are memoized across the whole batch.
+    """
+    _matcher(native_lang)
+    return [mismatch_words(t, native_lang=native_lang, top_n=top_n) for t in texts]
 
 
 def pronunciation_targets(text: str, native_lang: str) -> Dict:
-    return {
-        "biggest_words": biggest_words(text, top_n=10),
-        "mismatch_words": mismatch_words(text, native_lang=native_lang, top_n=12),
-    }
+    with timed("pron_targets"):
+        return {
+            "biggest_words": biggest_words(text, top_n=10),
+            "mismatch_words": mismatch_words(text, native_lang=native_lang, top_n=12),
+        }
+
+
+def pronunciation_targets_batch(texts: Iterable[str], native_lang: str) -> List[Dict]:
+    texts = list(texts)
+    return [
+        {"biggest_words": bw, "mismatch_words": mw}
+        for bw, mw in zip(
+            biggest_words_batch(texts, top_n=10),
+            mismatch_words_batch(texts, native_lang=native_lang, top_n=12),
+        )
+    ]
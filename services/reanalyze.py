@@ -0,0 +1,117 @@
+"""
+Headless re-analysis of every stored attempt, e.g. after changing grammar rules or models.
+
+    python -m services.reanalyze                       # resume (or start) the "default" job
+    python -m services.reanalyze --job lt-6.5 --restart --workers 4
+    python -m services.reanalyze --llm --model llama3.2:3b --speaker-id maria
+
+Transcripts are read from progress.db in id-ordered chunks; each chunk is re-scored on a thread
+pool (language detection for the whole chunk in one batch, then grammar per attempt; optionally the
+LLM weakest point) and written back in one
+transaction together with the job's checkpoint. Interrupt at any time and run again with the same
+--job (and the same --speaker-id) to continue after the last committed chunk. Memory stays at one
+chunk in flight.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services import progress
+from services.langid import detect_languages
+from services.metrics import record
+
+REANALYZE_CHUNK = int(os.getenv("REANALYZE_CHUNK", "200"))
+REANALYZE_WORKERS = int(os.getenv("REANALYZE_WORKERS", os.getenv("LT_POOL_SIZE", "2")))
+
+
+def _rescore(row: tuple, lang: str, use_llm: bool, model: str | None, native_lang: str) -> tuple:
+    """
+    -> (detected_lang, num_issues, weakest_point, id) for one attempts row, whose language was
+    already detected (for the whole chunk at once) as `lang`.
+    """
+    from services.grammar import grammar_feedback
+
+    attempt_id, _speaker, target_lang, _old_lang, transcript, weakest_point, _old_issues = row
+    text = transcript or ""
+    grammar = grammar_feedback(text, lang)
+    if use_llm and text.strip():
+        from services.llm import llm_weakest_point
+
+        weakest_point = llm_weakest_point(
+            text=text, detected_lang=lang, target_lang=target_lang or lang, native_lang=native_lang,
+            grammar_tool_summary=grammar["summary"], model=model,
+        )["weakest_point"]
+    return lang, int(grammar["num_matches"]), weakest_point, attempt_id
+
+
+def run(job: str = "default", workers: int = REANALYZE_WORKERS, chunk_size: int = REANALYZE_CHUNK,
+        speaker_id: str | None = None, use_llm: bool = False, model: str | None = None,
+        native_lang: str = "en", restart: bool = False, log=sys.stderr) -> dict:
+    """
+    Re-scores attempts after the job's checkpoint and returns a summary.
+    `changed` counts attempts whose detected_lang, num_issues or weakest_point differ from before.
+    """
+    progress.init_db()
+    progress.flush()  # attempts still queued by the app should be part of the run
+    if restart:
+        progress.reset_checkpoint(job)
+    state = progress.load_checkpoint(job) or {"last_id": 0, "processed": 0, "changed": 0, "speaker_id": speaker_id}
+    if state["speaker_id"] != speaker_id:
+        # Resuming after another filter's last id would silently skip other speakers' earlier attempts.
+        raise ValueError(
+            f"job {job!r} was started with speaker_id={state['speaker_id']!r}, not {speaker_id!r}; "
+            "use another --job or --restart"
+        )
+    last_id, processed, changed = state["last_id"], state["processed"], state["changed"]
+    if last_id:
+        print(f"Resuming job {job!r} after attempt {last_id} ({processed} done)", file=log)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="reanalyze") as pool:
+        for rows in progress.iter_attempt_chunks(after_id=last_id, chunk_size=chunk_size, speaker_id=speaker_id):
+            t_chunk = time.perf_counter()
+            langs = detect_languages(row[4] or "" for row in rows)  # repeated transcripts are detected once
+            updates = list(pool.map(lambda r, lang: _rescore(r, lang, use_llm, model, native_lang), rows, langs))
+            changed += sum(
+                (new[0], new[1], new[2]) != (row[3], row[6], row[5]) for new, row in zip(updates, rows)
+            )
+            processed += len(rows)
+            last_id = rows[-1][0]
+            progress.apply_reanalysis(job, updates, last_id=last_id, processed=processed, changed=changed,
+                                      speaker_id=speaker_id)
+            record("reanalyze.chunk", (time.perf_counter() - t_chunk) * 1000)
+            print(f"{processed} attempts re-scored (up to id {last_id}, {changed} changed)", file=log)
+    progress.flush()
+
+    wall = time.perf_counter() - t0
+    return {"job": job, "processed": processed, "changed": changed, "last_id": last_id,
+            "wall_seconds": round(wall, 2)}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--job", default="default", help="checkpoint name; reuse it to resume")
+    ap.add_argument("--restart", action="store_true", help="ignore the job's checkpoint and start over")
+    ap.add_argument("--workers", type=int, default=REANALYZE_WORKERS)
+    ap.add_argument("--chunk-size", type=int, default=REANALYZE_CHUNK)
+    ap.add_argument("--speaker-id", default=None, help="only this speaker's attempts")
+    ap.add_argument("--llm", action="store_true", help="also regenerate weakest_point with the local LLM")
+    ap.add_argument("--model", default=os.getenv("OLLAMA_MODEL", "llama3.2:3b"))
+    ap.add_argument("--native-lang", default="en", help="native language passed to the LLM prompt")
+    args = ap.parse_args(argv)
+
+    try:
+        summary = run(job=args.job, workers=args.workers, chunk_size=args.chunk_size, speaker_id=args.speaker_id,
+                      use_llm=args.llm, model=args.model, native_lang=args.native_lang, restart=args.restart)
+    except ValueError as e:
+        ap.error(str(e))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,308 @@
-import tempfile
-from faster_whisper import WhisperModel
+# services/stt.py
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+
+from services.cache import TieredCache, make_key
+from services.metrics import record
+
+# Offline STT defaults:
+# - On CPU: small + int8 is a good speed/quality tradeoff.
+# - If you have GPU/CUDA, set WHISPER_DEVICE=cuda and WHISPER_COMPUTE_TYPE=float16.
+# - `python -m services.stt_tuning --clip reference.wav` measures this machine and saves a profile
+#   (STT_PROFILE_PATH) that is applied at import. Explicit environment variables still win.
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "small")
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "cpu")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))  # 0 = let CTranslate2 decide
+WHISPER_NUM_WORKERS = int(os.getenv("WHISPER_NUM_WORKERS", "1"))  # concurrent transcriptions per model
+WHISPER_BEAM_SIZE = int(os.getenv("WHISPER_BEAM_SIZE", "5"))
+WHISPER_POOL_SIZE = int(os.getenv("WHISPER_POOL_SIZE", "2"))
 
-_MODEL = None
+SAMPLE_RATE = 16000  # what Whisper expects for array input
 
-def _get_model():
+VAD_FILTER = True
+VAD_PARAMETERS = None  # faster-whisper defaults; set a dict (e.g. {"min_silence_duration_ms": 500}) to tune
+
+STT_PROFILE_PATH = os.getenv(
+    "STT_PROFILE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "stt_profile.json")
+)
+# profile key -> (module setting, environment variable that overrides it)
+_PROFILE_SETTINGS = {
+    "model_size": ("WHISPER_MODEL_SIZE", "WHISPER_MODEL_SIZE"),
+    "compute_type": ("WHISPER_COMPUTE_TYPE", "WHISPER_COMPUTE_TYPE"),
+    "cpu_threads": ("WHISPER_CPU_THREADS", "WHISPER_CPU_THREADS"),
+    "num_workers": ("WHISPER_NUM_WORKERS", "WHISPER_NUM_WORKERS"),
+    "beam_size": ("WHISPER_BEAM_SIZE", "WHISPER_BEAM_SIZE"),
+    "vad_parameters": ("VAD_PARAMETERS", None),
+}
+ACTIVE_PROFILE = None  # the applied tuning profile (dict), if any
+
+
+def apply_profile(profile: dict) -> list:
     """
-    Offline STT:
-    - On CPU: small + int8 is a good speed/quality tradeoff.
-    - If you have GPU/CUDA, change device to "cuda" and compute_type to "float16".
+    Applies a tuning profile's settings (except ones pinned by environment variables) and
+    returns the names of the settings it changed.
     """
-    global _MODEL
-    if _MODEL is None:
-        _MODEL = WhisperModel("small", device="cpu", compute_type="int8")
-    return _MODEL
+    global ACTIVE_PROFILE
+    applied = []
+    for field, (name, env) in _PROFILE_SETTINGS.items():
+        if field in profile and not (env and env in os.environ):
+            globals()[name] = profile[field]
+            applied.append(name)
+    ACTIVE_PROFILE = profile
+    return applied
 
-# services/stt.py
-import os
-import tempfile
-from faster_whisper import WhisperModel
 
-model = WhisperModel("small", device="cpu", compute_type="int8")
+def load_profile(path: str = STT_PROFILE_PATH):
+    """
+    Reads and applies a saved tuning profile. A profile measured on a machine with a different
+    core count is ignored, since its timings don't transfer.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            profile = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        warnings.warn(f"Ignoring unreadable Whisper profile {path}: {e}", stacklevel=2)
+        return None
+    if not isinstance(profile, dict) or not isinstance(profile.get("host"), dict):
+        warnings.warn(f"Ignoring unreadable Whisper profile {path}: not a profile object", stacklevel=2)
+        return None
+    if profile["host"].get("cpu_count") != os.cpu_count():
+        warnings.warn(f"Ignoring Whisper profile tuned on different hardware: {path}", stacklevel=2)
+        return None
+    apply_profile(profile)
+    return profile
+
+
+def active_config() -> dict:
+    """
+    The settings transcriptions currently use, and where they came from ("profile" or "defaults").
+    """
+    return {
+        "model_size": WHISPER_MODEL_SIZE,
+        "compute_type": WHISPER_COMPUTE_TYPE,
+        "cpu_threads": WHISPER_CPU_THREADS,
+        "num_workers": WHISPER_NUM_WORKERS,
+        "beam_size": WHISPER_BEAM_SIZE,
+        "vad_parameters": VAD_PARAMETERS,
+        "source": "profile" if ACTIVE_PROFILE else "defaults",
+        "rtf": (ACTIVE_PROFILE or {}).get("rtf"),
+        "wer": (ACTIVE_PROFILE or {}).get("wer"),
+    }
+
+
+load_profile()
+
+_TRANSCRIPT_CACHE = TieredCache(
+    "stt",
+    max_items=int(os.getenv("STT_CACHE_ITEMS", "64")),
+    max_disk_bytes=int(os.getenv("STT_CACHE_DISK_MB", "32")) * 1024 * 1024,
+)
+
+_POOL = OrderedDict()  # (size, compute_type, cpu_threads, num_workers) -> WhisperModel, least recently used first
+_POOL_LOCK = threading.Lock()
+_LOAD_LOCKS = {}
+_WARMUP_THREADS = {}
+
+
+def _model_key(size=None, compute_type=None, cpu_threads=None, num_workers=None):
+    return (
+        size or WHISPER_MODEL_SIZE,
+        compute_type or WHISPER_COMPUTE_TYPE,
+        WHISPER_CPU_THREADS if cpu_threads is None else int(cpu_threads),
+        WHISPER_NUM_WORKERS if num_workers is None else int(num_workers),
+    )
+
+
+def _load_model(key):
+    # Imported here so importing this module (and app.py) doesn't pay for CTranslate2.
+    from faster_whisper import WhisperModel
+
+    size, compute_type, cpu_threads, num_workers = key
+    return WhisperModel(size, device=WHISPER_DEVICE, compute_type=compute_type, cpu_threads=cpu_threads,
+                        num_workers=num_workers)
+
+
+def get_model(size=None, compute_type=None, cpu_threads=None, num_workers=None):
+    """
+    Returns a loaded WhisperModel for (size, compute_type, cpu_threads, num_workers), loading it on first use.
+    At most WHISPER_POOL_SIZE models stay resident; the least recently used one is dropped.
+    """
+    key = _model_key(size, compute_type, cpu_threads, num_workers)
+    with _POOL_LOCK:
+        if key in _POOL:
+            _POOL.move_to_end(key)
+            return _POOL[key]
+        load_lock = _LOAD_LOCKS.setdefault(key, threading.Lock())
+
+    # Per-key lock: concurrent callers wait for one load instead of loading the same model twice.
+    with load_lock:
+        with _POOL_LOCK:
+            if key in _POOL:
+                _POOL.move_to_end(key)
+                return _POOL[key]
+        model = _load_model(key)
+        with _POOL_LOCK:
+            _POOL[key] = model
+            while len(_POOL) > max(WHISPER_POOL_SIZE, 1):
+                _POOL.popitem(last=False)
+    return model
+
+
+def warm_up(size=None, compute_type=None, cpu_threads=None, num_workers=None, background=True):
+    """
+    Loads a model ahead of the first transcription.
+    With background=True the load runs in a daemon thread (started once per model key).
+    """
+    key = _model_key(size, compute_type, cpu_threads, num_workers)
+    if not background:
+        get_model(*key)
+        return None
+    with _POOL_LOCK:
+        th = _WARMUP_THREADS.get(key)
+        if th is not None and (th.is_alive() or key in _POOL):
+            return th
+        th = threading.Thread(target=get_model, args=key, name=f"whisper-warmup-{key[0]}", daemon=True)
+        _WARMUP_THREADS[key] = th
+    th.start()
+    return th
+
 
-def transcribe_audio_bytes(audio_bytes: bytes, language_hint=None):
-    tmp_path = None
+def loaded_models():
+    with _POOL_LOCK:
+        return list(_POOL.keys())
+
+
+def _resample(audio: np.ndarray, src_rate: int, dst_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Resamples mono float32 audio with libswresample (via PyAV, which faster-whisper already uses),
+    so content above the new Nyquist frequency is filtered out instead of aliasing into speech.
+    """
+    if src_rate == dst_rate or audio.size == 0:
+        return audio
+    import av
+
+    frame = av.AudioFrame.from_ndarray(np.ascontiguousarray(audio, dtype=np.float32)[None, :],
+                                       format="flt", layout="mono")
+    frame.sample_rate = src_rate
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=dst_rate)
+    out = [f.to_ndarray()[0] for f in resampler.resample(frame)]
+    out += [f.to_ndarray()[0] for f in resampler.resample(None)]  # flush the filter's tail
+    return np.concatenate(out) if out else np.zeros(0, dtype=np.float32)
+
+
+def decode_audio_bytes(audio_bytes: bytes):
+    """
+    Decodes audio bytes (WAV, FLAC, OGG, WebM, MP3, ...) in memory to a mono float32 array at 16 kHz.
+    Anything libsndfile can read (WAV/FLAC/OGG, at any rate) is read with soundfile and resampled
+    with _resample; only formats it can't read (WebM, MP3, M4A) go through faster-whisper's PyAV
+    decoder from a BytesIO.
+    Returns None if the bytes can't be decoded.
+    """
     try:
-        # IMPORTANT on Windows: delete=False + close the file before reopening
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-            tmp_path = f.name
-            f.write(audio_bytes)
-            f.flush()  # not strictly required, but nice
-
-        segments, info = model.transcribe(
-            tmp_path,
-            language=language_hint,
-            vad_filter=True,
-        )
-
-        text = "".join(seg.text for seg in segments).strip()
-        return {"text": text, "language": info.language, "duration": info.duration}
-
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except PermissionError:
-                # If Streamlit reruns instantly, Windows may still have it locked for a moment.
-                pass
+        audio, rate = sf.read(io.BytesIO(memoryview(audio_bytes)), dtype="float32", always_2d=True)
+    except (RuntimeError, TypeError, ValueError):
+        # soundfile raises LibsndfileError (a RuntimeError) for unknown/corrupt formats
+        audio, rate = None, None
+    if audio is not None:
+        mono = audio[:, 0] if audio.shape[1] == 1 else audio.mean(axis=1, dtype=np.float32)
+        return _resample(np.ascontiguousarray(mono), rate)
+
+    import av
+    from faster_whisper.audio import decode_audio
+
+    try:
+        return decode_audio(io.BytesIO(audio_bytes), sampling_rate=SAMPLE_RATE)
+    except (av.error.FFmpegError, ValueError):
+        return None
+
+
+def _segment_dict(seg) -> dict:
+    return {"text": seg.text, "start": seg.start, "end": seg.end, "avg_logprob": seg.avg_logprob}
+
+
+def _iter_segments(segments):
+    for seg in segments:
+        yield _segment_dict(seg)
+
+
+def transcribe_kwargs(language_hint=None) -> dict:
+    """
+    Decoding options for model.transcribe() under the current settings.
+    """
+    return {"language": language_hint, "beam_size": WHISPER_BEAM_SIZE, "vad_filter": VAD_FILTER,
+            "vad_parameters": VAD_PARAMETERS}
+
+
+def _cache_key(audio_bytes: bytes, language_hint) -> str:
+    # num_workers doesn't change the output, so it isn't part of the key.
+    return make_key(hashlib.sha256(audio_bytes).digest(), _model_key()[:3], transcribe_kwargs(language_hint))
+
+
+def _record_segments(segments, info: dict, key, t0: float):
+    collected = []
+    for seg in segments:
+        collected.append(seg)
+        yield seg
+    # Timed until the last segment, since decoding happens while the caller consumes the generator.
+    elapsed = time.perf_counter() - t0
+    duration = info.get("duration") or 0.0
+    record("stt.transcribe", elapsed * 1000, cache_hit=False, audio_s=duration,
+           rtf=round(elapsed / duration, 3) if duration else None)
+    # Only a fully consumed transcription is cached.
+    if key is not None:
+        _TRANSCRIPT_CACHE.set(key, {"segments": collected, "info": info})
+
+
+def transcribe_stream(audio_bytes: bytes, language_hint=None, use_cache: bool = True):
+    """
+    Starts a transcription and returns (segments, info) without waiting for the decode.
+    `segments` is a generator of {"text", "start", "end", "avg_logprob"} dicts, yielded as
+    faster-whisper produces them; `info` has language, language_probability and duration.
+    Repeat calls with the same bytes and settings are served from the transcript cache.
+    """
+    t0 = time.perf_counter()
+    key = _cache_key(audio_bytes, language_hint) if use_cache else None
+    if key is not None:
+        hit = _TRANSCRIPT_CACHE.get(key)
+        if hit is not None:
+            record("stt.transcribe", (time.perf_counter() - t0) * 1000, cache_hit=True,
+                   audio_s=hit["info"].get("duration"))
+            return iter(hit["segments"]), hit["info"]
+
+    model = get_model()
+    kwargs = transcribe_kwargs(language_hint)
+
+    audio = decode_audio_bytes(audio_bytes)
+    if audio is None:
+        raise ValueError("Could not decode the recording")
+    segments, info = model.transcribe(audio, **kwargs)
+
+    meta = {
+        "language": info.language,
+        "language_probability": round(info.language_probability, 3),
+        "duration": info.duration,
+    }
+    return _record_segments(_iter_segments(segments), meta, key, t0), meta
+
+
+def transcribe_audio_bytes(audio_bytes: bytes, language_hint=None, use_cache: bool = True):
+    segments, info = transcribe_stream(audio_bytes, language_hint=language_hint, use_cache=use_cache)
+    segs = list(segments)
+    text = "".join(seg["text"] for seg in segs).strip()
+    return {"text": text, "segments": segs, **info}
+
+
+def cache_stats() -> dict:
+    return _TRANSCRIPT_CACHE.stats()
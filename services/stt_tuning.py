@@ -0,0 +1,222 @@
+"""
+Calibrates Whisper for this machine and saves the result as the STT profile.
+
+    python -m services.stt_tuning --clip reference.wav --reference-text reference.txt
+    python -m services.stt_tuning --clip reference.wav --sizes tiny,base,small --target-rtf 0.3
+
+Every combination of model size, cpu_threads, beam size and VAD setting is run on the clip.
+Each run gets a real-time factor (processing time / audio length) and a word error rate against
+the reference text. Without a reference text, the most accurate candidate's transcript (largest
+size, widest beam) stands in for it. The fastest configuration within --target-rtf and --max-wer
+is chosen, then num_workers is picked by timing concurrent transcriptions. The profile is written
+to services.stt.STT_PROFILE_PATH and applied automatically the next time the app starts.
+
+A 20-60 s clip of real speech in the language you transcribe most is enough.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services import stt
+
+DEFAULT_SIZES = ("tiny", "base", "small")
+DEFAULT_BEAMS = (1, 5)
+VAD_CANDIDATES = {
+    "default": None,
+    "short_silence": {"min_silence_duration_ms": 500},
+}
+TARGET_RTF = float(os.getenv("STT_TARGET_RTF", "0.5"))
+MAX_WER = float(os.getenv("STT_MAX_WER", "0.15"))
+
+_WORD_RE = re.compile(r"[\w']+")
+_SIZE_FAMILIES = ("tiny", "base", "small", "medium", "large")
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    Word-level Levenshtein distance / reference length, ignoring case and punctuation.
+    """
+    ref = _WORD_RE.findall(reference.lower())
+    hyp = _WORD_RE.findall(hypothesis.lower())
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, start=1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, start=1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1] / len(ref)
+
+
+def _size_rank(size: str) -> tuple:
+    """
+    Sort key for Whisper sizes: tiny < base < small < medium < large-* (newer large versions last),
+    whatever order --sizes lists them in. Unknown names (e.g. local model paths) sort first.
+    """
+    name = size.lower().removesuffix(".en")
+    for rank, family in reversed(list(enumerate(_SIZE_FAMILIES))):
+        if family in name:
+            return rank, name
+    return -1, name
+
+
+def _default_threads() -> list[int]:
+    cores = os.cpu_count() or 1
+    return sorted({1, max(1, cores // 2), cores})
+
+
+def _transcribe(model, audio, beam_size: int, vad_parameters, language) -> str:
+    segments, _info = model.transcribe(audio, language=language, beam_size=beam_size, vad_filter=stt.VAD_FILTER,
+                                       vad_parameters=vad_parameters)
+    return "".join(seg.text for seg in segments).strip()
+
+
+def _time_transcribe(model, audio, duration: float, beam_size: int, vad_parameters, language) -> tuple[str, float]:
+    _transcribe(model, audio[: stt.SAMPLE_RATE * 2], beam_size, vad_parameters, language)  # warm caches
+    t0 = time.perf_counter()
+    text = _transcribe(model, audio, beam_size, vad_parameters, language)
+    return text, (time.perf_counter() - t0) / duration
+
+
+def run_grid(audio, reference: str | None, sizes, threads, beams, vads: dict, compute_type: str,
+             language=None, log=sys.stderr) -> list[dict]:
+    """
+    Times every (size, cpu_threads, beam, vad) combination; returns one result dict per run.
+    """
+    duration = len(audio) / stt.SAMPLE_RATE
+    results = []
+    for size, n_threads in itertools.product(sizes, threads):
+        t0 = time.perf_counter()
+        model = stt._load_model((size, compute_type, n_threads, 1))
+        load_s = time.perf_counter() - t0
+        for beam, (vad_name, vad_params) in itertools.product(beams, vads.items()):
+            text, rtf = _time_transcribe(model, audio, duration, beam, vad_params, language)
+            row = {"model_size": size, "compute_type": compute_type, "cpu_threads": n_threads, "beam_size": beam,
+                   "vad": vad_name, "vad_parameters": vad_params, "rtf": round(rtf, 3),
+                   "load_s": round(load_s, 2), "text": text}
+            results.append(row)
+            print(f"{size:>8} threads={n_threads:<3} beam={beam} vad={vad_name:<14} rtf={rtf:.3f}", file=log)
+        del model
+
+    if reference is None:
+        # Stand-in reference: the largest model with the widest beam.
+        best = max(results, key=lambda r: (_size_rank(r["model_size"]), r["beam_size"], -r["rtf"]))
+        reference = best["text"]
+    for row in results:
+        row["wer"] = round(word_error_rate(reference, row["text"]), 3)
+    return results
+
+
+def choose(results: list[dict], target_rtf: float = TARGET_RTF, max_wer: float = MAX_WER) -> dict:
+    """
+    Fastest run within both targets. If none qualifies, the most accurate run within the RTF target,
+    and failing that the fastest run overall; "meets_target" tells which happened.
+    """
+    ok = [r for r in results if r["rtf"] <= target_rtf and r["wer"] <= max_wer]
+    if ok:
+        return {**min(ok, key=lambda r: (r["rtf"], r["wer"])), "meets_target": True}
+    fast_enough = [r for r in results if r["rtf"] <= target_rtf]
+    if fast_enough:
+        return {**min(fast_enough, key=lambda r: (r["wer"], r["rtf"])), "meets_target": False}
+    return {**min(results, key=lambda r: r["rtf"]), "meets_target": False}
+
+
+def tune_workers(audio, best: dict, worker_counts, language=None, log=sys.stderr) -> int:
+    """
+    num_workers lets one model serve that many transcriptions at once. Picks the count with the
+    best throughput (audio seconds per wall second) for as many concurrent clips.
+    """
+    duration = len(audio) / stt.SAMPLE_RATE
+    best_n, best_tput = 1, 0.0
+    for n in worker_counts:
+        model = stt._load_model((best["model_size"], best["compute_type"], best["cpu_threads"], n))
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            list(pool.map(lambda _i: _transcribe(model, audio, best["beam_size"], best["vad_parameters"], language),
+                          range(n)))
+        tput = n * duration / (time.perf_counter() - t0)
+        print(f"num_workers={n}: {tput:.2f} audio s / wall s", file=log)
+        if tput > best_tput * 1.05:  # only pay for more workers if they clearly help
+            best_n, best_tput = n, tput
+        del model
+    return best_n
+
+
+def save_profile(profile: dict, path: str = stt.STT_PROFILE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clip", required=True, help="reference audio clip (WAV/FLAC/OGG)")
+    ap.add_argument("--reference-text", default=None, help="text file with the clip's correct transcript")
+    ap.add_argument("--language", default=None)
+    ap.add_argument("--sizes", default=",".join(DEFAULT_SIZES))
+    ap.add_argument("--threads", default=",".join(str(n) for n in _default_threads()))
+    ap.add_argument("--beams", default=",".join(str(b) for b in DEFAULT_BEAMS))
+    ap.add_argument("--workers", default="1,2")
+    ap.add_argument("--compute-type", default=stt.WHISPER_COMPUTE_TYPE)
+    ap.add_argument("--target-rtf", type=float, default=TARGET_RTF)
+    ap.add_argument("--max-wer", type=float, default=MAX_WER)
+    ap.add_argument("--out", default=stt.STT_PROFILE_PATH)
+    ap.add_argument("--dry-run", action="store_true", help="print the choice without saving it")
+    args = ap.parse_args(argv)
+
+    with open(args.clip, "rb") as f:
+        audio = stt.decode_audio_bytes(f.read())
+    if audio is None:
+        ap.error(f"can't decode {args.clip}")
+    reference = None
+    if args.reference_text:
+        with open(args.reference_text, encoding="utf-8") as f:
+            reference = f.read()
+
+    sizes = args.sizes.split(",")
+    results = run_grid(audio, reference, sizes=sizes, threads=[int(n) for n in args.threads.split(",")],
+                       beams=[int(b) for b in args.beams.split(",")], vads=VAD_CANDIDATES,
+                       compute_type=args.compute_type, language=args.language)
+    best = choose(results, target_rtf=args.target_rtf, max_wer=args.max_wer)
+    num_workers = tune_workers(audio, best, [int(n) for n in args.workers.split(",")], language=args.language)
+
+    profile = {
+        "model_size": best["model_size"],
+        "compute_type": best["compute_type"],
+        "cpu_threads": best["cpu_threads"],
+        "num_workers": num_workers,
+        "beam_size": best["beam_size"],
+        "vad_parameters": best["vad_parameters"],
+        "rtf": best["rtf"],
+        "wer": best["wer"],
+        "meets_target": best["meets_target"],
+        "target_rtf": args.target_rtf,
+        "max_wer": args.max_wer,
+        "wer_reference": "text" if reference is not None else "largest model",
+        "clip": os.path.abspath(args.clip),
+        "clip_seconds": round(len(audio) / stt.SAMPLE_RATE, 2),
+        "host": {"cpu_count": os.cpu_count(), "platform": platform.platform(), "device": stt.WHISPER_DEVICE},
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "candidates": [{k: v for k, v in r.items() if k != "text"} for r in results],
+    }
+    print(json.dumps({k: v for k, v in profile.items() if k != "candidates"}, indent=2))
+    if not best["meets_target"]:
+        print("No configuration met both targets; saved the closest one.", file=sys.stderr)
+    if not args.dry_run:
+        save_profile(profile, args.out)
+        print(f"Saved {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
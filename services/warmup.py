@@ -0,0 +1,122 @@
+"""
+Background warm-up for the slow-to-start backends (Ollama model, LanguageTool servers, Whisper).
+A daemon thread preloads them once and re-warms on a schedule so idle eviction doesn't bring
+the cold start back.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+WARMUP_INTERVAL_S = float(os.getenv("WARMUP_INTERVAL_S", "600"))
+
+_LOCK = threading.Lock()
+_WAKE = threading.Event()
+_THREAD = None
+_TARGETS = {"ollama": None, "grammar": set(), "whisper": False}
+_STATUS = {}  # component name -> {"state", "detail", "ts"}
+
+
+def _set_status(name: str, state: str, detail: str = ""):
+    with _LOCK:
+        _STATUS[name] = {"state": state, "detail": detail, "ts": time.time()}
+
+
+def preload_ollama(model: str):
+    """
+    An empty /api/generate request loads the model without generating; keep_alive pins it in memory.
+    """
+    from services.llm import OLLAMA_BASE_URL, OLLAMA_KEEP_ALIVE, _session
+
+    r = _session().post(
+        f"{OLLAMA_BASE_URL}/api/generate",
+        json={"model": model, "prompt": "", "keep_alive": OLLAMA_KEEP_ALIVE, "stream": False},
+        timeout=300,
+    )
+    r.raise_for_status()
+
+
+def preload_grammar(lang_code: str, force: bool = False) -> bool:
+    from services.grammar import warm_up
+
+    # A tiny check makes sure the Java server has loaded the language, not just started.
+    return warm_up(lang_code, force=force)
+
+
+def preload_whisper():
+    from services.stt import warm_up
+
+    warm_up(background=False)
+
+
+def _job_specs():
+    # Caller holds _LOCK.
+    model = _TARGETS["ollama"]
+    jobs = []
+    if model:
+        jobs.append((f"ollama:{model}", lambda fresh: preload_ollama(model)))
+    for lang in sorted(_TARGETS["grammar"]):
+        # A language that was just selected is warmed even if its servers were shut down for idleness.
+        jobs.append((f"languagetool:{lang}", lambda fresh, lang=lang: preload_grammar(lang, force=fresh)))
+    if _TARGETS["whisper"]:
+        jobs.append(("whisper", lambda fresh: preload_whisper()))
+    return jobs
+
+
+def _loop():
+    while True:
+        with _LOCK:
+            jobs = _job_specs()
+        for name, job in jobs:
+            with _LOCK:
+                state = _STATUS.get(name, {}).get("state")
+            if state not in ("ready", "idle"):
+                _set_status(name, "warming")
+            t0 = time.perf_counter()
+            try:
+                if job(state == "pending") is False:
+                    _set_status(name, "idle", "unused, left to shut down")
+                    continue
+                _set_status(name, "ready", f"{time.perf_counter() - t0:.1f}s")
+            except Exception as e:
+                _set_status(name, "error", f"{type(e).__name__}: {e}")
+        _WAKE.wait(WARMUP_INTERVAL_S)
+        _WAKE.clear()
+
+
+def start(ollama_model: str | None = None, grammar_langs=(), whisper: bool = False):
+    """
+    Registers what should be kept warm and starts the scheduler thread (once per process).
+    Safe to call on every Streamlit rerun: new targets trigger an immediate warm-up pass.
+    """
+    global _THREAD
+    with _LOCK:
+        changed = False
+        if ollama_model and ollama_model != _TARGETS["ollama"]:
+            _STATUS.pop(f"ollama:{_TARGETS['ollama']}", None)
+            _TARGETS["ollama"] = ollama_model
+            changed = True
+        langs = set(grammar_langs)
+        if langs != _TARGETS["grammar"]:
+            # Replace rather than accumulate, so languages nobody selects any more stop being re-warmed.
+            for lang in _TARGETS["grammar"] - langs:
+                _STATUS.pop(f"languagetool:{lang}", None)
+            new_langs = langs - _TARGETS["grammar"]
+            _TARGETS["grammar"] = langs
+            changed = changed or bool(new_langs)
+        if whisper and not _TARGETS["whisper"]:
+            _TARGETS["whisper"] = True
+            changed = True
+        for name, _job in _job_specs():
+            _STATUS.setdefault(name, {"state": "pending", "detail": "", "ts": time.time()})
+        if _THREAD is None:
+            _THREAD = threading.Thread(target=_loop, name="warmup", daemon=True)
+            _THREAD.start()
+        elif changed:
+            _WAKE.set()
+
+
+def status() -> dict:
+    with _LOCK:
+        return {name: dict(s) for name, s in _STATUS.items()}
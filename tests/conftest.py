@@ -0,0 +1,15 @@
+import pytest
+
+from services import metrics, progress
+
+
+@pytest.fixture(autouse=True)
+def progress_db(tmp_path, monkeypatch):
+    """
+    Every test gets its own progress.db, so metrics and attempts never touch data/progress.db.
+    """
+    path = str(tmp_path / "progress.db")
+    monkeypatch.setattr(progress, "DB_PATH", path)
+    monkeypatch.setattr(metrics, "_READY", False)
+    yield path
+    progress.flush()
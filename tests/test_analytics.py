@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from services import analytics, progress
+
+
+def _save(speaker, ts, lang, weakest, issues):
+    progress.save_attempt(speaker, ts, lang, lang, f"{speaker} {ts}", weakest, issues, "m")
+
+
+@pytest.fixture
+def attempts():
+    progress.init_db()
+    _save("ana", "2024-05-06T10:00:00", "es", "ser/estar", 2)
+    _save("ana", "2024-05-08T10:00:00", "es", "ser/estar", 4)
+    _save("ana", "2024-05-14T10:00:00", "de", None, 1)
+    _save("bob", "2024-05-07T10:00:00", "es", "gender", 3)
+    progress.flush()
+
+
+def test_export_round_trips_with_dictionary_columns(attempts, tmp_path):
+    path = str(tmp_path / "attempts.arrow")
+    out = analytics.export_attempts(path, chunk_size=3)
+    assert out["rows"] == 4
+    table = analytics.load_attempts_table(path)
+    assert "transcript" not in table.column_names
+    assert str(table.schema.field("speaker_id").type) == "dictionary<values=string, indices=int32, ordered=0>"
+    assert table["speaker_id"].to_pylist() == ["ana", "ana", "ana", "bob"]
+    assert table["weakest_point"].to_pylist() == ["ser/estar", "ser/estar", None, "gender"]
+    assert analytics.load_transcripts([2, 4], path) == {2: "ana 2024-05-08T10:00:00", 4: "bob 2024-05-07T10:00:00"}
+
+
+def test_speaker_trends_and_weakest_points(attempts, tmp_path):
+    path = str(tmp_path / "attempts.arrow")
+    analytics.export_attempts(path)
+    table = analytics.load_attempts_table(path)
+    trends = analytics.speaker_trends(table, period="week")
+    assert trends.values.tolist() == [
+        ["ana", "2024-05-06", "es", 2, 6, 3.0],
+        ["ana", "2024-05-13", "de", 1, 1, 1.0],
+        ["bob", "2024-05-06", "es", 1, 3, 3.0],
+    ]
+    top = analytics.weakest_point_frequencies(table, speaker_id="ana")
+    assert top.values.tolist() == [["ser/estar", 2, 2 / 3]]
+
+
+def test_export_is_a_snapshot_of_the_table(attempts, tmp_path, monkeypatch):
+    chunks = progress.iter_attempt_chunks
+
+    def racing_chunks(*args, **kwargs):
+        for i, rows in enumerate(chunks(*args, **kwargs)):
+            if i == 0:
+                # Another process adds a new speaker and re-analyses a row mid-export.
+                other = sqlite3.connect(progress.DB_PATH)
+                with other:
+                    other.execute("INSERT INTO attempts (speaker_id, ts, target_lang, num_issues, weakest_point) "
+                                  "VALUES ('cleo', '2024-05-09T10:00:00', 'fr', 1, 'liaison')")
+                    other.execute("UPDATE attempts SET weakest_point = 'articles' WHERE speaker_id = 'bob'")
+                other.close()
+            yield rows
+
+    monkeypatch.setattr(progress, "iter_attempt_chunks", racing_chunks)
+    path = str(tmp_path / "attempts.arrow")
+    assert analytics.export_attempts(path, chunk_size=2)["rows"] == 4
+    table = analytics.load_attempts_table(path)
+    assert table["speaker_id"].to_pylist() == ["ana", "ana", "ana", "bob"]
+    assert table["weakest_point"].to_pylist()[-1] == "gender"
+
+
+def test_unknown_dictionary_value_is_an_error():
+    with pytest.raises(RuntimeError, match="weakest_point value 'new'"):
+        analytics._encode("weakest_point", ["a", None, "new"], {"a": 0})
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+pytest.importorskip("streamlit_mic_recorder")
+
+from streamlit.testing.v1 import AppTest
+
+from services import progress, warmup
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+@pytest.fixture
+def app(monkeypatch):
+    import streamlit as st
+
+    monkeypatch.setattr(warmup, "start", lambda **kwargs: None)  # no backends in tests
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    yield AppTest.from_file(APP, default_timeout=30)
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def test_reruns_reuse_progress_reads_until_an_attempt_is_saved(app, monkeypatch):
+    calls = []
+    load_page = progress.load_attempts_page
+
+    def counting_page(*args, **kwargs):
+        calls.append(args[0])
+        return load_page(*args, **kwargs)
+
+    monkeypatch.setattr(progress, "load_attempts_page", counting_page)
+    app.run()
+    assert not app.exception
+    app.run()
+    assert calls == ["default"]
+    progress.save_attempt("default", "2024-05-06T10:00:00", "en", "en", "Hello.", "", 0, "m")
+    app.run()
+    assert calls == ["default", "default"]
+    assert not app.exception
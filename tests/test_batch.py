@@ -0,0 +1,44 @@
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from services import batch, stt
+
+
+def test_collect_jobs_from_directory_and_manifest(tmp_path):
+    for name in ["b.wav", "a.mp3", "notes.txt"]:
+        (tmp_path / name).write_bytes(b"")
+    assert [j["path"] for j in batch.collect_jobs(str(tmp_path))] == [str(tmp_path / "a.mp3"),
+                                                                      str(tmp_path / "b.wav")]
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text('# class 3\nb.wav\n{"path": "a.mp3", "language": "es"}\n', encoding="utf-8")
+    assert batch.collect_jobs(str(manifest), language="de") == [
+        {"path": str(tmp_path / "b.wav"), "language": "de"},
+        {"path": str(tmp_path / "a.mp3"), "language": "es"},
+    ]
+
+
+def test_run_batch_writes_jsonl_and_summary(tmp_path, monkeypatch):
+    def transcribe(audio_bytes, language_hint=None):
+        if audio_bytes == b"bad":
+            raise ValueError("Could not decode the recording")
+        return {"text": "hola", "language": "es", "language_probability": 0.9, "duration": 4.0, "segments": []}
+
+    # Threads instead of processes, so the fakes apply to the workers too.
+    monkeypatch.setattr(batch, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(batch, "_init_worker", lambda *args: None)
+    monkeypatch.setattr(stt, "transcribe_audio_bytes", transcribe)
+    for name, data in [("a.wav", b"ok"), ("b.wav", b"ok"), ("c.wav", b"bad")]:
+        (tmp_path / name).write_bytes(data)
+    out = tmp_path / "out.jsonl"
+    summary = batch.run_batch(batch.collect_jobs(str(tmp_path)), str(out), workers=2, log=io.StringIO())
+    assert (summary["files"], summary["failed"], summary["audio_seconds"]) == (3, 1, 8.0)
+    rows = {r["path"]: r for r in map(json.loads, out.read_text(encoding="utf-8").splitlines())}
+    assert rows[str(tmp_path / "a.wav")]["text"] == "hola"
+    assert rows[str(tmp_path / "c.wav")]["error"] == "ValueError: Could not decode the recording"
+
+
+def test_percentile():
+    assert batch._percentile([], 0.5) == 0.0
+    assert batch._percentile([3.0, 1.0, 2.0], 0.5) == 2.0
+    assert batch._percentile([float(i) for i in range(1, 21)], 0.95) == 19.0
@@ -0,0 +1,49 @@
+import requests
+
+from benchmarks import run
+from benchmarks.corpus import LANGS, generate_corpus
+from benchmarks.fixtures import make_wav_bytes, write_fixtures
+from benchmarks.mock_ollama import REPLY, running_mock
+
+
+def test_corpus_is_seeded_and_covers_every_language():
+    corpus = generate_corpus(n_docs=8, sentences_per_doc=3)
+    assert corpus == generate_corpus(n_docs=8, sentences_per_doc=3)
+    assert corpus != generate_corpus(n_docs=8, sentences_per_doc=3, seed=1)
+    assert {doc["lang"] for doc in corpus} == set(LANGS)
+
+
+def test_fixtures_are_written_once(tmp_path):
+    paths = write_fixtures(str(tmp_path), durations=(1,))
+    with open(paths[0], "rb") as f:
+        assert f.read() == make_wav_bytes(1)
+    mtime = (tmp_path / "synthetic_1s_16000hz.wav").stat().st_mtime_ns
+    assert write_fixtures(str(tmp_path), durations=(1,)) == paths
+    assert (tmp_path / "synthetic_1s_16000hz.wav").stat().st_mtime_ns == mtime
+
+
+def test_compare_reports_relative_change_of_shared_numbers():
+    old = {"results": {"text": {"p50_ms": 10.0, "label": "x"}, "gone": 1.0}}
+    new = {"results": {"text": {"p50_ms": 12.5, "label": "y"}, "added": 2.0}}
+    (line,) = run.compare(new, old)
+    assert line.split()[0] == "text.p50_ms" and line.endswith("(+25.0%)")
+
+
+def test_mock_ollama_answers_chat_requests():
+    with running_mock() as srv:
+        r = requests.post(f"{srv.url}/api/chat", json={"model": "m", "messages": [], "stream": False}, timeout=5)
+    assert r.json()["message"]["content"] == REPLY
+    assert srv.chat_requests == 1
+
+
+def test_git_commit_is_read_from_the_repo_whatever_the_cwd(tmp_path, monkeypatch):
+    expected = run._git_commit()
+    monkeypatch.chdir(tmp_path)
+    assert run._git_commit() == expected is not None
+
+
+def test_read_fixture_reuses_the_written_file(tmp_path):
+    from benchmarks.fixtures import read_fixture
+
+    assert read_fixture(1, directory=str(tmp_path)) == make_wav_bytes(1)
+    assert [p.name for p in tmp_path.iterdir()] == ["synthetic_1s_16000hz.wav"]
@@ -0,0 +1,60 @@
+from services import cache
+from services.cache import TieredCache, make_key
+
+
+def _cache(tmp_path, **kwargs):
+    return TieredCache("unit", db_path=str(tmp_path / "cache.db"), **kwargs)
+
+
+def test_make_key_is_stable_and_distinguishes_bytes_from_text():
+    assert make_key({"b": 1, "a": 2}, "x") == make_key({"a": 2, "b": 1}, "x")
+    assert make_key(b"x") != make_key("x")
+
+
+def test_memory_tier_evicts_least_recently_used(tmp_path):
+    c = TieredCache("unit", max_items=2, db_path=None)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # "b" is now the least recently used
+    c.set("c", 3)
+    assert (c.get("a"), c.get("b"), c.get("c")) == (1, None, 3)
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    _cache(tmp_path).set("k", {"text": "hola"})
+    other = _cache(tmp_path)
+    assert other.get("k") == {"text": "hola"}
+    assert other.get("k") == {"text": "hola"}
+    stats = other.stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+
+
+def test_disk_tier_evicts_least_recently_accessed_over_budget(tmp_path):
+    c = _cache(tmp_path, max_items=1, max_disk_bytes=25)
+    c.set("a", "x" * 10)
+    c.set("b", "y" * 10)
+    c.get("a")  # from disk: refreshes "a"
+    c.set("c", "z" * 10)
+    fresh = _cache(tmp_path)
+    assert (fresh.get("a"), fresh.get("b"), fresh.get("c")) == ("x" * 10, None, "z" * 10)
+    assert c.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    c = _cache(tmp_path, ttl_s=60)
+    c.set("k", 1)
+    now[0] += 30
+    assert c.get("k") == 1
+    now[0] += 60
+    assert c.get("k") is None
+    assert _cache(tmp_path, ttl_s=60).get("k") is None
+
+
+def test_get_or_compute_computes_once(tmp_path):
+    calls = []
+    c = _cache(tmp_path)
+    for _ in range(2):
+        assert c.get_or_compute("k", lambda: calls.append(1) or "v") == "v"
+    assert calls == [1]
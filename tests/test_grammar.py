@@ -0,0 +1,156 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from services import grammar
+
+
+class FakeTool:
+    """
+    Stands in for a LanguageTool checker: flags "teh" and a lowercase first letter of the checked text
+    (what UPPERCASE_SENTENCE_START reports when a fragment is checked as its own sentence).
+    """
+
+    calls = []
+
+    def check(self, text):
+        FakeTool.calls.append(text)
+        matches = [
+            SimpleNamespace(ruleId="MORFOLOGIK_RULE", message="Possible typo", offset=m.start(), errorLength=3)
+            for m in re.finditer(r"\bteh\b", text)
+        ]
+        if text[:1].islower():
+            matches.append(SimpleNamespace(ruleId="UPPERCASE_SENTENCE_START", message="Capitalize",
+                                           offset=0, errorLength=1))
+        return matches
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fake_languagetool(monkeypatch):
+    monkeypatch.setattr(grammar._CheckerPool, "_new_tool", lambda self: FakeTool())
+    monkeypatch.setattr(grammar, "_POOLS", {})
+    FakeTool.calls.clear()
+    grammar._SENTENCE_CACHE.clear()
+    yield
+    grammar._SENTENCE_CACHE.clear()
+
+
+def test_split_keeps_abbreviations_inside_sentences():
+    text = "I bought apples, etc. and bananas. Mr. Smith came at 3 p.m. yesterday."
+    assert [s for _start, s in grammar.split_sentences(text)] == [
+        "I bought apples, etc. and bananas.",
+        "Mr. Smith came at 3 p.m. yesterday.",
+    ]
+
+
+def test_split_offsets_point_into_text():
+    text = "Hola.  ¿Qué tal?\n\nBien! Ella dijo \"sí.\" Luego salió."
+    for start, sentence in grammar.split_sentences(text):
+        assert text[start:start + len(sentence)] == sentence
+
+
+def test_sentence_checks_match_whole_text_check():
+    text = "I bought apples, etc. and bananas. Mr. Smith came at 3 p.m. yesterday."
+    whole = FakeTool().check(text)
+    assert grammar.grammar_feedback(text, "en")["num_matches"] == len(whole)
+
+
+def test_offsets_are_mapped_back_onto_full_text():
+    text = "This is fine. I saw teh cat.\nThen teh dog."
+    result = grammar.grammar_feedback(text, "en")
+    offsets = [m["offset"] for m in result["matches"]]
+    assert offsets == [m.start() for m in re.finditer("teh", text)]
+    for m in result["matches"]:
+        assert text[m["offset"]:m["offset"] + m["length"]] == "teh"
+        assert "teh" in m["context"]
+
+
+def test_unchanged_sentences_come_from_cache():
+    grammar.grammar_feedback("One sentence. Two sentence.", "en")
+    grammar.grammar_feedback("One sentence. Three sentence.", "en")
+    assert FakeTool.calls == ["One sentence.\n\nTwo sentence.", "Three sentence."]
+
+
+def test_cold_text_is_checked_in_one_request():
+    text = " ".join(f"Sentence {i} has teh typo." for i in range(30))
+    result = grammar.grammar_feedback(text, "en")
+    assert len(FakeTool.calls) == 1
+    assert [m["offset"] for m in result["matches"]] == [m.start() for m in re.finditer("teh", text)]
+    grammar.grammar_feedback(text, "en")
+    assert len(FakeTool.calls) == 1  # every sentence is cached now
+
+
+def test_matches_crossing_sentences_are_dropped(monkeypatch):
+    def check(self, text):
+        FakeTool.calls.append(text)
+        end = text.index("\n")
+        return [SimpleNamespace(ruleId="ACROSS", message="m", offset=end - 4, errorLength=8),
+                SimpleNamespace(ruleId="INSIDE", message="m", offset=end + 2, errorLength=3)]
+
+    monkeypatch.setattr(FakeTool, "check", check)
+    result = grammar.grammar_feedback("First one. Second one.", "en")
+    assert [(m["rule"], m["offset"]) for m in result["matches"]] == [("INSIDE", 11)]
+
+
+def test_checker_wait_and_check_time_are_recorded():
+    from services import progress
+
+    grammar.grammar_feedback("One sentence. Two sentence.", "en")
+    progress.flush()
+    stages = [row[0] for row in progress._conn().execute("SELECT stage FROM metrics")]
+    assert stages.count("lt.queue") == stages.count("lt.check") == grammar.pool_stats()["en-US"]["checks"] > 0
+    assert "grammar" in stages
+
+
+def test_checker_pool_bounds_concurrent_checks(monkeypatch):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr(grammar, "LT_POOL_SIZE", 2)
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def check(tool, text):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+
+    def use(_):
+        with grammar._get_pool("en").checkout() as tool:
+            check(tool, "Hello.")
+
+    with ThreadPoolExecutor(6) as ex:
+        list(ex.map(use, range(12)))
+    stats = grammar.pool_stats()["en-US"]
+    assert peak[0] == 2
+    assert (stats["started"], stats["running"], stats["checks"]) == (2, 2, 12)
+
+
+def test_idle_checkers_are_shut_down():
+    pool = grammar._get_pool("de")
+    with pool.checkout() as tool:
+        tool.check("Hallo.")
+    pool.shutdown_if_idle(60)
+    assert grammar.pool_stats()["de-DE"]["running"] == 1
+    pool._last_used -= 120
+    pool.shutdown_if_idle(60)
+    stats = grammar.pool_stats()["de-DE"]
+    assert (stats["running"], stats["shutdowns"]) == (0, 1)
+
+
+def test_warm_up_leaves_idle_languages_to_shut_down(monkeypatch):
+    monkeypatch.setattr(grammar, "LT_IDLE_SHUTDOWN_S", 60)
+    pool = grammar._get_pool("de")
+    assert grammar.warm_up("de", force=True)
+    pool._last_used -= 120
+    assert not grammar.warm_up("de")
+    assert grammar.warm_up("de", force=True)
+    assert pool.idle_for() < 60
@@ -0,0 +1,36 @@
+import pytest
+
+from services import langid
+
+
+@pytest.fixture(autouse=True)
+def empty_memo(monkeypatch):
+    monkeypatch.setattr(langid, "_MEMO", type(langid._MEMO)())
+
+
+@pytest.mark.parametrize("lang, text", [
+    ("en", "I would like to order a coffee and a piece of cake, please."),
+    ("es", "Me gustaría pedir un café y un trozo de pastel, por favor."),
+    ("de", "Ich möchte bitte einen Kaffee und ein Stück Kuchen bestellen."),
+    ("fr", "Je voudrais commander un café et un morceau de gâteau, s'il vous plaît."),
+])
+def test_detects_supported_languages(lang, text):
+    assert langid.detect_language(text) == lang
+
+
+def test_confident_whisper_language_skips_detection(monkeypatch):
+    calls = []
+    monkeypatch.setattr(langid, "_detect_uncached", lambda text: calls.append(text) or "en")
+    assert langid.detect_language("Hola", whisper_lang="es", whisper_prob=0.95) == "es"
+    assert langid.detect_language("Hola", whisper_lang="es", whisper_prob=0.5) == "en"
+    assert langid.detect_language("Hola", whisper_lang="ja", whisper_prob=0.99) == "en"
+    assert calls == ["Hola"]  # the last call was answered from the memo
+
+
+def test_detect_languages_detects_each_distinct_text_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(langid, "_detect_uncached", lambda text: calls.append(text) or text[:2])
+    texts = ["es uno", "de zwei", "es uno", "es uno"]
+    hints = [None, None, ("fr", 0.99), None]
+    assert langid.detect_languages(texts, hints) == ["es", "de", "fr", "es"]
+    assert calls == ["es uno", "de zwei"]
@@ -0,0 +1,175 @@
+import threading
+import time
+from contextlib import ExitStack
+
+import pytest
+
+from benchmarks.mock_ollama import REPLY, running_mock
+from services import llm
+from services.cache import TieredCache
+
+
+@pytest.fixture(autouse=True)
+def isolated_client(monkeypatch):
+    # Memory-only response cache and fresh queue/counters, so tests neither read nor fill data/cache.db.
+    monkeypatch.setattr(llm, "_RESPONSE_CACHE", TieredCache("llm", db_path=None))
+    monkeypatch.setattr(llm, "_LIMITER", llm._FairLimiter(2))
+    monkeypatch.setattr(llm, "_CLIENT_STATS", {"requests": 0, "coalesced": 0, "retries": 0, "errors": 0})
+    monkeypatch.setattr(llm, "LLM_RETRY_BACKOFF_S", 0.01)
+
+
+@pytest.fixture
+def mock(monkeypatch):
+    """
+    mock(**running_mock kwargs) starts a mock Ollama server and points the client at it.
+    """
+    with ExitStack() as stack:
+        def start(**kwargs):
+            srv = stack.enter_context(running_mock(**kwargs))
+            monkeypatch.setattr(llm, "OLLAMA_BASE_URL", srv.url)
+            return srv
+
+        yield start
+
+
+def _in_threads(n, fn):
+    results = [None] * n
+    errors = []
+
+    def run(i):
+        try:
+            results[i] = fn(i)
+        except Exception as e:  # surfaced below
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join(10)
+    assert not errors
+    return results
+
+
+def test_session_is_shared_across_threads():
+    sessions = _in_threads(4, lambda i: llm._session())
+    assert all(s is sessions[0] for s in sessions)
+    assert sessions[0].get_adapter(llm.OLLAMA_BASE_URL)._pool_maxsize >= llm.LLM_MAX_WORKERS
+
+
+def test_weakest_point_parser_reads_the_unfinished_line():
+    parser = llm._WeakestPointParser()
+    parser.feed("Weakest: ser vs es")
+    assert parser.snapshot()["weakest_point"] == "ser vs es"
+    parser.feed("tar\nWhy: mixes them up\nFixes:\n- Use estar for states")
+    assert parser.snapshot() == {"weakest_point": "ser vs estar", "explanation": "mixes them up",
+                                 "fixes": ["Use estar for states"]}
+    prose = llm._WeakestPointParser()
+    prose.feed("No structure at all.")
+    assert prose.snapshot(final=True)["explanation"] == "No structure at all."
+
+
+def test_weakest_point_stream_ends_with_the_blocking_result(mock):
+    mock(tokens_per_s=500)
+    args = ("Ayer voy al cine.", "es", "es", "en", "No issues found.")
+    snapshots = list(llm.llm_weakest_point_stream(*args, model="mock", use_cache=False))
+    assert len(snapshots) > 2
+    assert snapshots[-1] == llm.llm_weakest_point(*args, model="mock", use_cache=False)
+    assert snapshots[-1]["weakest_point"] == "verb tense consistency"
+
+
+def test_chat_streams_reply_and_sends_keep_alive(mock):
+    mock(tokens_per_s=500)
+    chunks = list(llm._chat_stream("sys", "hello", "mock", use_cache=False))
+    assert len(chunks) > 1
+    assert "".join(chunks) == REPLY
+    assert llm._chat_payload("sys", "hello", "mock", stream=True)["keep_alive"] == llm.OLLAMA_KEEP_ALIVE
+
+
+def test_identical_concurrent_requests_share_one_generation(mock):
+    srv = mock(latency_s=0.3)
+    results = _in_threads(6, lambda i: llm._chat("sys", "same prompt", "mock", use_cache=False))
+    assert results == [REPLY] * 6
+    assert srv.chat_requests == 1
+    stats = llm.client_stats()
+    assert (stats["requests"], stats["coalesced"], stats["in_flight"]) == (1, 5, 0)
+
+
+def test_late_stream_reader_gets_the_whole_reply(mock):
+    mock(latency_s=0.1, tokens_per_s=200)
+    stream = llm._chat_stream("sys", "p", "mock", use_cache=False)
+    first = next(stream)
+    other = llm._chat("sys", "p", "mock", use_cache=False)  # joins the flight mid-generation
+    assert first + "".join(stream) == REPLY == other
+
+
+def test_completed_response_is_cached(mock):
+    srv = mock()
+    llm._chat("sys", "cache me", "mock")
+    assert llm._chat("sys", "cache me", "mock") == REPLY
+    assert srv.chat_requests == 1
+
+
+def test_cache_key_covers_model_and_options(mock):
+    srv = mock()
+    llm._chat("sys", "p", "mock")
+    llm._chat("sys", "p", "mock", options={"temperature": 0})
+    llm._chat("sys", "p", "other")
+    assert srv.chat_requests == 3
+    assert llm._chat("sys", "p", "mock", options={"temperature": 0}) == REPLY
+    assert srv.chat_requests == 3
+
+
+def test_forced_generation_leaves_the_cached_response_alone(mock):
+    srv = mock()
+    llm._RESPONSE_CACHE.set(llm._cache_key("sys", "p", "mock", None), "earlier answer")
+    assert llm._chat("sys", "p", "mock", use_cache=False) == REPLY
+    assert "".join(llm._chat_stream("sys", "p", "mock", use_cache=False)) == REPLY
+    assert llm._chat("sys", "p", "mock") == "earlier answer"
+    assert srv.chat_requests == 2
+
+
+def test_limiter_caps_requests_reaching_ollama(mock):
+    srv = mock(latency_s=0.2)
+    _in_threads(6, lambda i: llm._chat("sys", f"prompt {i}", "mock", use_cache=False))
+    assert srv.chat_requests == 6
+    assert srv.peak_concurrency == 2
+
+
+def test_overload_statuses_are_retried(mock):
+    srv = mock(fail_first=2)
+    assert llm._chat("sys", "retry", "mock", use_cache=False) == REPLY
+    assert srv.chat_requests == 3
+    assert llm.client_stats()["retries"] == 2
+
+
+def test_fair_limiter_admits_waiters_in_arrival_order():
+    limiter = llm._FairLimiter(1)
+    limiter.acquire()
+    admitted = []
+
+    def waiter(i):
+        limiter.acquire(timeout=5)
+        admitted.append(i)
+        limiter.release()
+
+    threads = []
+    for i in range(5):
+        th = threading.Thread(target=waiter, args=(i,))
+        th.start()
+        threads.append(th)
+        while limiter.stats()["waiting"] < i + 1:  # queue them in a known order
+            time.sleep(0.001)
+    limiter.release()
+    for th in threads:
+        th.join(5)
+    assert admitted == [0, 1, 2, 3, 4]
+    assert limiter.stats()["active"] == 0
+
+
+def test_fair_limiter_times_out():
+    limiter = llm._FairLimiter(1)
+    limiter.acquire()
+    with pytest.raises(TimeoutError):
+        limiter.acquire(timeout=0.05)
+    assert limiter.stats()["waiting"] == 0
@@ -0,0 +1,164 @@
+import io
+import sys
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+pytest.importorskip("av")
+
+from services import long_audio, stt
+
+RATE = 16000
+
+
+def _speech_like(seconds: float, rate: int = RATE) -> bytes:
+    """
+    0.8 s tone bursts separated by 0.4 s of silence, as WAV bytes.
+    """
+    t = np.arange(int(seconds * rate)) / rate
+    audio = 0.3 * np.sin(2 * np.pi * 220 * t) * ((t % 1.2) < 0.8)
+    buf = io.BytesIO()
+    sf.write(buf, audio.astype(np.float32), rate, format="WAV")
+    return buf.getvalue()
+
+
+def _encoded(seconds: float, fmt: str, codec: str, rate: int = 48000) -> bytes:
+    """
+    The same tone bursts, compressed the way browsers and phones record (libsndfile can't read these).
+    """
+    import av
+
+    t = np.arange(int(seconds * rate)) / rate
+    audio = (0.3 * np.sin(2 * np.pi * 220 * t) * ((t % 1.2) < 0.8)).astype(np.float32)
+    buf = io.BytesIO()
+    with av.open(buf, "w", format=fmt) as container:
+        stream = container.add_stream(codec, rate=rate)
+        stream.layout = "mono"
+        for i in range(0, len(audio), rate):
+            frame = av.AudioFrame.from_ndarray(audio[None, i:i + rate], format="flt", layout="mono")
+            frame.sample_rate = rate
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buf.getvalue()
+
+
+def _seg(start, end, text="x"):
+    return {"text": text, "start": start, "end": end, "avg_logprob": -0.1}
+
+
+def test_stitch_keeps_segments_whose_midpoint_is_owned_and_shifts_them():
+    # Chunk owns [10, 20) and its audio starts at 8 s (2 s of left overlap).
+    segs = [_seg(0.0, 1.5), _seg(1.5, 2.6), _seg(5.0, 7.0), _seg(11.0, 12.5), _seg(12.5, 13.0)]
+    out = long_audio._stitch(segs, own_start=10.0, own_end=20.0, pad_start=8.0)
+    assert [(s["start"], s["end"]) for s in out] == [(9.5, 10.6), (13.0, 15.0), (19.0, 20.5)]
+
+
+def test_overlap_segments_are_kept_by_exactly_one_chunk():
+    chunks = [(0.0, 10.0, 0.0), (10.0, 20.0, 8.0)]
+    # The same words as each chunk would transcribe them, in chunk-local time.
+    words = [(8.5, 9.5), (9.6, 10.3), (10.4, 11.5)]
+    kept = []
+    for own_start, own_end, pad_start in chunks:
+        local = [_seg(s - pad_start, e - pad_start) for s, e in words if s >= pad_start]
+        kept += long_audio._stitch(local, own_start, own_end, pad_start)
+    assert [(s["start"], s["end"]) for s in kept] == words
+
+
+def test_chunks_tile_the_recording_with_overlap():
+    seconds, chunk_s, overlap_s = 47.0, 10.0, 1.0
+    chunks = list(long_audio.iter_chunks(io.BytesIO(_speech_like(seconds)), chunk_s=chunk_s, overlap_s=overlap_s))
+    assert chunks[0][0] == 0.0
+    assert chunks[-1][1] == pytest.approx(seconds)
+    for (_s, prev_end, _p, _a), (start, _e, _p2, _a2) in zip(chunks, chunks[1:]):
+        assert start == prev_end
+    for own_start, own_end, pad_start, audio in chunks:
+        assert own_end - own_start <= chunk_s + 1e-6
+        assert pad_start == pytest.approx(max(0.0, own_start - overlap_s))
+        expected = min(own_end + overlap_s, seconds) - pad_start
+        assert len(audio) / stt.SAMPLE_RATE == pytest.approx(expected, abs=0.01)
+
+
+def test_chunks_are_cut_in_silence_without_vad(monkeypatch):
+    # Silero doesn't treat tone bursts as speech, so check the energy fallback on this signal.
+    monkeypatch.setitem(sys.modules, "faster_whisper.vad", None)
+    chunks = list(long_audio.iter_chunks(io.BytesIO(_speech_like(40.0)), chunk_s=10.0, overlap_s=1.0))
+    for _start, own_end, _pad, _audio in chunks[:-1]:
+        assert own_end % 1.2 >= 0.8  # inside a gap between bursts
+
+
+def test_in_process_transcription_stitches_back_to_one_timeline(monkeypatch):
+    seconds = 35.0
+
+    def fake_transcribe(audio, language_hint=None):
+        # One segment per local second, like Whisper output in chunk-local time.
+        n = int(len(audio) / stt.SAMPLE_RATE)
+        return [_seg(float(i), i + 1.0, f"w{i}") for i in range(n)], "es"
+
+    monkeypatch.setattr(long_audio, "_transcribe_chunk", fake_transcribe)
+    out = list(long_audio.iter_long_transcription(io.BytesIO(_speech_like(seconds)), workers=0,
+                                                  chunk_s=8.0, overlap_s=1.0))
+    mids = [(seg["start"] + seg["end"]) / 2 for seg, _lang in out]
+    assert all(lang == "es" for _seg_, lang in out)
+    assert mids == sorted(mids)
+    assert 0.0 <= mids[0] and mids[-1] < seconds
+    gaps = np.diff(mids)
+    assert gaps.min() > 0.0 and gaps.max() < 2.0  # no duplicates, no holes
+
+
+def _fake_transcribe(audio, language_hint=None):
+    # One segment per local second, like Whisper output in chunk-local time.
+    n = int(len(audio) / stt.SAMPLE_RATE)
+    return [_seg(float(i), i + 1.0, f"w{i}") for i in range(n)], "es"
+
+
+@pytest.mark.parametrize("fmt,codec", [("webm", "libopus"), ("mp4", "aac")])
+def test_formats_libsndfile_cant_read_are_decoded_with_pyav(monkeypatch, fmt, codec):
+    data = _encoded(25.0, fmt, codec)
+    with pytest.raises(RuntimeError):
+        sf.SoundFile(io.BytesIO(data))
+    chunks = list(long_audio.iter_chunks(io.BytesIO(data), chunk_s=10.0, overlap_s=1.0))
+    assert chunks[-1][1] == pytest.approx(25.0, abs=0.1)
+
+    monkeypatch.setattr(long_audio, "_transcribe_chunk", _fake_transcribe)
+    out = long_audio.transcribe_long_audio(io.BytesIO(data), workers=0)
+    assert out["duration"] == pytest.approx(25.0, abs=0.1)
+    assert out["language"] == "es" and len(out["segments"]) >= 24
+
+
+def test_unreadable_file_is_rejected_with_a_clear_error():
+    with pytest.raises(ValueError, match="can't read .* as audio"):
+        list(long_audio.iter_chunks(io.BytesIO(b"definitely not audio" * 100)))
+
+
+def test_chunks_in_flight_are_bounded_by_the_workers_passed_in():
+    from concurrent.futures import Future
+
+    class LazyFuture(Future):
+        # Never reports done, so the loop only drains when the in-flight limit forces it to.
+        def __init__(self, executor, args):
+            super().__init__()
+            self.executor, self.args = executor, args
+
+        def done(self):
+            return False
+
+        def result(self, timeout=None):
+            self.executor.outstanding -= 1
+            return _fake_transcribe(*self.args)
+
+    class FakeExecutor:
+        outstanding = peak = 0
+
+        def submit(self, fn, *args):
+            self.outstanding += 1
+            self.peak = max(self.peak, self.outstanding)
+            return LazyFuture(self, args)
+
+    executor = FakeExecutor()
+    out = list(long_audio.iter_long_transcription(io.BytesIO(_speech_like(40.0)), workers=3, executor=executor,
+                                                  chunk_s=2.0, overlap_s=0.5))
+    assert out and executor.outstanding == 0
+    assert executor.peak == 6
@@ -0,0 +1,56 @@
+from services import metrics, progress
+
+
+def _metric_rows():
+    progress.flush()
+    return progress._conn().execute("SELECT stage FROM metrics ORDER BY id").fetchall()
+
+
+def test_records_go_to_metrics_table():
+    metrics.record("unit.stage", 12.5, cache_hit=True)
+    assert _metric_rows() == [("unit.stage",)]
+
+
+def test_stage_summary_reports_percentiles_and_hit_rate():
+    for ms in range(1, 101):
+        metrics.record("llm.chat", float(ms), cache_hit=ms <= 25, tokens_per_s=20.0)
+    with metrics.timed("grammar") as fields:
+        fields["cache_hit"] = True
+    summary = metrics.stage_summary().set_index("stage")
+    assert list(summary.index[:1]) == ["llm.chat"]  # slowest p95 first
+    chat = summary.loc["llm.chat"]
+    assert (chat["calls"], chat["p50_ms"], chat["p95_ms"]) == (100, 50.5, 95.05)
+    assert (chat["cache_hit_rate"], chat["tokens_per_s"]) == (0.25, 20.0)
+    assert summary.loc["grammar", "cache_hit_rate"] == 1.0
+
+
+def test_disabled_metrics_write_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    progress.init_db()
+    metrics.record("unit.stage", 1.0)
+    progress.save_attempt("maria", "2024-05-06T10:00:00", "es", "es", "Hola.", "", 0, "m")
+    progress.load_attempts_page("maria")
+    assert _metric_rows() == []
+
+
+def test_samples_past_retention_are_pruned_by_the_writer(monkeypatch):
+    import time
+
+    monkeypatch.setattr(progress, "METRICS_RETENTION_DAYS", 7)
+    monkeypatch.setattr(progress, "_LAST_PRUNE", 0.0)
+    progress.init_db()
+    now = time.time()
+    conn = progress._conn()
+    with conn:
+        conn.executemany("INSERT INTO metrics (ts, stage, duration_ms) VALUES (?, ?, 1.0)",
+                         [(now - 30 * 86400, "old"), (now - 8 * 86400, "old"), (now - 86400, "recent")])
+    metrics.record("unit.stage", 1.0)
+    assert [stage for (stage,) in _metric_rows()] == ["recent", "unit.stage"]
+    assert list(metrics.stage_summary(hours=24 * 30)["stage"]) == ["recent", "unit.stage"]
+
+
+def test_metrics_queries_use_the_ts_index():
+    progress.init_db()
+    for sql in (progress._SELECT_METRICS, progress._PRUNE_METRICS):
+        plan = " ".join(row[-1] for row in progress._conn().execute("EXPLAIN QUERY PLAN " + sql, (0.0,)))
+        assert "idx_metrics_ts" in plan
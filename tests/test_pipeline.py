@@ -0,0 +1,195 @@
+import threading
+import time
+
+import pytest
+
+from services.pipeline import Pipeline, Stage
+
+
+class Calls:
+    """
+    Stage factory that records which stages ran, in order, and on which thread.
+    """
+
+    def __init__(self):
+        self.order = []
+        self.threads = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name, fn=None, delay=0.0):
+        def run(ctx):
+            with self._lock:
+                self.order.append(name)
+                self.threads[name] = threading.current_thread().name
+            time.sleep(delay)
+            return fn(ctx) if fn else f"{name}:{ctx['text']}"
+        return run
+
+
+def test_stages_run_after_their_deps_and_see_their_results():
+    calls = Calls()
+    p = Pipeline([
+        Stage("c", calls.stage("c", lambda ctx: f"{ctx['a']}-{ctx['b']}"), deps=("a", "b")),
+        Stage("a", calls.stage("a", lambda ctx: ctx["text"].upper()), inputs=("text",)),
+        Stage("b", calls.stage("b", lambda ctx: len(ctx["text"])), inputs=("text",)),
+        Stage("d", calls.stage("d", lambda ctx: ctx["c"] + "!"), deps=("c",)),
+    ])
+    out = p.run({"text": "hi"})
+    assert out["results"] == {"a": "HI", "b": 2, "c": "HI-2", "d": "HI-2!"}
+    assert calls.order.index("c") > max(calls.order.index("a"), calls.order.index("b"))
+    assert calls.order[-1] == "d"
+    assert set(out["timings_ms"]) == {"a", "b", "c", "d"}
+
+
+def test_independent_stages_overlap():
+    calls = Calls()
+    p = Pipeline([Stage(n, calls.stage(n, delay=0.2), inputs=("text",)) for n in ("a", "b", "c")], max_workers=3)
+    t0 = time.perf_counter()
+    p.run({"text": "x"})
+    assert time.perf_counter() - t0 < 0.5
+
+
+def test_skip_also_skips_dependents():
+    calls = Calls()
+    p = Pipeline([
+        Stage("a", calls.stage("a"), inputs=("text",)),
+        Stage("b", calls.stage("b"), deps=("a",)),
+        Stage("c", calls.stage("c"), deps=("b",)),
+        Stage("other", calls.stage("other"), inputs=("text",)),
+    ])
+    out = p.run({"text": "x"}, skip=("b",))
+    assert set(out["results"]) == {"a", "other"}
+    assert sorted(calls.order) == ["a", "other"]
+
+
+def test_stage_cache_is_keyed_on_inputs_and_dep_results():
+    calls = Calls()
+    p = Pipeline([
+        Stage("a", calls.stage("a"), inputs=("text",)),
+        Stage("b", calls.stage("b", lambda ctx: ctx["a"] + ctx["lang"]), deps=("a",), inputs=("lang",)),
+        Stage("side", calls.stage("side"), deps=("a",), cache=False),
+    ])
+    first = p.run({"text": "x", "lang": "es"})
+    assert first["cached"] == []
+    second = p.run({"text": "x", "lang": "es"})
+    assert sorted(second["cached"]) == ["a", "b"]
+    assert second["results"] == first["results"]
+    assert calls.order.count("side") == 2  # cache=False stages always run
+
+    third = p.run({"text": "x", "lang": "de"})
+    assert third["cached"] == ["a"]
+    assert third["results"]["b"] == "a:xde"
+
+
+def test_streaming_stage_tokens_are_delivered_on_callers_thread():
+    calls = Calls()
+    tokens = []
+
+    def stream(ctx):
+        if ctx["on_token"]:
+            ctx["on_token"]("s", "partial")
+        return "done"
+
+    p = Pipeline([
+        Stage("s", calls.stage("s", stream), streams=True, cache=False),
+        Stage("quiet", calls.stage("quiet", stream), cache=False),
+    ])
+    p.run({"text": "x"}, on_token=lambda name, value: tokens.append((name, value, threading.current_thread().name)))
+    assert calls.threads["s"].startswith("pipeline")
+    assert tokens == [("s", "partial", threading.current_thread().name)]  # only streams=True stages get on_token
+
+    tokens.clear()
+    p.run({"text": "x"})
+    assert tokens == []
+
+
+def test_dependents_start_on_a_published_value():
+    finish = threading.Event()
+
+    def slow(ctx):
+        ctx["publish"]("early", "E")
+        assert finish.wait(5)  # held back until the dependent has run
+        return "slow done"
+
+    def dependent(ctx):
+        finish.set()
+        return ctx["early"] + "!"
+
+    p = Pipeline([
+        Stage("slow", slow, publishes=("early",)),
+        Stage("next", dependent, deps=("early",)),
+    ])
+    out = p.run({})
+    assert out["results"] == {"early": "E", "next": "E!", "slow": "slow done"}
+
+    # Cached stages restore what they published.
+    again = p.run({})
+    assert sorted(again["cached"]) == ["next", "slow"]
+    assert again["results"] == out["results"]
+
+
+def test_published_values_are_required_and_skipped_with_their_stage():
+    p = Pipeline([Stage("a", lambda ctx: 1, publishes=("early",)), Stage("b", lambda ctx: 2, deps=("early",))])
+    with pytest.raises(RuntimeError, match="without publishing"):
+        p.run({})
+    assert p.run({}, skip=("a",))["results"] == {}
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_practice_starts_before_weakest_point_why_and_fixes_arrive(monkeypatch, streaming):
+    from services import llm, pipeline
+
+    practice_started = threading.Event()
+    seen = {}
+
+    def chat_stream(system, user, model=None, options=None, use_cache=True):
+        yield "Weakest: ser vs estar\n"
+        seen["why_sent_after_practice"] = practice_started.wait(5)  # hold back Why/Fixes
+        yield "Why: mixed up.\nFixes:\n- Use estar for states.\n"
+
+    def practice(**kwargs):
+        seen["weakest_point"] = kwargs["weakest_point"]
+        practice_started.set()
+        return "drills"
+
+    def practice_stream(**kwargs):
+        yield practice(**kwargs)
+
+    monkeypatch.setattr(llm, "_chat_stream", chat_stream)
+    monkeypatch.setattr(llm, "llm_generate_practice_module", practice)
+    monkeypatch.setattr(llm, "llm_generate_practice_module_stream", practice_stream)
+    monkeypatch.setattr(pipeline, "_detect", lambda ctx: "es")
+    monkeypatch.setattr(pipeline, "_grammar", lambda ctx: {"summary": "ok", "num_matches": 0})
+    monkeypatch.setattr(pipeline, "_latin", lambda ctx: {"latin_text": "", "latin_pron": ""})
+    monkeypatch.setattr(pipeline, "_pron_targets", lambda ctx: [])
+    monkeypatch.setattr(pipeline, "_pron_feedback", lambda ctx: None)
+
+    tokens = []
+    out = pipeline.build_analysis_pipeline().run(
+        {"text": "Yo soy cansado.", "target_lang": "es", "native_lang": "en", "use_llm": True},
+        on_token=(lambda name, value: tokens.append(name)) if streaming else None,
+        skip=("save",),
+    )
+    assert seen == {"weakest_point": "ser vs estar", "why_sent_after_practice": True}
+    assert out["results"]["weakest"]["fixes"] == ["Use estar for states."]
+    assert out["results"]["practice"] == "drills"
+    assert ("weakest" in tokens and "practice" in tokens) == streaming
+
+
+def test_stage_errors_propagate():
+    def boom(ctx):
+        raise KeyError("missing")
+
+    p = Pipeline([Stage("a", boom), Stage("b", lambda ctx: 1, deps=("a",))])
+    with pytest.raises(KeyError):
+        p.run({"text": "x"})
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError, match="duplicate"):
+        Pipeline([Stage("a", lambda ctx: 1), Stage("a", lambda ctx: 2)])
+    with pytest.raises(ValueError, match="unknown"):
+        Pipeline([Stage("a", lambda ctx: 1, deps=("nope",))])
+    cycle = Pipeline([Stage("a", lambda ctx: 1, deps=("b",)), Stage("b", lambda ctx: 1, deps=("a",))])
+    with pytest.raises(RuntimeError, match="cannot make progress"):
+        cycle.run({})
@@ -0,0 +1,154 @@
+import sqlite3
+import threading
+
+from services import progress
+
+
+def _stats(speaker="ana", period="day"):
+    return {
+        (bucket, lang): (attempts, issues)
+        for bucket, lang, attempts, issues in progress._conn().execute(
+            "SELECT bucket, target_lang, attempts, issues FROM attempt_stats "
+            "WHERE speaker_id=? AND period=? AND attempts > 0",  # emptied buckets stay as zero rows
+            (speaker, period),
+        )
+    }
+
+
+def _save(ts, issues, lang="es", speaker="ana"):
+    progress.save_attempt(speaker, ts, lang, lang, "Hola.", "", issues, "m")
+
+
+def _rebuilt(speaker="ana", period="day"):
+    # What the aggregates should be, computed from scratch.
+    bucket = "date(ts)" if period == "day" else "date(ts, '-6 days', 'weekday 1')"
+    return {
+        (b, lang): (n, issues)
+        for b, lang, n, issues in progress._conn().execute(
+            f"SELECT {bucket}, COALESCE(target_lang, ''), COUNT(*), COALESCE(SUM(num_issues), 0) "
+            "FROM attempts WHERE speaker_id=? GROUP BY 1, 2",
+            (speaker,),
+        )
+    }
+
+
+def test_connections_are_per_thread_and_in_wal_mode():
+    progress.init_db()
+    conn = progress._conn()
+    assert progress._conn() is conn
+    other = []
+    th = threading.Thread(target=lambda: other.append(progress._conn()))
+    th.start()
+    th.join()
+    assert other[0] is not conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_queued_saves_are_written_in_batches(monkeypatch):
+    progress.init_db()
+    write_batch = progress._write_batch
+    release = threading.Event()
+    batches = []
+
+    def blocking_write(items):
+        batches.append(len(items))
+        release.wait(5)  # hold the writer so later saves pile up in the queue
+        write_batch(items)
+
+    monkeypatch.setattr(progress, "_write_batch", blocking_write)
+    for i in range(100):
+        _save("2024-05-06T10:00:00", i % 3)
+    release.set()
+    progress.flush()
+    assert max(batches) == progress.WRITE_BATCH_SIZE and len(batches) <= 5
+    assert progress._conn().execute("SELECT COUNT(*), SUM(num_issues) FROM attempts").fetchone() == (100, 99)
+
+
+def test_insert_updates_daily_and_weekly_stats():
+    progress.init_db()
+    _save("2024-05-06T09:00:00", 2)   # Monday
+    _save("2024-05-06T18:00:00", 3)
+    _save("2024-05-12T10:00:00", 1)   # Sunday, same week
+    _save("2024-05-12T10:00:00", 4, lang="de")
+    progress.flush()
+    assert _stats() == {("2024-05-06", "es"): (2, 5), ("2024-05-12", "es"): (1, 1), ("2024-05-12", "de"): (1, 4)}
+    assert _stats(period="week") == {("2024-05-06", "es"): (3, 6), ("2024-05-06", "de"): (1, 4)}
+
+
+def test_update_and_delete_keep_stats_in_step():
+    progress.init_db()
+    for day, issues in [("06", 2), ("07", 0), ("07", 5), ("14", 1)]:
+        _save(f"2024-05-{day}T10:00:00", issues)
+    progress.flush()
+    conn = progress._conn()
+    with conn:
+        conn.execute("UPDATE attempts SET num_issues = num_issues + 10 WHERE ts LIKE '2024-05-07%'")
+        conn.execute("DELETE FROM attempts WHERE ts LIKE '2024-05-14%'")
+    assert _stats() == _rebuilt()
+    assert _stats(period="week") == _rebuilt(period="week")
+    trend = progress.load_trend("ana", "week")
+    assert list(trend["bucket"]) == ["2024-05-06"]  # the emptied week is filtered out
+    assert trend["avg_issues"].iloc[0] == (2 + 10 + 15) / 3
+
+
+def test_migration_backfills_existing_attempts():
+    conn = sqlite3.connect(progress.DB_PATH)
+    conn.executescript(progress.MIGRATIONS[0])
+    conn.executemany(
+        "INSERT INTO attempts (speaker_id, ts, target_lang, num_issues) VALUES (?, ?, ?, ?)",
+        [("ana", "2024-05-06T10:00:00", "es", 2), ("ana", "2024-05-08T10:00:00", "es", 3), ("ana", "bad", "es", 1)],
+    )
+    conn.commit()
+    conn.close()
+    progress.init_db()
+    assert progress._conn().execute("PRAGMA user_version").fetchone()[0] == len(progress.MIGRATIONS)
+    assert _stats(period="week") == {("2024-05-06", "es"): (2, 5)}
+    progress.init_db()  # idempotent
+    assert _stats(period="week") == {("2024-05-06", "es"): (2, 5)}
+
+
+def test_keyset_pages_walk_all_attempts_newest_first():
+    progress.init_db()
+    for i in range(7):
+        _save(f"2024-05-0{i + 1}T10:00:00", i)
+    _save("2024-05-07T10:00:00", 9, speaker="bob")
+    pages, cursor = [], None
+    while True:
+        page, cursor = progress.load_attempts_page("ana", cursor=cursor, limit=3)
+        pages.append(list(page["num_issues"]))
+        if cursor is None:
+            break
+    assert pages == [[6, 5, 4], [3, 2, 1], [0]]
+
+
+def test_writer_survives_a_bad_row():
+    progress.init_db()
+    progress.save_attempt(None, "2024-05-06T10:00:00", "es", "es", "", "", 0, "m")  # NOT NULL violation
+    assert progress.flush(timeout=5)
+    _save("2024-05-06T10:00:00", 1)
+    assert progress.flush(timeout=5)
+    assert progress._conn().execute("SELECT COUNT(*) FROM attempts").fetchone()[0] == 1
+
+
+def test_concurrent_init_db_applies_each_migration_once():
+    conn = sqlite3.connect(progress.DB_PATH)
+    conn.executescript(progress.MIGRATIONS[0])
+    conn.executemany("INSERT INTO attempts (speaker_id, ts, target_lang, num_issues) VALUES (?, ?, ?, ?)",
+                     [("ana", f"2024-05-0{d}T10:00:00", "es", d) for d in range(1, 8)])
+    conn.commit()
+    conn.close()
+    errors = []
+
+    def init():
+        try:
+            progress.init_db()  # each thread has its own connection, like separate processes
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=init) for _ in range(4)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join(30)
+    assert errors == []
+    assert _stats(period="week") == _rebuilt(period="week")
@@ -0,0 +1,101 @@
+import random
+
+import pytest
+
+from services import pron_analysis as pa
+
+LANGS = ("en", "es", "de", "fr")
+SAMPLES = [
+    "Yesterday I thought through the strengths and weaknesses of my pronunciation.",
+    "Ayer fuimos al mercado y compramos naranjas, cerezas y un queso muy rico.",
+    "Die Schülerinnen übten gestern zwölf schwierige Wörter mit dem Zungenbrecher.",
+    "Nous avons mangé des croissants et bu un café crème au château de Versailles.",
+    "The unbelievably thoughtful psychologist rhythmically whistled through the street.",
+]
+
+
+# Reference: the straightforward implementation the optimized module replaced.
+
+def _legacy_syllables(word):
+    w = word.lower()
+    groups, in_vowel = 0, False
+    for ch in w:
+        is_v = ch in pa.VOWELS
+        if is_v and not in_vowel:
+            groups += 1
+        in_vowel = is_v
+    if w.endswith("e") and groups > 1 and not w.endswith(("le", "ee")):
+        groups -= 1
+    return max(groups, 1)
+
+
+def _legacy_biggest_words(text, top_n=10):
+    scored = sorted(((_legacy_syllables(w), len(w), w) for w in pa.tokenize_words(text)), reverse=True)
+    out, seen = [], set()
+    for syl, ln, w in scored:
+        if w.lower() in seen:
+            continue
+        seen.add(w.lower())
+        out.append({"word": w, "syllables": syl, "length": ln})
+        if len(out) >= top_n:
+            break
+    return out
+
+
+def _legacy_mismatch_words(text, native_lang, top_n=12):
+    flagged = []
+    for w in pa.tokenize_words(text):
+        wl = w.lower()
+        hits = [p for p in pa.UNCOMMON_FOR_L1.get(native_lang, []) if p in wl]
+        if pa.CONSONANT_RUN.search(wl):
+            hits.append("consonant-run(4+)")
+        if hits:
+            flagged.append((len(hits), _legacy_syllables(w), len(w), w, sorted(set(hits))))
+    flagged.sort(reverse=True)
+    out, seen = [], set()
+    for _reasons, syl, _ln, w, hits in flagged:
+        if w.lower() in seen:
+            continue
+        seen.add(w.lower())
+        out.append({"word": w, "syllables": syl, "reasons": hits})
+        if len(out) >= top_n:
+            break
+    return out
+
+
+def _texts():
+    texts = list(SAMPLES)
+    rng = random.Random(1)
+    alphabet = "abcdefghijklmnopqrstuvwxyzçñéèüöäßœ' "
+    for _ in range(40):
+        words = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 14))) for _ in range(30)]
+        texts.append(" ".join(w.capitalize() if rng.random() < 0.3 else w for w in words))
+    texts += ["", "Tschüss tschüss TSCHÜSS Strength strength", "Château chateau CHÂTEAU eau"]
+    return texts
+
+
+@pytest.mark.parametrize("word", ["strength", "Beautiful", "idée", "queue", "table", "bee", "x", "aeiou"])
+def test_syllable_count_matches_legacy(word):
+    assert pa.rough_syllable_count(word) == _legacy_syllables(word)
+
+
+def test_biggest_words_matches_legacy():
+    texts = _texts()
+    for text in texts:
+        assert pa.biggest_words(text) == _legacy_biggest_words(text)
+    assert pa.biggest_words_batch(texts) == [_legacy_biggest_words(t) for t in texts]
+
+
+@pytest.mark.parametrize("native_lang", LANGS + ("xx",))
+def test_mismatch_words_matches_legacy(native_lang):
+    texts = _texts()
+    for text in texts:
+        assert pa.mismatch_words(text, native_lang) == _legacy_mismatch_words(text, native_lang)
+    assert pa.mismatch_words_batch(texts, native_lang) == [_legacy_mismatch_words(t, native_lang) for t in texts]
+
+
+def test_matcher_finds_overlapping_patterns():
+    matcher = pa._PatternMatcher(["tsch", "sch", "ch", "zsch"])
+    assert matcher.find("nietzsche") == {"zsch", "sch", "ch"}
+    assert matcher.find("tschüss") == {"tsch", "sch", "ch"}
+    assert matcher.find("hallo") == set()
@@ -0,0 +1,52 @@
+import io
+
+import pytest
+
+from services import progress, reanalyze
+
+
+@pytest.fixture
+def attempts(monkeypatch):
+    progress.init_db()
+    for i, speaker in enumerate(["ana", "maria", "ana", "maria", "ana"]):
+        progress.save_attempt(speaker, f"2024-05-0{i + 1}T10:00:00", "es", "es", f"Frase {i}.", "", 0, "m")
+    progress.flush()
+    # Re-score without LanguageTool: one issue per attempt.
+    monkeypatch.setattr(reanalyze, "_rescore", lambda row, lang, *args: (lang, 1, row[5], row[0]))
+
+
+def _run(**kwargs):
+    return reanalyze.run(workers=1, chunk_size=2, log=io.StringIO(), **kwargs)
+
+
+def test_run_rescores_every_attempt_and_updates_trends(attempts):
+    summary = _run(job="all")
+    assert (summary["processed"], summary["changed"]) == (5, 5)
+    assert progress.load_trend("ana")["issues"].sum() == 3
+
+
+def test_resume_continues_after_checkpoint(attempts):
+    progress.apply_reanalysis("resume", [], last_id=3, processed=3, changed=0)
+    summary = _run(job="resume")
+    assert summary["processed"] == 5
+    assert progress.load_trend("ana")["issues"].sum() == 1  # only id 5 was re-scored
+
+
+def test_resume_with_other_speaker_filter_is_refused(attempts):
+    assert _run(job="j", speaker_id="maria")["processed"] == 2
+    with pytest.raises(ValueError, match="speaker_id"):
+        _run(job="j")
+    assert _run(job="j", restart=True)["processed"] == 5
+
+
+def test_languages_are_detected_once_per_chunk(attempts, monkeypatch):
+    batches = []
+
+    def detect_languages(texts):
+        texts = list(texts)
+        batches.append(texts)
+        return ["es"] * len(texts)
+
+    monkeypatch.setattr(reanalyze, "detect_languages", detect_languages)
+    _run(job="langs")
+    assert batches == [["Frase 0.", "Frase 1."], ["Frase 2.", "Frase 3."], ["Frase 4."]]
@@ -0,0 +1,201 @@
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("av")
+
+from services import stt
+from services.cache import TieredCache
+
+
+def _wav_bytes(seconds: float, rate: int) -> bytes:
+    import io
+
+    import soundfile as sf
+
+    t = np.arange(int(seconds * rate)) / rate
+    sig = 0.2 * np.sin(2 * np.pi * 220 * t) + 0.02 * np.random.default_rng(0).standard_normal(t.size)
+    buf = io.BytesIO()
+    sf.write(buf, sig.astype(np.float32), rate, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+def _level_at(audio: np.ndarray, hz: float, rate: int = stt.SAMPLE_RATE) -> float:
+    spectrum = np.abs(np.fft.rfft(audio))
+    freqs = np.fft.rfftfreq(len(audio), 1 / rate)
+    return float(spectrum[np.argmin(np.abs(freqs - hz))])
+
+
+class FakeWhisper:
+    def __init__(self, key=None):
+        self.key = key
+        self.inputs = []
+        self.decoded = []
+
+    def transcribe(self, audio, **kwargs):
+        self.inputs.append(audio)
+
+        def segments():
+            for i, text in enumerate([" Hola,", " ¿qué tal?"]):
+                self.decoded.append(i)
+                yield SimpleNamespace(text=text, start=float(i), end=i + 1.0, avg_logprob=-0.2)
+
+        return segments(), SimpleNamespace(language="es", language_probability=0.987, duration=2.0)
+
+
+@pytest.fixture
+def fake_whisper(monkeypatch):
+    model = FakeWhisper()
+    monkeypatch.setattr(stt, "get_model", lambda *args: model)
+    monkeypatch.setattr(stt, "_TRANSCRIPT_CACHE", TieredCache("stt", db_path=None))
+    return model
+
+
+def test_model_pool_keeps_the_most_recently_used_models(monkeypatch):
+    loads = []
+    monkeypatch.setattr(stt, "_POOL", OrderedDict())
+    monkeypatch.setattr(stt, "_LOAD_LOCKS", {})
+    monkeypatch.setattr(stt, "WHISPER_POOL_SIZE", 2)
+    monkeypatch.setattr(stt, "_load_model", lambda key: loads.append(key[0]) or FakeWhisper(key))
+    tiny = stt.get_model("tiny")
+    stt.get_model("base")
+    assert stt.get_model("tiny") is tiny
+    stt.get_model("small")  # evicts "base", the least recently used
+    stt.get_model("tiny")
+    stt.get_model("base")
+    assert loads == ["tiny", "base", "small", "base"]
+
+
+def test_transcribe_stream_yields_segments_as_they_are_decoded(fake_whisper):
+    segments, info = stt.transcribe_stream(_wav_bytes(1.0, 16000))
+    assert info == {"language": "es", "language_probability": 0.987, "duration": 2.0}
+    assert fake_whisper.decoded == []
+    first = next(segments)
+    assert (first["text"], fake_whisper.decoded) == (" Hola,", [0])
+    assert [s["end"] for s in segments] == [2.0]
+
+
+def test_wav_is_transcribed_from_memory(fake_whisper):
+    res = stt.transcribe_audio_bytes(_wav_bytes(1.0, stt.SAMPLE_RATE))
+    assert (res["text"], res["language"]) == ("Hola, ¿qué tal?", "es")
+    assert isinstance(fake_whisper.inputs[0], np.ndarray)
+
+
+def test_repeated_transcription_is_served_from_the_cache(fake_whisper):
+    wav = _wav_bytes(1.0, 16000)
+    first = stt.transcribe_audio_bytes(wav, language_hint="es")
+    assert first["text"] == "Hola, ¿qué tal?"
+    assert stt.transcribe_audio_bytes(wav, language_hint="es") == first
+    assert len(fake_whisper.inputs) == 1
+    stt.transcribe_audio_bytes(wav, language_hint="en")
+    stt.transcribe_audio_bytes(wav, language_hint="es", use_cache=False)
+    assert len(fake_whisper.inputs) == 3
+
+
+@pytest.fixture
+def profile_settings(monkeypatch):
+    # apply_profile rewrites module settings; restore them after the test.
+    for name, env in stt._PROFILE_SETTINGS.values():
+        monkeypatch.setattr(stt, name, getattr(stt, name))
+        if env:
+            monkeypatch.delenv(env, raising=False)
+    monkeypatch.setattr(stt, "ACTIVE_PROFILE", None)
+
+
+def _write_profile(tmp_path, profile) -> str:
+    import json
+
+    path = tmp_path / "stt_profile.json"
+    path.write_text(json.dumps(profile), encoding="utf-8")
+    return str(path)
+
+
+def test_profile_is_applied_unless_pinned_by_environment(tmp_path, monkeypatch, profile_settings):
+    import os
+
+    monkeypatch.setenv("WHISPER_BEAM_SIZE", "3")
+    path = _write_profile(tmp_path, {"model_size": "tiny", "beam_size": 1, "cpu_threads": 2, "rtf": 0.2,
+                                     "host": {"cpu_count": os.cpu_count()}})
+    assert stt.load_profile(path)["model_size"] == "tiny"
+    config = stt.active_config()
+    assert (config["model_size"], config["cpu_threads"], config["source"]) == ("tiny", 2, "profile")
+    assert config["beam_size"] == stt.WHISPER_BEAM_SIZE != 1
+
+
+def test_profile_from_other_hardware_is_ignored(tmp_path, profile_settings):
+    path = _write_profile(tmp_path, {"model_size": "tiny", "host": {"cpu_count": -1}})
+    with pytest.warns(UserWarning, match="different hardware"):
+        assert stt.load_profile(path) is None
+    assert stt.active_config()["source"] == "defaults"
+
+
+@pytest.mark.parametrize("content", ["[1, 2]", '"small"', '{"host": 4}', "{not json"])
+def test_unreadable_profile_is_ignored_with_a_warning(tmp_path, profile_settings, content):
+    path = tmp_path / "stt_profile.json"
+    path.write_text(content, encoding="utf-8")
+    with pytest.warns(UserWarning, match="unreadable"):
+        assert stt.load_profile(str(path)) is None
+    assert stt.load_profile(str(tmp_path / "missing.json")) is None
+
+
+def test_resample_filters_content_above_nyquist():
+    rate = 48000
+    t = np.arange(rate * 2) / rate
+    # 12 kHz would alias to 4 kHz at 16 kHz without a low-pass filter.
+    audio = (0.5 * np.sin(2 * np.pi * 440 * t) + 0.3 * np.sin(2 * np.pi * 12000 * t)).astype(np.float32)
+    out = stt._resample(audio, rate)
+    assert len(out) == 2 * stt.SAMPLE_RATE
+    assert _level_at(out, 4000) < 0.001 * _level_at(out, 440)
+
+
+@pytest.mark.parametrize("rate", [16000, 44100, 48000])
+def test_decode_audio_bytes_matches_pyav_file_decode(rate, tmp_path):
+    from faster_whisper.audio import decode_audio
+
+    wav = _wav_bytes(2.0, rate)
+    path = tmp_path / "clip.wav"
+    path.write_bytes(wav)
+    expected = decode_audio(str(path), sampling_rate=stt.SAMPLE_RATE)
+    np.testing.assert_allclose(stt.decode_audio_bytes(wav), expected, atol=1e-4)
+
+
+@pytest.mark.parametrize("rate", [44100, 48000])
+def test_in_memory_decode_beats_temp_file_decode(rate):
+    from benchmarks.stt_decode import _decode_via_tempfile, _time
+
+    wav = _wav_bytes(20.0, rate)
+    in_memory = _time(lambda: stt.decode_audio_bytes(wav), repeat=5)["min_ms"]
+    temp_file = _time(lambda: _decode_via_tempfile(wav), repeat=5)["min_ms"]
+    assert in_memory < temp_file
+
+
+def test_decode_audio_bytes_falls_back_to_pyav_for_compressed_audio():
+    import io
+
+    import av
+    import soundfile as sf
+
+    rate = 48000
+    buf = io.BytesIO()
+    with av.open(buf, "w", format="webm") as container:  # what browsers record; libsndfile can't read it
+        stream = container.add_stream("libopus", rate=rate)
+        stream.layout = "mono"
+        t = np.arange(rate) / rate
+        frame = av.AudioFrame.from_ndarray((0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)[None, :],
+                                           format="flt", layout="mono")
+        frame.sample_rate = rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    with pytest.raises(RuntimeError):
+        sf.read(io.BytesIO(buf.getvalue()))
+    out = stt.decode_audio_bytes(buf.getvalue())
+    assert out is not None
+    assert abs(len(out) - stt.SAMPLE_RATE) < 0.05 * stt.SAMPLE_RATE
+
+
+def test_decode_audio_bytes_rejects_garbage():
+    assert stt.decode_audio_bytes(b"not audio at all") is None
@@ -0,0 +1,50 @@
+import io
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services import stt, stt_tuning
+
+TEXTS = {"tiny": "the quick brown box", "base": "the quick brown fox jumped", "small": "the quick brown fox jumps"}
+
+
+class FakeModel:
+    def __init__(self, size):
+        self.size = size
+
+    def transcribe(self, audio, language=None, beam_size=5, vad_filter=True, vad_parameters=None):
+        return iter([SimpleNamespace(text=TEXTS[self.size])]), None
+
+
+def test_word_error_rate_ignores_case_and_punctuation():
+    assert stt_tuning.word_error_rate("The quick, brown fox.", "the quick brown fox") == 0.0
+    assert stt_tuning.word_error_rate("the quick brown fox", "the brown box") == 0.5
+    assert stt_tuning.word_error_rate("", "") == 0.0
+
+
+def test_choose_prefers_fastest_run_within_both_targets():
+    runs = [
+        {"rtf": 0.2, "wer": 0.30},
+        {"rtf": 0.3, "wer": 0.10},
+        {"rtf": 0.4, "wer": 0.05},
+        {"rtf": 0.9, "wer": 0.00},
+    ]
+    assert stt_tuning.choose(runs, target_rtf=0.5, max_wer=0.15) == {"rtf": 0.3, "wer": 0.10, "meets_target": True}
+    assert stt_tuning.choose(runs, target_rtf=0.5, max_wer=0.01) == {"rtf": 0.4, "wer": 0.05, "meets_target": False}
+    assert stt_tuning.choose(runs, target_rtf=0.1, max_wer=0.01)["rtf"] == 0.2
+
+
+@pytest.mark.parametrize("sizes", [["tiny", "base", "small"], ["small", "tiny", "base"]])
+def test_stand_in_reference_is_the_largest_size_whatever_the_cli_order(monkeypatch, sizes):
+    monkeypatch.setattr(stt, "_load_model", lambda key: FakeModel(key[0]))
+    audio = np.zeros(stt.SAMPLE_RATE * 3, dtype=np.float32)
+    results = stt_tuning.run_grid(audio, None, sizes=sizes, threads=[1], beams=[1, 5], vads={"default": None},
+                                  compute_type="int8", log=io.StringIO())
+    wer = {r["model_size"]: r["wer"] for r in results}
+    assert wer["small"] == 0.0 and wer["tiny"] > wer["base"] > 0.0
+
+
+def test_size_rank_orders_whisper_sizes():
+    sizes = ["large-v3", "small", "tiny.en", "medium", "base", "large-v2"]
+    assert sorted(sizes, key=stt_tuning._size_rank) == ["tiny.en", "base", "small", "medium", "large-v2", "large-v3"]
@@ -0,0 +1,51 @@
+import threading
+import time
+
+import pytest
+
+from services import warmup
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    # A fresh scheduler per test; threads from earlier tests stay parked on their own event.
+    monkeypatch.setattr(warmup, "_THREAD", None)
+    monkeypatch.setattr(warmup, "_WAKE", threading.Event())
+    monkeypatch.setattr(warmup, "_TARGETS", {"ollama": None, "grammar": set(), "whisper": False})
+    monkeypatch.setattr(warmup, "_STATUS", {})
+    warmed = []
+    monkeypatch.setattr(warmup, "preload_grammar", lambda lang, force=False: warmed.append((lang, force)))
+    return warmed
+
+
+def _wait_for(states: dict, timeout: float = 5.0) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = warmup.status()
+        if {name: s["state"] for name, s in status.items()} == states:
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"expected {states}, got {warmup.status()}")
+
+
+def test_backends_are_warmed_in_the_background(scheduler, monkeypatch):
+    def preload_ollama(model):
+        raise ConnectionError("connection refused")
+
+    monkeypatch.setattr(warmup, "preload_ollama", preload_ollama)
+    warmup.start(ollama_model="qwen", grammar_langs=["es"])
+    status = _wait_for({"ollama:qwen": "error", "languagetool:es": "ready"})
+    assert status["ollama:qwen"]["detail"] == "ConnectionError: connection refused"
+    assert [lang for lang, _force in scheduler] == ["es"]
+
+
+def test_new_language_is_forced_and_idle_ones_are_left_alone(scheduler, monkeypatch):
+    monkeypatch.setattr(warmup, "preload_grammar",
+                        lambda lang, force=False: scheduler.append((lang, force)) or force)
+    warmup.start(grammar_langs=["es"])
+    _wait_for({"languagetool:es": "ready"})
+    warmup._WAKE.set()  # a scheduled re-warm finds "es" unused
+    _wait_for({"languagetool:es": "idle"})
+    warmup.start(grammar_langs=["de"])
+    _wait_for({"languagetool:de": "ready"})
+    assert scheduler[0] == ("es", True) and scheduler[1] == ("es", False) and scheduler[-1] == ("de", True)